@@ -0,0 +1,75 @@
+"""
+Cache of each user's block lists.
+
+For every user we keep
+1) the ids of users they reported and the ids of users who reported them (UserReport)
+2) the (content_type_id, object_id) pairs of contents they reported (ContentReport)
+Entries are invalidated from the UserReport/ContentReport signals
+(see user_report.models, content_report.models).
+"""
+from django.contrib.contenttypes.models import ContentType
+
+from adoorback.utils.user_cache import PerUserCache
+
+
+class BlockList:
+    __slots__ = ('user_id', 'reported_user_ids', 'reported_by_user_ids', 'reported_contents')
+
+    def __init__(self, user_id, reported_user_ids=(), reported_by_user_ids=(), reported_contents=()):
+        self.user_id = user_id
+        self.reported_user_ids = frozenset(reported_user_ids)
+        self.reported_by_user_ids = frozenset(reported_by_user_ids)
+        self.reported_contents = frozenset(reported_contents)
+
+    @property
+    def blocked_user_ids(self):
+        """users hidden from each other in either direction"""
+        return self.reported_user_ids | self.reported_by_user_ids
+
+    def is_user_blocked(self, user_id):
+        return user_id in self.reported_user_ids or user_id in self.reported_by_user_ids
+
+    def is_content_blocked(self, obj):
+        content_type = ContentType.objects.get_for_model(obj)
+        return (content_type.id, obj.pk) in self.reported_contents
+
+    def reported_object_ids(self, model):
+        """ids of reported objects of the given model"""
+        content_type = ContentType.objects.get_for_model(model)
+        return frozenset(object_id for content_type_id, object_id in self.reported_contents
+                         if content_type_id == content_type.id)
+
+
+def _load(user_ids):
+    from content_report.models import ContentReport
+    from user_report.models import UserReport
+
+    lists = {user_id: ([], [], []) for user_id in user_ids}
+
+    user_reports = UserReport.objects.filter(user_id__in=user_ids) | \
+        UserReport.objects.filter(reported_user_id__in=user_ids)
+    for user_id, reported_user_id in user_reports.values_list('user_id', 'reported_user_id'):
+        if user_id in lists:
+            lists[user_id][0].append(reported_user_id)
+        if reported_user_id in lists:
+            lists[reported_user_id][1].append(user_id)
+
+    content_reports = ContentReport.objects.filter(user_id__in=user_ids) \
+        .values_list('user_id', 'content_type_id', 'object_id')
+    for user_id, content_type_id, object_id in content_reports:
+        lists[user_id][2].append((content_type_id, object_id))
+
+    return {user_id: tuple(tuple(sorted(ids)) for ids in value) for user_id, value in lists.items()}
+
+
+def _decode(user_id, value):
+    return BlockList(user_id, *value)
+
+
+block_list_cache = PerUserCache('block_list', _load, _decode,
+                                alias_setting='BLOCK_LIST_CACHE_ALIAS',
+                                timeout_setting='BLOCK_LIST_CACHE_TIMEOUT')
+
+get_block_lists = block_list_cache.get_many
+get_block_list = block_list_cache.get
+invalidate = block_list_cache.invalidate
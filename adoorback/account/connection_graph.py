@@ -0,0 +1,72 @@
+"""
+Cache of each user's connection graph (adjacency list).
+
+For every user we keep the ids of the users they are connected with, split by the
+choice the user made for them ('friend' / 'neighbor'), as int sets.
+Entries are invalidated from the Connection post_save/post_delete signals
+(see account.models), so a cached graph is never older than the last connection change.
+"""
+from django.db.models import Q
+
+from adoorback.utils.user_cache import PerUserCache
+
+
+class ConnectionGraph:
+    """Connections of a single user, grouped by the choice the user made."""
+    __slots__ = ('user_id', 'friend_ids', 'neighbor_ids')
+
+    def __init__(self, user_id, friend_ids=(), neighbor_ids=()):
+        self.user_id = user_id
+        self.friend_ids = frozenset(friend_ids)
+        self.neighbor_ids = frozenset(neighbor_ids)
+
+    @property
+    def connected_ids(self):
+        return self.friend_ids | self.neighbor_ids
+
+    def is_connected(self, user_id):
+        return user_id in self.friend_ids or user_id in self.neighbor_ids
+
+    def choice_for(self, user_id):
+        if user_id in self.friend_ids:
+            return 'friend'
+        if user_id in self.neighbor_ids:
+            return 'neighbor'
+        return None
+
+
+def _load(user_ids):
+    from account.models import Connection
+
+    adjacency = {user_id: ([], []) for user_id in user_ids}
+    connections = Connection.objects.filter(
+        Q(user1_id__in=user_ids) | Q(user2_id__in=user_ids)
+    ).values_list('user1_id', 'user2_id', 'user1_choice', 'user2_choice')
+
+    for user1_id, user2_id, user1_choice, user2_choice in connections:
+        for user_id, other_id, choice in ((user1_id, user2_id, user1_choice),
+                                          (user2_id, user1_id, user2_choice)):
+            if user_id not in adjacency:
+                continue
+            friend_ids, neighbor_ids = adjacency[user_id]
+            if choice == 'friend':
+                friend_ids.append(other_id)
+            else:
+                neighbor_ids.append(other_id)
+
+    return {user_id: (tuple(sorted(friend_ids)), tuple(sorted(neighbor_ids)))
+            for user_id, (friend_ids, neighbor_ids) in adjacency.items()}
+
+
+def _decode(user_id, value):
+    friend_ids, neighbor_ids = value
+    return ConnectionGraph(user_id, friend_ids, neighbor_ids)
+
+
+connection_graph_cache = PerUserCache('connection_graph', _load, _decode,
+                                      alias_setting='CONNECTION_GRAPH_CACHE_ALIAS',
+                                      timeout_setting='CONNECTION_GRAPH_CACHE_TIMEOUT')
+
+get_graphs = connection_graph_cache.get_many
+get_graph = connection_graph_cache.get
+invalidate = connection_graph_cache.invalidate
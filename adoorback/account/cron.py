@@ -1,19 +1,31 @@
-from datetime import time, datetime, timedelta
+from datetime import datetime, timedelta
 
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
-from backports.zoneinfo import ZoneInfo
 from django.contrib.auth import get_user_model
 from django_cron import CronJobBase, Schedule
 
+from account.models import next_noti_at
+from account.recommendations import refresh_all_recommendations
+from check_in.models import CheckIn
+from note.models import Note
 from qna.models import Question
-from notification.models import Notification, NotificationActor
+from notification.models import Notification
 
 User = get_user_model()
 
 
 class SendDailyWhoAmINotiCronJob(CronJobBase):
+    """
+    Daily notification (with the daily question) and signup nudges, sent to the users
+    whose next_noti_at_utc has come; they are then rescheduled to their next notification time.
+    """
     # run every hour at 0 minute
     RUN_AT_TIMES = [(datetime.min + timedelta(hours=i)).strftime('%H:%M') for i in range(24)]
+    # notifications due for longer than this (e.g. the job did not run) are skipped, not sent late
+    STALE_AFTER = timedelta(hours=1)
+    BATCH_SIZE = 1000
 
     schedule = Schedule(run_at_times=RUN_AT_TIMES)
     code = 'account.send_daily_who_am_i_noti_cron_job'
@@ -25,9 +37,6 @@ class SendDailyWhoAmINotiCronJob(CronJobBase):
         admin = User.objects.filter(is_superuser=True).get(email='team.whoami.today@gmail.com')
         try:
             daily_question = Question.objects.daily_questions()[0]
-            daily_question_en = daily_question.content_en
-            daily_question_ko = daily_question.content_ko
-            daily_question_id = daily_question.id
         except:
             print('=========================')
             print('daily question does not exist!')
@@ -35,80 +44,87 @@ class SendDailyWhoAmINotiCronJob(CronJobBase):
             print('=========================')
             return
 
-        num_notis_before = Notification.objects.admin_only().count()
-        all_users = User.objects.all()
-
-        for user in all_users:
-            if user.noti_time is None:
-                continue
-
-            user_local_time = timezone.now().astimezone(ZoneInfo(user.timezone))
-            
-            current_weekday = user_local_time.weekday()  # Monday=0, Sunday=6
-            if str(current_weekday) not in user.noti_period_days:
-                continue
-
-            if user.noti_time == time(user_local_time.hour, 0):
-                # daily notification
-                noti = Notification.objects.create(user=user,
-                                                   target=admin,
-                                                   origin=admin,
-                                                   message_ko=f"{user.username}님, 오늘의 후엠아이를 남겨보세요! - {daily_question_ko}",
-                                                   message_en=f"{user.username}, time to leave your whoami for today! - {daily_question_en}",
-                                                   redirect_url=f'/questions/{daily_question_id}/new')
-                NotificationActor.objects.create(user=admin, notification=noti)
-
-                # signup notification
-                if not user.signup_noti_status:
-                    user.signup_noti_status = {
-                        "profile_noti_sent": False,
-                        "checkin_noti_sent": False,
-                        "note_noti_sent": False,
-                        "ping_noti_sent": False
-                    }
-                    user.save()
-
-                status = user.signup_noti_status
-                if not status["ping_noti_sent"]:  # need to send signup notification
-                    sent = False
-                    if not status["profile_noti_sent"]:
-                        if not (user.username != user.email or user.pronouns or user.bio):
-                            self.send_notification(
-                                user, admin, f"{user.username}님, 프로필을 업데이트 해보세요!", f"{user.username}, how about updating your profile information?", "/settings/edit-profile"
-                            )
-                            sent = True
-                        status["profile_noti_sent"] = True
-                    if not sent and not status["checkin_noti_sent"]:
-                        if not user.check_in_set.exists():
-                            self.send_notification(
-                                user, admin, f"{user.username}님, 체크인을 꾸며보세요!", f"{user.username}, create a check-in so your friends can check your status!", "/check-in/edit"
-                            )
-                            sent = True
-                        status["checkin_noti_sent"] = True
-                    if not sent and not status["note_noti_sent"]:
-                        if not user.note_set.exists():
-                            self.send_notification(
-                                user, admin, f"{user.username}님, 첫 노트를 작성해보세요!", f"{user.username}, write your first note and share your thoughts!", "/notes/new"
-                            )
-                            sent = True
-                        status["note_noti_sent"] = True
-                    if not sent and user.friends.exists():
-                        self.send_notification(
-                            user, admin, f"{user.username}님, 친구에게 쪽지를 보내보세요!", f"{user.username}, ping your friend to say hi!", "/friends"
-                        )
-                        status["ping_noti_sent"] = True
-
-                    user.signup_noti_status = status
-                    user.save()
-
-        num_notis_after = Notification.objects.admin_only().count()
-        print(f'{num_notis_after - num_notis_before} notifications sent!')
+        now = timezone.now()
+        due_users = User.objects.filter(next_noti_at_utc__lte=now).annotate(
+            has_check_in=Exists(CheckIn.objects.filter(user=OuterRef('pk'))),
+            has_note=Exists(Note.objects.filter(author=OuterRef('pk'))),
+            has_friend=Exists(User.objects.filter(friends=OuterRef('pk'))),
+        ).order_by('id')
+
+        num_notis = 0
+        while True:
+            # users leave due_users once rescheduled
+            users = list(due_users[:self.BATCH_SIZE])
+            if not users:
+                break
+
+            notifications = []
+            for user in users:
+                if user.next_noti_at_utc > now - self.STALE_AFTER:
+                    notifications.append(self.daily_notification(user, admin, daily_question))
+                    notifications += self.signup_notifications(user, admin)
+                user.next_noti_at_utc = next_noti_at(*user.noti_schedule, after=now)
+
+            with transaction.atomic():
+                Notification.objects.bulk_send(notifications, admin)
+                User.objects.bulk_update(users, ['signup_noti_status', 'next_noti_at_utc'])
+            num_notis += len(notifications)
+
+        print(f'{num_notis} notifications sent!')
         print('=========================')
         print("Cron job complete...............")
         print('=========================')
 
-    def send_notification(self, user, admin, message_ko, message_en, redirect_url):       
-        noti = Notification.objects.create(
+    def daily_notification(self, user, admin, daily_question):
+        return Notification(user=user,
+                            target=admin,
+                            origin=admin,
+                            message_ko=f"{user.username}님, 오늘의 후엠아이를 남겨보세요! - {daily_question.content_ko}",
+                            message_en=f"{user.username}, time to leave your whoami for today! - {daily_question.content_en}",
+                            redirect_url=f'/questions/{daily_question.id}/new')
+
+    def signup_notifications(self, user, admin):
+        """
+        The next signup nudge user needs (at most one), updating user.signup_noti_status.
+        Uses the has_check_in, has_note and has_friend annotations.
+        """
+        status = user.signup_noti_status or {
+            "profile_noti_sent": False,
+            "checkin_noti_sent": False,
+            "note_noti_sent": False,
+            "ping_noti_sent": False
+        }
+        user.signup_noti_status = status
+        if status["ping_noti_sent"]:
+            return []
+
+        if not status["profile_noti_sent"]:
+            status["profile_noti_sent"] = True
+            if not (user.username != user.email or user.pronouns or user.bio):
+                return [self.notification(
+                    user, admin, f"{user.username}님, 프로필을 업데이트 해보세요!", f"{user.username}, how about updating your profile information?", "/settings/edit-profile"
+                )]
+        if not status["checkin_noti_sent"]:
+            status["checkin_noti_sent"] = True
+            if not user.has_check_in:
+                return [self.notification(
+                    user, admin, f"{user.username}님, 체크인을 꾸며보세요!", f"{user.username}, create a check-in so your friends can check your status!", "/check-in/edit"
+                )]
+        if not status["note_noti_sent"]:
+            status["note_noti_sent"] = True
+            if not user.has_note:
+                return [self.notification(
+                    user, admin, f"{user.username}님, 첫 노트를 작성해보세요!", f"{user.username}, write your first note and share your thoughts!", "/notes/new"
+                )]
+        if user.has_friend:
+            status["ping_noti_sent"] = True
+            return [self.notification(
+                user, admin, f"{user.username}님, 친구에게 쪽지를 보내보세요!", f"{user.username}, ping your friend to say hi!", "/friends"
+            )]
+        return []
+
+    def notification(self, user, admin, message_ko, message_en, redirect_url):
+        return Notification(
             user=user,
             target=admin,
             origin=admin,
@@ -116,4 +132,18 @@ class SendDailyWhoAmINotiCronJob(CronJobBase):
             message_en=message_en,
             redirect_url=redirect_url
         )
-        NotificationActor.objects.create(user=admin, notification=noti)
+
+
+class RefreshFriendRecommendationsCronJob(CronJobBase):
+    # run every day at 4 am
+    RUN_AT_TIMES = ['04:00']
+
+    schedule = Schedule(run_at_times=RUN_AT_TIMES)
+    code = 'account.refresh_friend_recommendations_cron_job'
+
+    def do(self):
+        print('=========================')
+        print("Refreshing friend recommendations...............")
+        refresh_all_recommendations()
+        print("Cron job complete...............")
+        print('=========================')
@@ -0,0 +1,92 @@
+"""
+Friend feed timelines.
+
+FRIEND_FEED_MODE = 'pull' (default): FriendFeed unions notes/responses of connected users.
+FRIEND_FEED_MODE = 'push': notes/responses are fanned out to FeedEntry rows of each
+connected user when they are written, and FriendFeed only reads the owner's FeedEntry rows.
+Timelines are kept in sync from the Note/Response, Connection and UserReport signals;
+run `manage.py rebuild_feed_timelines` after switching to push mode.
+"""
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+from account import block_list, connection_graph
+
+
+BATCH_SIZE = 1000
+
+
+def is_push_mode():
+    return getattr(settings, 'FRIEND_FEED_MODE', 'pull') == 'push'
+
+
+def feed_models():
+    from note.models import Note
+    from qna.models import Response
+    return [Note, Response]
+
+
+def _feed_owner_ids(author_id):
+    blocked_ids = block_list.get_block_list(author_id).blocked_user_ids
+    return connection_graph.get_graph(author_id).connected_ids - blocked_ids
+
+
+def fan_out(instance):
+    """Add a newly written note/response to the timelines of the author's connected users."""
+    from account.models import FeedEntry
+
+    content_type = ContentType.objects.get_for_model(instance)
+    FeedEntry.objects.bulk_create([
+        FeedEntry(owner_id=owner_id, author_id=instance.author_id, content_type=content_type,
+                  object_id=instance.id, created_at=instance.created_at)
+        for owner_id in _feed_owner_ids(instance.author_id)
+    ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def remove(instance):
+    """Remove a deleted note/response from all timelines."""
+    from account.models import FeedEntry
+
+    FeedEntry.objects.filter(content_type=ContentType.objects.get_for_model(instance),
+                             object_id=instance.id).delete()
+
+
+def backfill(owner_id, author_id):
+    """Add all notes/responses of author to the timeline of owner."""
+    from account.models import FeedEntry
+
+    for model in feed_models():
+        content_type = ContentType.objects.get_for_model(model)
+        contents = model.objects.filter(author_id=author_id).values_list('id', 'created_at')
+        FeedEntry.objects.bulk_create([
+            FeedEntry(owner_id=owner_id, author_id=author_id, content_type=content_type,
+                      object_id=object_id, created_at=created_at)
+            for object_id, created_at in contents.iterator()
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def connect(user1_id, user2_id):
+    """Connection created: add each user's contents to the other's timeline."""
+    backfill(user1_id, user2_id)
+    backfill(user2_id, user1_id)
+
+
+def disconnect(user1_id, user2_id):
+    """Connection deleted or user reported: drop each user's contents from the other's timeline."""
+    from account.models import FeedEntry
+
+    FeedEntry.objects.filter(
+        Q(owner_id=user1_id, author_id=user2_id) | Q(owner_id=user2_id, author_id=user1_id)
+    ).delete()
+
+
+def rebuild(owner_id):
+    """Recompute the timeline of owner from scratch."""
+    from account.models import FeedEntry
+
+    FeedEntry.objects.filter(owner_id=owner_id).delete()
+    blocked_ids = block_list.get_block_list(owner_id).blocked_user_ids
+    for author_id in connection_graph.get_graph(owner_id).connected_ids - blocked_ids:
+        backfill(owner_id, author_id)
+
@@ -0,0 +1,83 @@
+from django.db.models import Count
+from django.contrib.auth import get_user_model
+
+
+class FriendListLoader:
+    """
+    Everything FriendListSerializer needs about a page of friends of `user`,
+    computed with a fixed number of grouped queries instead of several per friend.
+    """
+
+    def __init__(self, user, friends):
+        self.user = user
+        self.friend_ids = [friend.id for friend in friends]
+        self._load()
+
+    def _load(self):
+        from chat.models import ChatRoom, UserChatActivity
+        from check_in.models import CheckIn
+        from ping.models import Ping
+
+        User = get_user_model()
+        user = self.user
+        friend_ids = self.friend_ids
+
+        self.favorite_ids = set(user.favorites.values_list('id', flat=True))
+        self.hidden_ids = set(user.hidden.values_list('id', flat=True))
+        self.connection_graph = user.connection_graph
+
+        self.unread_updates = dict(
+            User.objects.filter(id__in=friend_ids).with_updates_for(user)
+            .values_list('id', 'has_unread_updates')
+        )
+
+        self.check_ins = {}
+        check_ins = CheckIn.objects.visible_to(user).filter(user_id__in=friend_ids, is_active=True) \
+            .order_by('user_id', '-created_at')
+        for check_in in check_ins:
+            self.check_ins.setdefault(check_in.user_id, check_in)
+
+        # chat room shared with each friend, and the number of messages user has not read there
+        room_ids = {}
+        shared_rooms = ChatRoom.users.through.objects.filter(
+            user_id__in=friend_ids,
+            chatroom__users=user,
+            chatroom__deleted__isnull=True,
+        ).order_by('user_id', 'chatroom_id').values_list('user_id', 'chatroom_id')
+        for friend_id, room_id in shared_rooms:
+            room_ids.setdefault(friend_id, room_id)
+
+        unread_counts = dict(
+            UserChatActivity.objects.filter(user=user, chat_room_id__in=room_ids.values())
+            .values_list('chat_room_id', 'unread_count')
+        )
+        self.chat_unread_counts = {friend_id: unread_counts.get(room_id, 0)
+                                   for friend_id, room_id in room_ids.items()}
+
+        self.ping_unread_counts = dict(
+            Ping.objects.filter(receiver=user, sender_id__in=friend_ids, is_read=False)
+            .values('sender_id').annotate(cnt=Count('id')).values_list('sender_id', 'cnt')
+        )
+
+    def is_favorite(self, friend):
+        return friend.id in self.favorite_ids
+
+    def is_hidden(self, friend):
+        return friend.id in self.hidden_ids
+
+    def connection_status(self, friend):  # what user has set friend as
+        if friend.id == self.user.id:
+            return None
+        return self.connection_graph.choice_for(friend.id)
+
+    def current_user_read(self, friend):
+        return not self.unread_updates.get(friend.id, False)
+
+    def check_in(self, friend):
+        return self.check_ins.get(friend.id)
+
+    def chat_unread_cnt(self, friend):
+        return self.chat_unread_counts.get(friend.id, 0)
+
+    def ping_unread_cnt(self, friend):
+        return self.ping_unread_counts.get(friend.id, 0)
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from account import feed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized friend feed timelines (FeedEntry) used in push mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='rebuild only the timeline of this user (can be repeated)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        if not feed.is_push_mode():
+            self.stdout.write(self.style.WARNING(
+                "FRIEND_FEED_MODE is not 'push': timelines will not be kept up to date after this rebuild."))
+
+        count = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            with transaction.atomic():
+                feed.rebuild(user_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} feed timelines.'))
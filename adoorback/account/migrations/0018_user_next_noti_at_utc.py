@@ -0,0 +1,57 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:48
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def next_noti_at(timezone_name, noti_time, noti_period_days, after):
+    # copy of account.models.next_noti_at as of this migration
+    if noti_time is None or not noti_period_days:
+        return None
+    try:
+        zone = ZoneInfo(timezone_name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        zone = ZoneInfo(settings.TIME_ZONE)
+
+    local_now = after.astimezone(zone)
+    for days in range(8):
+        day = local_now.date() + timedelta(days=days)
+        if str(day.weekday()) not in noti_period_days:
+            continue
+        local_noti_at = datetime.combine(day, noti_time, tzinfo=zone)
+        if local_noti_at > local_now:
+            return local_noti_at.astimezone(dt_timezone.utc)
+    return None
+
+
+def set_next_noti_at_utc(apps, schema_editor):
+    User = apps.get_model('account', 'User')
+    now = timezone.now()
+    users = list(User.objects.only('timezone', 'noti_time', 'noti_period_days'))
+    for user in users:
+        user.next_noti_at_utc = next_noti_at(user.timezone, user.noti_time, user.noti_period_days, now)
+    User.objects.bulk_update(users, ['next_noti_at_utc'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0017_user_username_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='next_noti_at_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_next_noti_at_utc, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['next_noti_at_utc'], name='user_next_noti_idx'),
+        ),
+    ]
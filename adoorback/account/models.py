@@ -1,8 +1,9 @@
-from datetime import time
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 import glob
 import os
 import secrets
 import urllib.parse
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from django.apps import apps
 from django.conf import settings
@@ -12,17 +13,24 @@ from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.storage import FileSystemStorage
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models, transaction
-from django.db.models import Max, Q
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Value, When, Window
+from django.db.models.functions import Greatest, RowNumber, Upper
 from django.db.models.signals import post_save, post_delete
 from django.db.utils import IntegrityError
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from safedelete import DELETED_INVISIBLE
 from safedelete.models import SafeDeleteModel, SOFT_DELETE_CASCADE, HARD_DELETE
 from safedelete.managers import SafeDeleteManager
+from safedelete.queryset import SafeDeleteQueryset
+from safedelete.signals import post_undelete
 
+from account import block_list, connection_graph, feed
 from adoorback.models import AdoorTimestampedModel
 from adoorback.utils.validators import AdoorUsernameValidator
 from notification.models import NotificationActor
@@ -63,8 +71,88 @@ def default_noti_period_days():
     return ['0', '1', '2', '3', '4', '5', '6']
 
 
+def next_noti_at(timezone_name, noti_time, noti_period_days, after=None):
+    """
+    First time after `after` (default: now) that is `noti_time` in the zone `timezone_name`
+    on one of the weekdays of `noti_period_days` (as in datetime.weekday(): '0' is Monday), in UTC.
+    None if the user gets no daily notification.
+    """
+    if noti_time is None or not noti_period_days:
+        return None
+    try:
+        zone = ZoneInfo(timezone_name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        zone = ZoneInfo(settings.TIME_ZONE)
+
+    local_now = (after or timezone.now()).astimezone(zone)
+    for days in range(8):
+        day = local_now.date() + timedelta(days=days)
+        if str(day.weekday()) not in noti_period_days:
+            continue
+        local_noti_at = datetime.combine(day, noti_time, tzinfo=zone)
+        if local_noti_at > local_now:
+            return local_noti_at.astimezone(dt_timezone.utc)
+    return None
+
+
+class UserQuerySet(SafeDeleteQueryset):
+    def with_updates_for(self, reader):
+        """
+        Annotate users with what `reader` has not read yet among their contents visible to reader:
+        has_unread_updates (any unread note / response / active check-in) and
+        last_update_at (created_at of the most recent visible note / response / active check-in).
+        """
+        from check_in.models import CheckIn
+        from note.models import Note
+        from qna.models import Response
+
+        notes = Note.objects.visible_to(reader).filter(author=OuterRef('pk'))
+        responses = Response.objects.visible_to(reader).filter(author=OuterRef('pk'))
+        check_ins = CheckIn.objects.visible_to(reader).filter(user=OuterRef('pk'), is_active=True)
+
+        def last_created_at(queryset):
+            return Subquery(queryset.order_by('-created_at').values('created_at')[:1])
+
+        return self.annotate(
+            has_unread_updates=Exists(notes.exclude(readers=reader)) |
+                               Exists(responses.exclude(readers=reader)) |
+                               Exists(check_ins.exclude(readers=reader)),
+            last_update_at=Greatest(last_created_at(notes), last_created_at(responses), last_created_at(check_ins)),
+        )
+
+    def search(self, query, user, friends_only=False, non_friend_limit=10):
+        """
+        Users (other than `user`) whose username contains `query` (case insensitive), in one query:
+        connected users first, then prefix matches, then by trigram similarity and username.
+        All matching connected users are returned, but at most `non_friend_limit` others.
+        The substring match is served by the trigram index on UPPER(username) (username_trgm_idx).
+        """
+        friend_ids = user.connected_user_ids
+        users = self.filter(username__icontains=query).exclude(id=user.id)
+        if friends_only:
+            users = users.filter(id__in=friend_ids)
+
+        users = users.annotate(
+            is_connected=Case(When(id__in=friend_ids, then=Value(True)), default=Value(False)),
+            is_prefix=Case(When(username__istartswith=query, then=Value(True)), default=Value(False)),
+            similarity=TrigramSimilarity('username', query),
+        )
+        ordering = [F('is_connected').desc(), F('is_prefix').desc(), F('similarity').desc(), 'username']
+
+        if not friends_only:
+            users = users.annotate(
+                match_rank=Window(RowNumber(), partition_by=[F('is_connected')], order_by=ordering[1:]),
+            ).filter(Q(is_connected=True) | Q(match_rank__lte=non_friend_limit))
+
+        return users.order_by(*ordering)
+
+
 class UserCustomManager(UserManager, SafeDeleteManager):
     _safedelete_visibility = DELETED_INVISIBLE
+    _queryset_class = UserQuerySet
+
+    def search(self, query, user, **kwargs):
+        return self.get_queryset().search(query, user, **kwargs)
 
 
 class User(AbstractUser, AdoorTimestampedModel, SafeDeleteModel):
@@ -101,6 +189,8 @@ class User(AbstractUser, AdoorTimestampedModel, SafeDeleteModel):
         help_text="Days of the week for notifications, where 0=Sunday, 1=Monday, etc."
     )
     signup_noti_status = models.JSONField(default=dict)
+    # next daily notification (see next_noti_at), kept in sync with timezone, noti_time and noti_period_days
+    next_noti_at_utc = models.DateTimeField(null=True, blank=True)
     pronouns = models.CharField(null=True, max_length=30)
     bio = models.CharField(null=True, max_length=118)
 
@@ -130,6 +220,10 @@ class User(AbstractUser, AdoorTimestampedModel, SafeDeleteModel):
         indexes = [
             models.Index(fields=['id']),
             models.Index(fields=['username'], condition=models.Q(deleted__isnull=True), name='username_active_idx'),
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'), condition=models.Q(deleted__isnull=True),
+                     name='username_trgm_idx'),
+            models.Index(fields=['next_noti_at_utc'], condition=models.Q(deleted__isnull=True),
+                         name='user_next_noti_idx'),
         ]
         constraints = [
             models.UniqueConstraint(fields=['username'], condition=Q(deleted__isnull=True), name='unique_active_username')
@@ -149,8 +243,30 @@ class User(AbstractUser, AdoorTimestampedModel, SafeDeleteModel):
             if not new_favorites.issubset(current_connected_users) or not new_hidden.issubset(current_connected_users):
                 raise ValueError("Favorites and hidden must be among the user's connected users.")
 
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.NOTI_SCHEDULE_FIELDS):
+            schedule = self.noti_schedule
+            if schedule != getattr(self, '_loaded_noti_schedule', None):
+                self.next_noti_at_utc = next_noti_at(*schedule)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'next_noti_at_utc'}
+            self._loaded_noti_schedule = schedule
+
         super().save(*args, **kwargs)
 
+    NOTI_SCHEDULE_FIELDS = ('timezone', 'noti_time', 'noti_period_days')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if set(cls.NOTI_SCHEDULE_FIELDS).issubset(field_names):
+            instance._loaded_noti_schedule = instance.noti_schedule
+        return instance
+
+    @property
+    def noti_schedule(self):
+        return self.timezone, self.noti_time, list(self.noti_period_days or [])
+
     @classmethod
     # TODO: fade out
     def are_friends(cls, user1, user2):
@@ -158,192 +274,97 @@ class User(AbstractUser, AdoorTimestampedModel, SafeDeleteModel):
 
     @classmethod
     def user_read(cls, user1, user2):
-        # Check if user1 has read all of user2's responses
-        user2_response_queryset = user1.can_access_response_set(user2)
-        if any(user1.id not in response.reader_ids for response in user2_response_queryset):
-            return False
-
-        # Check if user1 has read user2's current check-in
-        user2_check_in = user1.can_access_check_in(user2)
-        if user2_check_in and user1.id not in user2_check_in.reader_ids:
-            return False
-
-        # Check if user1 has read user2's notes
-        user2_note_queryset = user1.can_access_note_set(user2)
-        if any(user1.id not in note.reader_ids for note in user2_note_queryset):
-            return False
-
-        return True
+        # Check if user1 has read all of user2's responses, notes and current check-in
+        return not cls.objects.filter(pk=user2.pk).with_updates_for(user1) \
+            .values_list('has_unread_updates', flat=True).get()
 
     @property
     def type(self):
         return self.__class__.__name__
 
+    @property
+    def connection_graph(self):
+        return connection_graph.get_graph(self.id)
+
     def is_connected(self, user):
         """Checks if self (current user) is connected with user"""
-        return Connection.objects.filter(
-            Q(user1=user, user2=self) | Q(user1=self, user2=user)
-        ).exists()
+        return self.connection_graph.is_connected(user.id)
 
     def is_neighbor(self, user):
         """Checks if self (current user) is a 'neighbor' of user"""
-        return Connection.objects.filter(
-            Q(user1=user, user2=self, user1_choice='neighbor') |
-            Q(user1=self, user2=user, user2_choice='neighbor')
-        ).exists()
+        return self.id in user.connection_graph.neighbor_ids
 
     def is_friend(self, user):
         """Checks if self (current user) is a 'friend' of user"""
-        return Connection.objects.filter(
-            Q(user1=user, user2=self, user1_choice='friend') |
-            Q(user1=self, user2=user, user2_choice='friend')
-        ).exists()
+        return self.id in user.connection_graph.friend_ids
 
     @property
     def connected_users(self):
-        connections = Connection.objects.filter(
-            Q(user1=self) | Q(user2=self)
-        ).values_list('user1', 'user2')
-
-        id_list = [
-            user2_id if user1_id == self.id else user1_id
-            for user1_id, user2_id in connections
-        ]
-
-        return User.objects.filter(id__in=id_list)
+        return User.objects.filter(id__in=self.connected_user_ids)
     
     @property
     def neighbors(self):
-        connections = Connection.objects.filter(
-            Q(user1=self, user1_choice='neighbor') | 
-            Q(user2=self, user2_choice='neighbor')
-        ).values_list('user1', 'user2')
-
-        id_list = [
-            user2_id if user1_id == self.id else user1_id
-            for user1_id, user2_id in connections
-        ]
-
-        return User.objects.filter(id__in=id_list)
+        return User.objects.filter(id__in=self.neighbor_ids)
     
     @property
     def friends_(self):  # TODO: change to friends after 'friends' field is removed
-        connections = Connection.objects.filter(
-            Q(user1=self, user1_choice='friend') | 
-            Q(user2=self, user2_choice='friend')
-        ).values_list('user1', 'user2')
-
-        id_list = [
-            user2_id if user1_id == self.id else user1_id
-            for user1_id, user2_id in connections
-        ]
-
-        return User.objects.filter(id__in=id_list)
+        return User.objects.filter(id__in=self.friend_ids)
 
     @property
     def connected_user_ids(self):
-        connections = Connection.objects.filter(
-            Q(user1=self) | Q(user2=self)
-        ).values_list('user1', 'user2')
-
-        id_list = [
-            user2_id if user1_id == self.id else user1_id
-            for user1_id, user2_id in connections
-        ]
-
-        return id_list
+        return list(self.connection_graph.connected_ids)
 
     @property
     def neighbor_ids(self):
-        connections = Connection.objects.filter(
-            Q(user1=self, user1_choice='neighbor') | 
-            Q(user2=self, user2_choice='neighbor')
-        ).values_list('user1', 'user2')
-
-        id_list = [
-            user2_id if user1_id == self.id else user1_id
-            for user1_id, user2_id in connections
-        ]
-
-        return id_list
+        return list(self.connection_graph.neighbor_ids)
 
     @property
     def friend_ids(self):
-        connections = Connection.objects.filter(
-            Q(user1=self, user1_choice='friend') | 
-            Q(user2=self, user2_choice='friend')
-        ).values_list('user1', 'user2')
-
-        id_list = [
-            user2_id if user1_id == self.id else user1_id
-            for user1_id, user2_id in connections
-        ]
+        return list(self.connection_graph.friend_ids)
 
-        return id_list
+    @property
+    def block_list(self):
+        return block_list.get_block_list(self.id)
 
     @property
     def reported_user_ids(self):
-        from user_report.models import UserReport
-        return list(UserReport.objects.filter(user=self).values_list('reported_user_id', flat=True))
+        return self.block_list.reported_user_ids
 
     @property
     def user_report_blocked_ids(self):  # returns ids of users
-        from user_report.models import UserReport
-        return list(UserReport.objects.filter(user=self).values_list('reported_user_id', flat=True)) + list(
-            UserReport.objects.filter(reported_user=self).values_list('user_id', flat=True))
+        return self.block_list.blocked_user_ids
 
     @property
-    def content_report_blocked_model_ids(self):  # returns ids of posts
-        from content_report.models import ContentReport
-        blocked_contents = []
-        for report in self.content_report_set.all():
-            content_type = ContentType.objects.get_for_id(report.content_type_id).model
-            blocked_contents.append((content_type, report.object_id))
-        return blocked_contents
+    def content_report_blocked_model_ids(self):  # returns (model name, id) of posts
+        return frozenset((ContentType.objects.get_for_id(content_type_id).model, object_id)
+                         for content_type_id, object_id in self.block_list.reported_contents)
+
+    def has_reported_content(self, obj):
+        return self.block_list.is_content_blocked(obj)
 
     @property
     def unread_message_cnt(self):
-        chat_rooms = self.chat_rooms.all()
-        unread_cnt = 0
-        for room in chat_rooms:
-            unread_cnt += room.unread_cnt(self)
-        return unread_cnt
+        from chat.models import UserChatActivity
+        return UserChatActivity.objects.total_unread_count(self)
 
     def most_recent_update(self, user):
         # most recent update time of self (among self's content that user can access)
-        most_recent_response = user.can_access_response_set(self).aggregate(Max('created_at'))['created_at__max']
-        most_recent_check_in = user.can_access_check_in(self)
-        if most_recent_check_in:
-            most_recent_check_in = most_recent_check_in.created_at
-        most_recent_note = user.can_access_note_set(self).aggregate(Max('created_at'))['created_at__max']
-        most_recent_times = [most_recent_response, most_recent_check_in, most_recent_note]
-        most_recent_times = [time for time in most_recent_times if time is not None]
-        
-        if most_recent_times:
-            return max(most_recent_times)
-        else:
-            return None
+        return User.objects.filter(pk=self.pk).with_updates_for(user) \
+            .values_list('last_update_at', flat=True).get()
 
     def can_access_response_set(self, user):
         # return responses of user that self can access
         from qna.models import Response
-        response_ids = [response.id for response in user.response_set.all() if Response.is_audience(response, self)]
-        response_queryset = Response.objects.filter(id__in=response_ids)
-        return response_queryset
+        return Response.objects.visible_to(self).filter(author=user)
 
     def can_access_check_in(self, user):
         # return check-in of user that self can access
         from check_in.models import CheckIn
-        check_in = user.check_in_set.filter(is_active=True).first()
-        if check_in and CheckIn.is_audience(check_in, self):
-            return check_in
-        return None
+        return CheckIn.objects.visible_to(self).filter(user=user, is_active=True).first()
 
     def can_access_note_set(self, user):
         from note.models import Note
-        note_ids = [note.id for note in user.note_set.all() if Note.is_audience(note, self)]
-        note_queryset = Note.objects.filter(id__in=note_ids)
-        return note_queryset
+        return Note.objects.visible_to(self).filter(author=user)
 
 
 class FriendRequest(AdoorTimestampedModel, SafeDeleteModel):
@@ -489,6 +510,74 @@ class Subscription(AdoorTimestampedModel, SafeDeleteModel):
         return f'{self.subscriber} subscribed to {self.content_type} of {self.subscribed_to}'
 
 
+class FeedEntry(models.Model):
+    """
+    Materialized friend feed (push mode, see account.feed):
+    one row per (owner, note/response of a connected user).
+    """
+    owner = models.ForeignKey(get_user_model(), related_name='feed_entries', on_delete=models.CASCADE)
+    author = models.ForeignKey(get_user_model(), related_name='+', on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField()  # created_at of the content
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'content_type', 'object_id'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            # covers FriendFeed's keyset scan: (owner) + ordering
+            models.Index(fields=['owner', '-created_at', '-content_type', '-object_id'], name='feed_entry_timeline_idx'),
+            models.Index(fields=['owner', 'author'], name='feed_entry_owner_author_idx'),
+            models.Index(fields=['content_type', 'object_id'], name='feed_entry_content_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type} {self.object_id} in feed of {self.owner}'
+
+
+class FriendRecommendation(models.Model):
+    """
+    Precomputed friends-of-friends recommendations (see account.recommendations),
+    refreshed nightly by account.cron.RefreshFriendRecommendationsCronJob.
+    """
+    user = models.ForeignKey(get_user_model(), related_name='friend_recommendations', on_delete=models.CASCADE)
+    recommended_user = models.ForeignKey(get_user_model(), related_name='+', on_delete=models.CASCADE)
+    mutual_count = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recommended_user'], name='unique_friend_recommendation'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='friend_rec_user_rank_idx'),
+        ]
+        ordering = ['user', 'rank']
+
+    def __str__(self):
+        return f'{self.recommended_user} recommended to {self.user} ({self.mutual_count} mutuals)'
+
+
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+def invalidate_connection_graph(instance, **kwargs):
+    connection_graph.invalidate(instance.user1_id, instance.user2_id)
+
+
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+@receiver(post_undelete, sender=Connection)
+def update_feed_timelines(instance, signal, created=False, **kwargs):
+    if not feed.is_push_mode():
+        return
+    if signal is post_delete or instance.deleted:
+        feed.disconnect(instance.user1_id, instance.user2_id)
+    elif created or signal is post_undelete:
+        feed.connect(instance.user1_id, instance.user2_id)
+
+
 @transaction.atomic
 @receiver(post_delete, sender=Connection)
 def connection_removed(instance, **kwargs):
@@ -588,9 +677,9 @@ def create_connection_noti(created, instance, **kwargs):
         chat_room.users.add(requester, requestee)
 
     # make friend request notification invisible once requestee has responded
-    instance.friend_request_targetted_notis.filter(user=requestee,
-                                                   actors__id=requester.id).update(is_read=True,
-                                                                                   is_visible=False)
+    notis = instance.friend_request_targetted_notis.filter(user=requestee, actors__id=requester.id)
+    notis.mark_read()
+    notis.update(is_visible=False)
 
 
 @transaction.atomic
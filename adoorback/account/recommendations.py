@@ -0,0 +1,81 @@
+"""
+Friends-of-friends recommendations.
+
+Candidates of a user are the users connected to their connections, ranked by the number of
+mutual connections, excluding the user themself, users already connected with them,
+users whose recommendation they blocked (BlockRec) and users they already sent a FriendRequest.
+Everything is computed in one SQL statement over both directions of Connection.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from account.models import BlockRec, Connection, FriendRecommendation, FriendRequest
+
+
+RECOMMENDATION_LIMIT = 25
+REFRESH_BATCH_SIZE = 1000
+
+
+def _recommendation_sql():
+    """rows (user_id, candidate_id, mutual_count, rank) for the users in %(user_ids)s"""
+    return f'''
+        WITH edges AS (
+            SELECT user1_id AS user_id, user2_id AS other_id
+            FROM {Connection._meta.db_table} WHERE deleted IS NULL
+            UNION ALL
+            SELECT user2_id AS user_id, user1_id AS other_id
+            FROM {Connection._meta.db_table} WHERE deleted IS NULL
+        ),
+        mutuals AS (
+            SELECT e1.user_id, e2.other_id AS candidate_id, COUNT(*) AS mutual_count
+            FROM edges e1
+            JOIN edges e2 ON e2.user_id = e1.other_id
+            JOIN {get_user_model()._meta.db_table} candidate
+                ON candidate.id = e2.other_id AND candidate.deleted IS NULL
+            WHERE e1.user_id = ANY(%(user_ids)s)
+              AND e2.other_id <> e1.user_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM edges e3 WHERE e3.user_id = e1.user_id AND e3.other_id = e2.other_id)
+              AND NOT EXISTS (
+                  SELECT 1 FROM {BlockRec._meta.db_table} b
+                  WHERE b.user_id = e1.user_id AND b.blocked_user_id = e2.other_id AND b.deleted IS NULL)
+              AND NOT EXISTS (
+                  SELECT 1 FROM {FriendRequest._meta.db_table} r
+                  WHERE r.requester_id = e1.user_id AND r.requestee_id = e2.other_id AND r.deleted IS NULL)
+            GROUP BY e1.user_id, e2.other_id
+        ),
+        ranked AS (
+            SELECT user_id, candidate_id, mutual_count,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY mutual_count DESC, candidate_id) AS rank
+            FROM mutuals
+        )
+        SELECT user_id, candidate_id, mutual_count, rank FROM ranked WHERE rank <= %(limit)s
+    '''
+
+
+def compute_recommendations(user_id, limit=RECOMMENDATION_LIMIT):
+    """[(candidate_id, mutual_count)] for one user, best first."""
+    with connection.cursor() as cursor:
+        cursor.execute(_recommendation_sql() + ' ORDER BY rank', {'user_ids': [user_id], 'limit': limit})
+        return [(candidate_id, mutual_count) for _, candidate_id, mutual_count, _ in cursor.fetchall()]
+
+
+def refresh_recommendations(user_ids, limit=RECOMMENDATION_LIMIT):
+    """Replace the stored recommendations of the given users."""
+    user_ids = list(user_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        FriendRecommendation.objects.filter(user_id__in=user_ids).delete()
+        cursor.execute(f'''
+            INSERT INTO {FriendRecommendation._meta.db_table}
+                (user_id, recommended_user_id, mutual_count, rank, created_at)
+            SELECT user_id, candidate_id, mutual_count, rank, NOW()
+            FROM ({_recommendation_sql()}) AS recommendations
+        ''', {'user_ids': user_ids, 'limit': limit})
+
+
+def refresh_all_recommendations(batch_size=REFRESH_BATCH_SIZE):
+    user_ids = list(get_user_model().objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        refresh_recommendations(user_ids[start:start + batch_size])
+    # drop rows of users that were deleted since the last refresh
+    FriendRecommendation.objects.exclude(user_id__in=get_user_model().objects.values('id')).delete()
@@ -1,5 +1,5 @@
 from django.db import transaction
-from django.db.models import Count, Q
+from django.db.models import Q
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
@@ -7,13 +7,12 @@ from django.urls import reverse
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 
+from account.loaders import FriendListLoader
 from account.models import FriendRequest, BlockRec, Connection
 from adoorback.utils.exceptions import ExistingEmail, ExistingUsername
 from check_in.models import CheckIn
-from note.models import Note
-from notification.models import Notification
-from ping.models import get_ping_room, get_or_create_ping_room
-from qna.models import Response
+from notification.models import NotificationCounter
+from ping.models import get_ping_room
 
 from django_countries.serializers import CountryFieldMixin
 
@@ -28,8 +27,7 @@ class CurrentUserSerializer(CountryFieldMixin, serializers.HyperlinkedModelSeria
         return settings.BASE_URL + reverse('user-detail', kwargs={'username': obj.username})
 
     def get_unread_noti(self, obj):
-        unread_notis = Notification.objects.filter(user=obj, is_read=False)
-        return True if unread_notis else False
+        return NotificationCounter.objects.unread_count(obj) > 0
 
     def validate_noti_period_days(self, value):
         if not isinstance(value, list):
@@ -132,8 +130,8 @@ class UserProfileSerializer(UserMinimalSerializer):
     def get_check_in(self, obj):
         from check_in.serializers import CheckInBaseSerializer
         user = self.context.get('request', None).user
-        check_in = obj.check_in_set.filter(is_active=True).first()
-        if check_in and CheckIn.is_audience(check_in, user):
+        check_in = CheckIn.objects.visible_to(user).filter(user=obj, is_active=True).first()
+        if check_in:
             return CheckInBaseSerializer(check_in, read_only=True, context=self.context).data
         return {}
 
@@ -191,7 +189,20 @@ class UserProfileSerializer(UserMinimalSerializer):
                                                       'pronouns', 'bio', 'unread_ping_count', 'connection_status']
 
 
+class FriendListListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        friends = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            self._context['friend_list_loader'] = FriendListLoader(request.user, friends)
+        return super().to_representation(friends)
+
+
 class FriendListSerializer(UserMinimalSerializer):
+    """
+    Per-friend values come from a FriendListLoader in the context,
+    built once per page by FriendListListSerializer (or per friend when serialized alone).
+    """
     url = serializers.SerializerMethodField(read_only=True)
     is_favorite = serializers.SerializerMethodField(read_only=True)
     is_hidden = serializers.SerializerMethodField(read_only=True)
@@ -202,106 +213,65 @@ class FriendListSerializer(UserMinimalSerializer):
     description = serializers.SerializerMethodField(read_only=True)
     unread_ping_count = serializers.SerializerMethodField(read_only=True)
 
+    def loader(self, obj):
+        loader = self.context.get('friend_list_loader')
+        if loader is None or obj.id not in loader.friend_ids:
+            loader = FriendListLoader(self.context['request'].user, [obj])
+            self._context['friend_list_loader'] = loader
+        return loader
+
     def get_url(self, obj):
         return settings.BASE_URL + reverse('user-detail', kwargs={'username': obj.username})
 
     def get_is_favorite(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj in request.user.favorites.all()
+            return self.loader(obj).is_favorite(obj)
         return False
 
     def get_is_hidden(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj in request.user.hidden.all()
+            return self.loader(obj).is_hidden(obj)
         return False
     
     def get_connection_status(self, obj):  # what user has set obj as
-        user = self.context.get('request', None).user
-        if user == obj:
-            return None
-        if user.is_connected(obj):
-            if obj.is_neighbor(user):
-                return 'neighbor'
-            if obj.is_friend(user):
-                return 'friend'
-        return None
+        return self.loader(obj).connection_status(obj)
 
     def get_current_user_read(self, obj):
-        from check_in.serializers import CheckInBaseSerializer
-        responses = self.responses(obj)
-        notes = self.notes(obj)
-        check_in = self.check_in(obj)
-        if check_in:
-            check_in_data = CheckInBaseSerializer(check_in, read_only=True, context=self.context).data
-        else:
-            check_in_data = {}
-
-        current_user_read = not any(not response['current_user_read'] for response in responses) \
-                            and not any(not note['current_user_read'] for note in notes) \
-                            and not (check_in_data and not check_in_data['current_user_read'])
-        return current_user_read
+        return self.loader(obj).current_user_read(obj)
     
     def get_unread_cnt(self, obj):
-        from chat.models import ChatRoom
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            user = request.user
-            chat_room = ChatRoom.objects.filter(users__in=[user, obj]).annotate(user_count=Count('users')).filter(user_count=2).first()
-            if chat_room:
-                return chat_room.unread_cnt(user)
+            return self.loader(obj).chat_unread_cnt(obj)
         return 0
 
-    def check_in(self, obj):
-        user = self.context.get('request', None).user
-        check_in = obj.check_in_set.filter(is_active=True).first()
-        if check_in and CheckIn.is_audience(check_in, user):
-            return check_in
-        return None
-
     def get_track_id(self, obj):
-        check_in = self.check_in(obj)
+        check_in = self.loader(obj).check_in(obj)
         if check_in:
             return check_in.track_id
         else:
             return None
 
     def get_description(self, obj):
-        check_in = self.check_in(obj)
+        check_in = self.loader(obj).check_in(obj)
         if check_in:
             return check_in.description
         else:
             return None
 
-    def responses(self, obj):
-        from qna.serializers import ResponseSerializer
-        user = self.context.get('request', None).user
-        response_ids = [response.id for response in obj.response_set.all() if Response.is_audience(response, user)]
-        response_queryset = Response.objects.filter(id__in=response_ids).order_by('question__id', 'created_at')
-        responses = ResponseSerializer(response_queryset, many=True, read_only=True, context=self.context).data
-        return responses
-
-    def notes(self, obj):
-        from note.serializers import NoteSerializer
-        user = self.context.get('request', None).user
-        note_ids = [note.id for note in obj.note_set.all() if Note.is_audience(note, user)]
-        note_queryset = Note.objects.filter(id__in=note_ids)
-        notes = NoteSerializer(note_queryset, many=True, read_only=True, context=self.context).data
-        return notes
-    
     def get_unread_ping_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            user = request.user
-            ping_room = get_or_create_ping_room(user, obj)
-            return ping_room.pings.filter(receiver=user, is_read=False).count()
+            return self.loader(obj).ping_unread_cnt(obj)
         return 0
 
     class Meta(UserMinimalSerializer.Meta):
         model = User
         fields = UserMinimalSerializer.Meta.fields + ['is_favorite', 'is_hidden', 'connection_status', 'current_user_read',
                                                       'unread_cnt', 'bio', 'track_id', 'description', 'unread_ping_count']
+        list_serializer_class = FriendListListSerializer
 
 
 class UserFriendsUpdateSerializer(serializers.ModelSerializer):
@@ -1,3 +1,195 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from account import feed
+from account.models import Connection, FeedEntry
+from adoorback.utils.content_types import get_generic_relation_type
+from comment.models import Comment
+from like.models import Like
+from note.models import Note
+from note.serializers import NoteSerializer
+from qna.models import Question, Response
+from qna.serializers import ResponseSerializer
+from reaction.models import Reaction
+from user_report.models import UserReport
+
+User = get_user_model()
+
+
+def create_admin():
+    # sender of the notifications of the app (signup, daily question, ...)
+    return User.objects.create_superuser(username='whoami', email='team.whoami.today@gmail.com', password='Test1234!')
+
+
+def create_users(prefix, count):
+    return [User.objects.create_user(username=f'{prefix}{i}', email=f'{prefix}{i}@test.com', password='Test1234!')
+            for i in range(count)]
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    The views are called over pages of several objects: a query run once per object
+    makes them go over their `query_budget`, which fails the request (QUERY_BUDGET_STRICT).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_admin()
+        cls.user = User.objects.create_user(username='reader', email='reader@test.com', password='Test1234!')
+        cls.friends = create_users('friend', 6)
+        for i, friend in enumerate(cls.friends):
+            Connection.objects.create(user1=cls.user, user2=friend, user1_choice='friend',
+                                      user2_choice='neighbor' if i % 2 else 'friend')
+        cls.user.favorites.add(*cls.friends[:3])
+        cls.read_notes = set()
+
+        question = Question.objects.create(author=cls.user, content_en='question', content_ko='질문',
+                                           is_admin_question=True)
+        for friend in cls.friends:
+            contents = [Note.objects.create(author=friend, content=f'note {i} of {friend.username}') for i in range(2)]
+            contents.append(Response.objects.create(author=friend, question=question,
+                                                    content=f'response of {friend.username}'))
+            # likes, reactions, comments and reads shown with every note/response of the feed
+            for content in contents:
+                content_type = get_generic_relation_type(content.type)
+                for user in (cls.user, *cls.friends[:4]):
+                    Like.objects.create(user=user, content_type=content_type, object_id=content.id)
+                    Reaction.objects.create(user=user, content_type=content_type, object_id=content.id, emoji='❤️')
+                    Comment.objects.create(author=user, content_type=content_type, object_id=content.id,
+                                           content='comment')
+            contents[0].readers.add(cls.user)
+            cls.read_notes.add(contents[0].id)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_friend_feed(self):
+        response = self.client.get('/api/user/feed/', {'size': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+        for content in response.data['results']:
+            self.assertEqual(content['comment_count'], 5)
+            self.assertIsNotNone(content['current_user_like_id'])
+            self.assertEqual(content['current_user_read'],
+                             content['type'] == 'Note' and content['id'] in self.read_notes)
+            self.assertEqual(len(content['current_user_reaction_id_list']), 1)
+            self.assertEqual(len(content['like_reaction_user_sample']), 3)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_friend_feed_content_loader(self):
+        # a page serialized with its ContentLoader is the same as serialized one note/response at a time
+        response = self.client.get('/api/user/feed/', {'size': 18})
+        context = {'request': response.renderer_context['request']}
+        for content in response.data['results']:
+            if content['type'] == 'Note':
+                expected = NoteSerializer(Note.objects.get(id=content['id']), context=context).data
+            else:
+                expected = ResponseSerializer(Response.objects.get(id=content['id']), context=context).data
+            self.assertEqual(content, expected)
+
+    def test_friend_feed_page_size(self):
+        # the queries of a page do not depend on its number of notes/responses
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get('/api/user/feed/', {'size': 2})
+        with CaptureQueriesContext(connection) as large_page:
+            self.client.get('/api/user/feed/', {'size': 18})
+        self.assertEqual(len(small_page), len(large_page))
+
+    @override_settings(FRIEND_FEED_MODE='push')
+    def test_friend_feed_push(self):
+        feed.rebuild(self.user.id)
+        response = self.client.get('/api/user/feed/', {'size': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_friend_list(self):
+        for query_type, count in (('all', 6), ('has_updates', 6), ('favorites', 3)):
+            response = self.client.get('/api/user/friends/', {'type': query_type})
+            self.assertEqual(response.status_code, 200, query_type)
+            self.assertEqual(response.data['count'], count, query_type)
+
+    def test_user_profile(self):
+        for user in (self.user, self.friends[0]):
+            response = self.client.get(f'/api/user/{user.username}/profile/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['username'], user.username)
+
+
+@override_settings(FRIEND_FEED_MODE='push')
+class FeedEntryTestCase(APITestCase):
+    """FeedEntry timelines (push mode) follow the writes of notes, responses, connections and user reports"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_admin()
+        cls.user = User.objects.create_user(username='reader', email='reader@test.com', password='Test1234!')
+        cls.friends = create_users('friend', 3)
+        cls.stranger = User.objects.create_user(username='stranger', email='stranger@test.com', password='Test1234!')
+        cls.question = Question.objects.create(author=cls.user, content_en='question', content_ko='질문',
+                                               is_admin_question=True)
+
+    def setUp(self):
+        for friend in self.friends:
+            Connection.objects.create(user1=self.user, user2=friend, user1_choice='friend', user2_choice='friend')
+
+    def timeline(self, owner):
+        return set(FeedEntry.objects.filter(owner=owner).values_list('author_id', 'content_type_id', 'object_id'))
+
+    def assertRebuilt(self, *owners):
+        for owner in owners or (self.user, *self.friends, self.stranger):
+            timeline = self.timeline(owner)
+            feed.rebuild(owner.id)
+            self.assertEqual(self.timeline(owner), timeline, owner.username)
+
+    def test_fan_out(self):
+        note = Note.objects.create(author=self.friends[0], content='note')
+        response = Response.objects.create(author=self.friends[1], question=self.question, content='response')
+        Note.objects.create(author=self.stranger, content='note')
+        self.assertEqual({object_id for _, _, object_id in self.timeline(self.user)}, {note.id, response.id})
+        self.assertEqual(FeedEntry.objects.filter(owner=self.stranger).count(), 0)
+        self.assertRebuilt()
+
+    def test_remove(self):
+        note = Note.objects.create(author=self.user, content='note')
+        response = Response.objects.create(author=self.user, question=self.question, content='response')
+        self.assertEqual(FeedEntry.objects.filter(author=self.user).count(), 6)
+
+        note.delete()
+        self.assertEqual(FeedEntry.objects.filter(author=self.user).count(), 3)
+        self.assertRebuilt()
+        response.delete()
+        self.assertFalse(FeedEntry.objects.filter(author=self.user).exists())
+        self.assertRebuilt()
+
+    def test_connection(self):
+        Note.objects.create(author=self.stranger, content='note')
+        Note.objects.create(author=self.user, content='note')
+        connection = Connection.objects.create(user1=self.stranger, user2=self.user, user1_choice='friend',
+                                               user2_choice='friend')
+        self.assertTrue(FeedEntry.objects.filter(owner=self.user, author=self.stranger).exists())
+        self.assertTrue(FeedEntry.objects.filter(owner=self.stranger, author=self.user).exists())
+        self.assertRebuilt()
+
+        connection.delete()
+        self.assertFalse(FeedEntry.objects.filter(owner=self.user, author=self.stranger).exists())
+        self.assertFalse(FeedEntry.objects.filter(owner=self.stranger, author=self.user).exists())
+        self.assertRebuilt()
+
+    def test_user_report(self):
+        Note.objects.create(author=self.friends[0], content='note')
+        Note.objects.create(author=self.user, content='note')
+        UserReport.objects.create(user=self.user, reported_user=self.friends[0])
+        self.assertFalse(FeedEntry.objects.filter(owner=self.user, author=self.friends[0]).exists())
+        self.assertFalse(FeedEntry.objects.filter(owner=self.friends[0], author=self.user).exists())
+        self.assertRebuilt()
+
+        # contents written after the report are not fanned out either
+        Note.objects.create(author=self.friends[0], content='note')
+        self.assertFalse(FeedEntry.objects.filter(owner=self.user, author=self.friends[0]).exists())
+        self.assertRebuilt()
@@ -1,5 +1,4 @@
 from datetime import timedelta
-from itertools import chain
 import json
 
 from django.apps import apps
@@ -10,7 +9,6 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.db import transaction, IntegrityError
 from django.db.models import F, Q, Max, Case, When, Value, IntegerField
-from django.db.models.functions import Lower
 from django.http import HttpResponse, HttpResponseNotAllowed, Http404
 from django.middleware import csrf
 from django.shortcuts import get_object_or_404
@@ -27,7 +25,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from safedelete.models import SOFT_DELETE_CASCADE
 
 from .email import email_manager
-from .models import Subscription, Connection
+from .models import Subscription, Connection, FeedEntry
+from account import feed
+from account.recommendations import compute_recommendations
 from account.models import FriendRequest, BlockRec
 from account.serializers import (CurrentUserSerializer, \
                                  UserFriendRequestCreateSerializer, UserFriendRequestUpdateSerializer, \
@@ -37,9 +37,11 @@ from account.serializers import (CurrentUserSerializer, \
                                  UserFriendsUpdateSerializer, UserMinimumSerializer, BlockRecSerializer, \
                                  UserFriendRequestSerializer, UserPasswordSerializer, UserProfileSerializer, \
                                  ConnectionChoiceUpdateSerializer)
+from adoorback.loaders import ContentLoader
 from adoorback.utils.content_types import get_generic_relation_type, get_friend_request_type
 from adoorback.utils.exceptions import ExistingUsername, LongUsername, InvalidUsername, ExistingEmail, InvalidEmail, \
     NoUsername, WrongPassword, ExistingUsername
+from adoorback.utils.pagination import KeysetCursorPagination
 from adoorback.utils.validators import adoor_exception_handler
 from note.models import Note
 from note.serializers import NoteSerializer, DefaultFriendNoteSerializer
@@ -346,37 +348,9 @@ class UserSearch(generics.ListAPIView):
 
     def get_queryset(self):
         query = self.request.GET.get('query')
-        user = self.request.user
-        user_id = user.id
-        friend_ids = user.connected_user_ids
-
-        qs = User.objects.none()
-        if query:
-            # username starts with query
-            start_users = User.objects.filter(username__startswith=query).order_by('username').exclude(id=user_id)
-            friend_start_ids = list(start_users.filter(id__in=friend_ids).values_list('id', flat=True))
-            nonfriend_start_ids = list(start_users.exclude(id__in=friend_ids).values_list('id', flat=True))
-
-            # username contains query
-            contain_users = User.objects.filter(username__icontains=query).order_by('username').exclude(id=user_id)
-            friend_contain_ids = list(contain_users.filter(id__in=friend_ids).values_list('id', flat=True))
-            nonfriend_contain_ids = list(contain_users.exclude(id__in=friend_ids).values_list('id', flat=True))
-
-            # all friend users
-            qs_ids = friend_start_ids + friend_contain_ids
-
-            # only 10 non-friend users
-            nonfriend_qs_ids = nonfriend_start_ids[:10]
-            if len(nonfriend_qs_ids) < 10:
-                nonfriend_qs_ids += nonfriend_contain_ids[:10 - len(nonfriend_qs_ids)]
-
-            # merge querysets while preserving order
-            qs_ids += nonfriend_qs_ids
-            cases = [When(id=x, then=Value(i)) for i, x in enumerate(qs_ids)]
-            case = Case(*cases, output_field=IntegerField())
-            qs = User.objects.filter(id__in=qs_ids).annotate(my_order=case).order_by('my_order')
-
-        return qs
+        if not query:
+            return User.objects.none()
+        return User.objects.search(query, self.request.user)
 
 
 class CurrentUserFriendSearch(generics.ListAPIView):
@@ -387,19 +361,13 @@ class CurrentUserFriendSearch(generics.ListAPIView):
         return adoor_exception_handler
 
     def get_queryset(self):
-        query = self.request.GET.get('query', '').replace(" ", "").lower()
+        query = self.request.GET.get('query', '').replace(" ", "")
         user = self.request.user
-        friends = user.connected_users.annotate(lower_username=Lower('username'))
 
         if query:
-            start_friends = friends.filter(lower_username__startswith=query).order_by('username')
-            contain_friends = friends.filter(lower_username__icontains=query).order_by('username')
-
-            qs = start_friends.union(contain_friends, all=False)  # start_friends first *then* contain_friends
+            return User.objects.search(query, user, friends_only=True)
 
-            return qs
-
-        return friends
+        return user.connected_users
 
 
 class UserProfile(generics.RetrieveAPIView):
@@ -407,6 +375,7 @@ class UserProfile(generics.RetrieveAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'username'
+    query_budget = 12
 
     def get_exception_handler(self):
         return adoor_exception_handler
@@ -421,9 +390,8 @@ class UserNoteList(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        all_notes = Note.objects.filter(author__username=self.kwargs.get('username'))
-        note_ids = [note.id for note in all_notes if note.is_audience(user)]
-        return Note.objects.filter(id__in=note_ids).order_by('-created_at')
+        return Note.objects.visible_to(user).filter(author__username=self.kwargs.get('username')) \
+            .order_by('-created_at')
 
 
 class DefaultUserNoteList(generics.ListAPIView):
@@ -435,9 +403,8 @@ class DefaultUserNoteList(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        all_notes = Note.objects.filter(author__username=self.kwargs.get('username'))
-        note_ids = [note.id for note in all_notes if note.is_audience(user)]
-        return Note.objects.filter(id__in=note_ids).order_by('-created_at')
+        return Note.objects.visible_to(user).filter(author__username=self.kwargs.get('username')) \
+            .order_by('-created_at')
 
 
 class UserResponseList(generics.ListAPIView):
@@ -456,9 +423,8 @@ class UserResponseList(generics.ListAPIView):
             lang = self.request.META['HTTP_ACCEPT_LANGUAGE']
             translation.activate(lang)
         user = self.request.user
-        all_responses = _Response.objects.filter(author__username=self.kwargs.get('username')).order_by('-created_at')
-        response_ids = [response.id for response in all_responses if response.is_audience(user)]
-        return _Response.objects.filter(id__in=response_ids)
+        return _Response.objects.visible_to(user).filter(author__username=self.kwargs.get('username')) \
+            .order_by('-created_at')
 
 
 class CurrentUserDetail(generics.RetrieveUpdateAPIView):
@@ -634,6 +600,7 @@ class ReceivedResponseRequestList(generics.ListAPIView):
 class FriendList(generics.ListAPIView):
     serializer_class = FriendListSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 12
 
     def get_exception_handler(self):
         return adoor_exception_handler
@@ -651,11 +618,8 @@ class FriendList(generics.ListAPIView):
         if query_type == 'all':
             return friends.order_by('username')
         elif query_type == 'has_updates':
-            friends = friends.exclude(hidden=True)
-            friends_with_updates = [
-                friend for friend in friends if not User.user_read(user, friend)
-            ]
-            return sorted(friends_with_updates, key=lambda x: x.most_recent_update(user), reverse=True)
+            return friends.exclude(hidden=True).with_updates_for(user) \
+                .filter(has_unread_updates=True).order_by(F('last_update_at').desc(nulls_last=True), 'id')
         elif query_type == 'favorites':
             return user.favorites.all().order_by('username')
         else:
@@ -902,32 +866,20 @@ class UserRecommendedFriendsList(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user_id = self.request.user.id
-        user = get_object_or_404(User, id=user_id)
-        user_friends = user.connected_users
-
-        user_friend_ids = user_friends.values_list('id', flat=True)
-        user_block_rec_ids = user.block_recs.all().values_list('blocked_user', flat=True)
-        sent_friend_request_ids = FriendRequest.objects.filter(requester=user).values_list('requestee__id', flat=True)
-
-        mutual_friends_count_dict = {}
-        for friend in user_friends:
-            potential_friends = friend.connected_users.exclude(id__in=user_friend_ids) \
-                .exclude(id=user_id).exclude(id__in=user_block_rec_ids) \
-                .exclude(id__in=sent_friend_request_ids)
+        user = self.request.user
 
-            for potential_friend in potential_friends:
-                if potential_friend.id not in mutual_friends_count_dict:
-                    mutual_friends_count_dict[potential_friend.id] = 1
-                mutual_friends_count_dict[potential_friend.id] += 1
+        # precomputed nightly; computed on the fly for users without stored recommendations
+        stored = user.friend_recommendations.order_by('rank').values_list('recommended_user_id', flat=True)
+        recommended_ids = list(stored) or [candidate_id for candidate_id, _ in compute_recommendations(user.id)]
 
-        # Sort the by number of mutual friends
-        sorted_friends = sorted(mutual_friends_count_dict.items(), key=lambda x: x[1], reverse=True)[:25]
-        sorted_friend_ids = [friend_id for friend_id, _ in sorted_friends]
-        recommended_friends = User.objects.filter(id__in=sorted_friend_ids) \
-            .order_by(Case(*[When(id=id_, then=pos) for pos, id_ in enumerate(sorted_friend_ids)], default=0))
+        # drop users connected / blocked / requested since the last refresh
+        excluded_ids = set(user.connected_user_ids) \
+            | set(user.block_recs.values_list('blocked_user_id', flat=True)) \
+            | set(user.sent_friend_requests.values_list('requestee_id', flat=True))
+        recommended_ids = [id_ for id_ in recommended_ids if id_ not in excluded_ids]
 
-        return recommended_friends
+        return User.objects.filter(id__in=recommended_ids) \
+            .order_by(Case(*[When(id=id_, then=pos) for pos, id_ in enumerate(recommended_ids)], default=0))
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -1047,52 +999,66 @@ class UnsubscribeUserContent(generics.DestroyAPIView):
 
 
 class FriendFeed(generics.ListAPIView):
+    """
+    Notes and responses of connected users, newest first.
+    Rows are (created_at, content_type, object_id), cut with a keyset cursor in the database:
+    - pull mode: UNION ALL of the notes and responses of connected users
+    - push mode: the user's materialized FeedEntry timeline (see account.feed)
+    Only the objects of the current page are fetched and serialized, with the comments, likes,
+    reactions and reads of the page loaded at once by a ContentLoader.
+    """
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ('-created_at', '-content_type', '-object_id')
+    # a page costs 15 queries whatever its size: graph and reports (3), the page (1), its notes,
+    # images and responses (3), and the ContentLoader (8); nothing is queried per note/response
+    query_budget = 15
 
     def get_queryset(self):
         user = self.request.user
 
+        if feed.is_push_mode():
+            return FeedEntry.objects.filter(owner=user).values('created_at', 'content_type', 'object_id')
+
         connected_user_ids = user.connected_user_ids
         blocked_user_ids = user.user_report_blocked_ids
 
-        notes = Note.objects.filter(
-            author_id__in=connected_user_ids
-        ).exclude(author_id__in=blocked_user_ids).select_related('author')
-
-        responses = _Response.objects.filter(
-            author_id__in=connected_user_ids
-        ).exclude(author_id__in=blocked_user_ids).select_related('author', 'question')
+        return [
+            model.objects.filter(author_id__in=connected_user_ids)
+            .exclude(author_id__in=blocked_user_ids)
+            .annotate(content_type=Value(get_generic_relation_type(model.__name__).id, output_field=IntegerField()),
+                      object_id=F('id'))
+            .values('created_at', 'content_type', 'object_id')
+            for model in feed.feed_models()
+        ]
 
-        combined_feed = sorted(
-            chain(notes, responses),
-            key=lambda x: x.created_at,
-            reverse=True
-        )
-        return combined_feed
+    def hydrate(self, rows):
+        objects = {}
+        for model in feed.feed_models():
+            content_type_id = get_generic_relation_type(model.__name__).id
+            ids = [row['object_id'] for row in rows if row['content_type'] == content_type_id]
+            if not ids:
+                continue
+            queryset = model.objects.filter(id__in=ids).select_related('author')
+            if model is Note:
+                queryset = queryset.prefetch_related('images')
+            else:
+                queryset = queryset.select_related('question')
+            objects.update({(content_type_id, obj.id): obj for obj in queryset})
 
-    def paginate_queryset(self, queryset):
-        page = super().paginate_queryset(queryset)
-        return page
+        return [objects[key] for key in ((row['content_type'], row['object_id']) for row in rows) if key in objects]
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-
         from qna.serializers import ResponseSerializer
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serialized_data = [
-                NoteSerializer(item, context=self.get_serializer_context()).data
-                if isinstance(item, Note) else
-                ResponseSerializer(item, context=self.get_serializer_context()).data
-                for item in page
-            ]
-            return self.get_paginated_response(serialized_data)
-
-        # Fallback (if pagination is disabled)
-        serialized_data = [
-            NoteSerializer(item, context=self.get_serializer_context()).data
-            if isinstance(item, Note) else
-            ResponseSerializer(item, context=self.get_serializer_context()).data
-            for item in queryset
-        ]
-        return Response(serialized_data)
+
+        page = self.paginate_queryset(self.get_queryset())
+        items = self.hydrate(page)
+        context = self.get_serializer_context()
+        context['content_loader'] = ContentLoader(request.user, items)
+
+        def serialize(item):
+            if isinstance(item, Note):
+                return NoteSerializer(item, context=context).data
+            return ResponseSerializer(item, context=context).data
+
+        return self.get_paginated_response([serialize(item) for item in items])
@@ -13,7 +13,8 @@ django_asgi_app = get_asgi_application()
 
 from channels.security.websocket import AllowedHostsOriginValidator
 from .middleware import JwtAuthMiddlewareStack
-from chat.routing import websocket_urlpatterns
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
+from notification.routing import websocket_urlpatterns as notification_websocket_urlpatterns
 
 
 application = ProtocolTypeRouter(
@@ -22,7 +23,7 @@ application = ProtocolTypeRouter(
         "websocket": AllowedHostsOriginValidator(
             JwtAuthMiddlewareStack(
                 URLRouter(
-                    websocket_urlpatterns
+                    chat_websocket_urlpatterns + notification_websocket_urlpatterns
                 )
             ),
         ),
@@ -0,0 +1,126 @@
+from collections import defaultdict
+from functools import reduce
+from itertools import chain
+from operator import or_
+
+from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, CharField, Count, F, Q, Value, Window
+from django.db.models.functions import RowNumber
+
+from adoorback.utils.content_types import get_generic_relation_type
+
+
+LIKE_REACTION_USER_SAMPLE = 3
+
+
+class ContentLoader:
+    """
+    Everything NoteSerializer and ResponseSerializer need about a page of notes and responses
+    seen by `user`, with one query per value instead of one per note/response.
+    """
+
+    def __init__(self, user, contents):
+        self.user = user
+        self.keys = {self.key(obj) for obj in contents}
+        self.object_ids = defaultdict(list)
+        for obj in contents:
+            self.object_ids[obj.type].append(obj.id)
+        # {content type id: 'Note' or 'Response'}, to key the rows of generic relations
+        self.types = {get_generic_relation_type(model).id: model for model in self.object_ids}
+        self._load(contents)
+
+    @staticmethod
+    def key(obj):
+        return obj.type, obj.id
+
+    def _targets(self):
+        # Q matching the notes/responses of the page in a generic relation (content_type, object_id)
+        return reduce(or_, (Q(content_type_id=content_type_id, object_id__in=self.object_ids[model])
+                            for content_type_id, model in self.types.items()))
+
+    def _counts(self, queryset):
+        return {(self.types[content_type_id], object_id): count for content_type_id, object_id, count in
+                queryset.filter(self._targets()).values('content_type_id', 'object_id')
+                .annotate(count=Count('id')).values_list('content_type_id', 'object_id', 'count')}
+
+    def _recent(self, queryset, **values):
+        # latest LIKE_REACTION_USER_SAMPLE rows of each note/response
+        return queryset.filter(self._targets()).annotate(
+            created=F('created_at'),
+            rank=Window(RowNumber(), partition_by=[F('content_type_id'), F('object_id')],
+                        order_by=F('created_at').desc()),
+            **values,
+        ).filter(rank__lte=LIKE_REACTION_USER_SAMPLE).values('content_type_id', 'object_id', 'user', 'created',
+                                                              'like', 'reaction')
+
+    def _load(self, contents):
+        from comment.models import Comment
+        from like.models import Like
+        from note.models import Note
+        from qna.models import Response
+        from reaction.models import Reaction
+
+        if not self.keys:
+            return
+        user_id = self.user.id
+
+        self.comment_counts = self._counts(Comment.objects.all())
+        # only shown to the author
+        self.like_counts = {}
+        if any(obj.author_id == user_id for obj in contents):
+            self.like_counts = self._counts(Like.objects.all())
+
+        self.current_user_like_ids = {}
+        for like in Like.objects.filter(self._targets(), user_id=user_id).order_by('id'):
+            self.current_user_like_ids.setdefault((self.types[like.content_type_id], like.object_id), like.id)
+
+        self.current_user_reactions = defaultdict(list)
+        for reaction in Reaction.objects.filter(self._targets(), user_id=user_id).order_by('created_at'):
+            self.current_user_reactions[self.types[reaction.content_type_id], reaction.object_id].append(
+                {"id": reaction.id, "emoji": reaction.emoji})
+
+        self.read_keys = set()
+        for model in (Note, Response):
+            ids = self.object_ids.get(model.__name__)
+            if not ids:
+                continue
+            column = f'{model.__name__.lower()}_id'
+            read_ids = model.readers.through.objects.filter(**{f'{column}__in': ids, 'user_id': user_id}) \
+                .values_list(column, flat=True)
+            self.read_keys.update((model.__name__, object_id) for object_id in read_ids)
+
+        # latest likes and reactions, merged like NoteSerializer.get_like_reaction_user_sample
+        likes = self._recent(Like.objects.all(), like=Value(True, output_field=BooleanField()),
+                             reaction=Value(None, output_field=CharField()))
+        reactions = self._recent(Reaction.objects.all(), like=Value(False, output_field=BooleanField()),
+                                 reaction=F('emoji'))
+        samples = defaultdict(list)
+        for row in chain(likes, reactions):
+            samples[self.types[row['content_type_id']], row['object_id']].append(row)
+        self.samples = {key: sorted(rows, key=lambda x: x['created'], reverse=True)[:LIKE_REACTION_USER_SAMPLE]
+                        for key, rows in samples.items()}
+        self.sample_users = get_user_model().objects.in_bulk(
+            {row['user'] for rows in self.samples.values() for row in rows})
+
+    def has(self, obj):
+        return self.key(obj) in self.keys
+
+    def comment_count(self, obj):
+        return self.comment_counts.get(self.key(obj), 0)
+
+    def like_count(self, obj):
+        return self.like_counts.get(self.key(obj), 0)
+
+    def current_user_like_id(self, obj):
+        return self.current_user_like_ids.get(self.key(obj))
+
+    def current_user_read(self, obj):
+        return self.key(obj) in self.read_keys
+
+    def current_user_reaction_id_list(self, obj):
+        return self.current_user_reactions.get(self.key(obj), [])
+
+    def like_reaction_user_sample(self, obj):
+        """[(user, like, reaction)] of the latest likes and reactions on obj"""
+        return [(self.sample_users[row['user']], row['like'], row['reaction'])
+                for row in self.samples.get(self.key(obj), []) if row['user'] in self.sample_users]
@@ -13,6 +13,9 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import UntypedToken
 from urllib.parse import parse_qs
 
+from adoorback.utils import query_budget
+from adoorback.utils.user_cache import request_memo
+
 
 User = get_user_model()
 
@@ -72,3 +75,53 @@ class JwtAuthMiddleware(BaseMiddleware):
 
 def JwtAuthMiddlewareStack(inner):
     return JwtAuthMiddleware(AuthMiddlewareStack(inner))
+
+
+class UserCacheMiddleware:
+    """Scopes the per-request memo of the per-user caches (see adoorback.utils.user_cache)."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_memo():
+            return self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    """
+    Records the SQL queries of each request and checks them against the `query_budget`
+    of the view (see adoorback.utils.query_budget). Enabled by QUERY_BUDGET_ENABLED.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not query_budget.is_enabled():
+            return self.get_response(request)
+
+        with query_budget.record_queries() as recorder:
+            response = self.get_response(request)
+
+        view_name = getattr(request, 'query_budget_view', None)
+        if view_name is None:
+            return response
+
+        budget = request.query_budget
+        over_budget = budget is not None and recorder.count > budget
+        query_budget.collect(view_name, recorder, over_budget)
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = recorder.count
+            response['X-Query-Time-Ms'] = recorder.duration_ms
+            response['X-Query-Duplicates'] = sum(times for _, times in recorder.duplicates())
+
+        if over_budget:
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                query_budget.check_budget(recorder, budget, view_name)
+            query_budget.logger.warning('%s ran %d queries, over its budget of %d',
+                                        view_name, recorder.count, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget_view = request.resolver_match.view_name or view_func.__qualname__
+        request.query_budget = query_budget.get_budget(view_func)
@@ -1,5 +1,9 @@
-from django.db import models
+from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MinLengthValidator
+from django.db import models
+from django.db.models import Exists, OuterRef, Q
+from safedelete.managers import SafeDeleteManager
+from safedelete.queryset import SafeDeleteQueryset
 
 
 class AdoorTimestampedModel(models.Model):
@@ -18,3 +22,48 @@ class AdoorModel(AdoorTimestampedModel):
 
     def __str__(self):
         return self.content
+
+
+class AudienceQuerySet(SafeDeleteQueryset):
+    """
+    Queryset for user generated contents (Note, Response, CheckIn) whose visibility depends on
+    the connection between the author and the viewer.
+    The author field is given by `audience_author_field` of the model (defaults to 'author').
+    """
+
+    def visible_to(self, user):
+        """
+        Contents that `user` is allowed to see, as a single SQL predicate:
+        1) not reported by user (ContentReport)
+        2) author has not blocked / been blocked by user (UserReport)
+        3) author is user, or author is connected with user (Connection)
+        """
+        from account.models import Connection
+        from content_report.models import ContentReport
+        from user_report.models import UserReport
+
+        author_field = getattr(self.model, 'audience_author_field', 'author')
+        author_ref = OuterRef(f'{author_field}_id')
+
+        connected = Connection.objects.filter(
+            Q(user1=user, user2=author_ref) | Q(user1=author_ref, user2=user)
+        )
+        reported = ContentReport.objects.filter(
+            user=user,
+            content_type=ContentType.objects.get_for_model(self.model),
+            object_id=OuterRef('pk')
+        )
+        blocked = UserReport.objects.filter(
+            Q(user=user, reported_user=author_ref) | Q(user=author_ref, reported_user=user)
+        )
+
+        return self.filter(Q(**{author_field: user}) | Exists(connected)) \
+                   .exclude(Exists(reported)) \
+                   .exclude(Exists(blocked))
+
+
+class AudienceManager(SafeDeleteManager):
+    _queryset_class = AudienceQuerySet
+
+    def visible_to(self, user):
+        return self.get_queryset().visible_to(user)
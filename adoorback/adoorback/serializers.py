@@ -8,6 +8,10 @@ User = get_user_model()
 
 
 class AdoorBaseSerializer(serializers.ModelSerializer):
+    """
+    Counts and current user values come from the ContentLoader of the page in the context
+    ('content_loader') when the view built one, or from per-object queries otherwise.
+    """
     comment_count = serializers.SerializerMethodField(read_only=True)
     like_count = serializers.SerializerMethodField(read_only=True)
     current_user_like_id = serializers.SerializerMethodField(read_only=True)
@@ -17,7 +21,13 @@ class AdoorBaseSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('내용은 최소 한 글자 이상 써야해요...')
         return attrs
 
+    def loader(self, obj):
+        loader = self.context.get('content_loader')
+        return loader if loader is not None and loader.has(obj) else None
+
     def get_comment_count(self, obj):
+        if self.loader(obj):
+            return self.loader(obj).comment_count(obj)
         if obj.type == "Note":
             return obj.note_comments.count()
         elif obj.type == "Response":
@@ -30,9 +40,13 @@ class AdoorBaseSerializer(serializers.ModelSerializer):
         current_user = self.context['request'].user
         if obj.author != current_user:
             return None
+        if self.loader(obj):
+            return self.loader(obj).like_count(obj)
         return obj.liked_user_ids.count()
 
     def get_current_user_like_id(self, obj):
+        if self.loader(obj):
+            return self.loader(obj).current_user_like_id(obj)
         current_user_id = self.context['request'].user.id
         content_type_id = get_generic_relation_type(obj.type).id
         like = Like.objects.filter(user_id=current_user_id, content_type_id=content_type_id, object_id=obj.id)
@@ -89,6 +89,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'rest_framework',
     'polymorphic',
     'django_cron',
@@ -109,6 +110,9 @@ LOGIN_REDIRECT_URL = '/api/user/'
 CRON_CLASSES = [
     "qna.cron.DailyQuestionCronJob",
     "account.cron.SendDailyWhoAmINotiCronJob",
+    "account.cron.RefreshFriendRecommendationsCronJob",
+    "notification.cron.CompactNotificationsCronJob",
+    "notification.cron.DrainPushOutboxCronJob",
 ]
 
 # reference: https://github.com/jazzband/django-redis
@@ -132,6 +136,14 @@ CACHES = {
     }
 }
 
+# friend feed: 'pull' (query notes/responses of connected users) or 'push' (materialized timelines, account.feed)
+FRIEND_FEED_MODE = os.environ.get('FRIEND_FEED_MODE', 'pull')
+
+# per-request SQL query counts and `query_budget` of views (adoorback.utils.query_budget), off unless
+# QUERY_BUDGET_ENABLED=1 (on in development); strict: a view over its budget raises (adoorback.settings.test)
+QUERY_BUDGET_ENABLED = os.environ.get('QUERY_BUDGET_ENABLED') == '1'
+QUERY_BUDGET_STRICT = False
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'tracking.middleware.VisitorTrackingMiddleware',
@@ -141,6 +153,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'adoorback.middleware.UserCacheMiddleware',
+    'adoorback.middleware.QueryBudgetMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -181,6 +195,27 @@ CHANNEL_LAYERS = {
     },
 }
 
+# shared layer of the per-user caches (adoorback.utils.user_cache), on the redis of the channel layer.
+# it must be shared by every process: without REDIS_URL the caches only memoize within a request
+if REDIS_URL:
+    CACHES['user_cache'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'user_cache',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CONNECTION_POOL_KWARGS': {'ssl_cert_reqs': None} if REDIS_URL.startswith('rediss://') else {},
+        }
+    }
+USER_CACHE_ALIAS = 'user_cache' if REDIS_URL else None
+
+# connection graph cache (account.connection_graph)
+CONNECTION_GRAPH_CACHE_ALIAS = USER_CACHE_ALIAS
+CONNECTION_GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
+# block list cache (account.block_list): short timeout, a missed invalidation must not outlive a few minutes
+BLOCK_LIST_CACHE_ALIAS = USER_CACHE_ALIAS
+BLOCK_LIST_CACHE_TIMEOUT = 60 * 5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -254,6 +289,11 @@ FCM_DJANGO_SETTINGS = {
     "FCM_DEVICE_MODEL": "custom_fcm.CustomFCMDevice", 
 }
 
+# push notifications are written to notification.PushOutbox and sent every minute by
+# notification.cron.DrainPushOutboxCronJob (`runcrons` must run every minute), or continuously by
+# `manage.py drain_push_outbox --loop`, with this transport (notification.push.FakeTransport sends nothing)
+PUSH_TRANSPORT = 'notification.push.FCMTransport'
+
 LOCALE_PATHS = [
     os.path.join(BASE_DIR, 'locale'),
 ]
@@ -4,6 +4,8 @@ from .base import *
 
 DEBUG = True
 
+QUERY_BUDGET_ENABLED = True
+
 BASE_URL = 'http://localhost:8000'
 
 # Database
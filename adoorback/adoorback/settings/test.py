@@ -0,0 +1,23 @@
+# python manage.py test --settings=adoorback.settings.test
+from .development import *
+
+# views over their `query_budget` fail the test (adoorback.utils.query_budget)
+QUERY_BUDGET_ENABLED = True
+QUERY_BUDGET_STRICT = True
+
+# no redis, firebase or file sessions needed
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+    },
+}
+USER_CACHE_ALIAS = None
+CONNECTION_GRAPH_CACHE_ALIAS = None
+BLOCK_LIST_CACHE_ALIAS = None
+PUSH_TRANSPORT = 'notification.push.FakeTransport'
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# korean content: never inherit a non-utf8 encoding from template1
+DATABASES['default']['TEST'] = {'CHARSET': 'UTF8', 'TEMPLATE': 'template0'}
@@ -7,6 +7,7 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 from faker import Faker
 
+from account import connection_graph
 from account.models import FriendRequest, Connection
 from adoorback.utils.content_types import get_comment_type, get_response_type, get_question_type, get_note_type
 from chat.models import ChatRoom, Message
@@ -142,6 +143,8 @@ def set_seed(n):
         for user in [user_1, user_3, user_4, user_5, user_6]
     ]
     Connection.objects.bulk_create(connections)
+    # bulk_create skips the signals that keep the connection graph cache fresh
+    connection_graph.invalidate(user_2.id, user_1.id, user_3.id, user_4.id, user_5.id, user_6.id)
 
     for u in [user_1, user_3, user_4, user_5, user_6]:
         chat_room = ChatRoom()
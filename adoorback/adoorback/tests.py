@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from account.tests import create_admin
+from adoorback.utils import query_budget
+
+User = get_user_model()
+
+
+class QueryBudgetReportTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.user = User.objects.create_user(username='reader', email='reader@test.com', password='Test1234!')
+
+    def setUp(self):
+        query_budget.reset()
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/query-budget/').status_code, 403)
+        self.assertEqual(self.client.delete('/api/query-budget/').status_code, 403)
+
+    def test_report(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/user/friends/', {'type': 'all'})
+        self.client.get('/api/user/friends/', {'type': 'all'})
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/query-budget/')
+        self.assertEqual(response.status_code, 200)
+        views = {row['view']: row for row in response.data['views']}
+        self.assertEqual(views['friend-list']['requests'], 2)
+        self.assertEqual(views['friend-list']['over_budget'], 0)
+
+        self.assertEqual(self.client.delete('/api/query-budget/').status_code, 204)
+        self.assertNotIn('friend-list', [row['view'] for row in query_budget.report()])
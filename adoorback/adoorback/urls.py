@@ -20,6 +20,8 @@ from django.urls import include, path, re_path
 from django.views.static import serve
 from django.conf.urls.i18n import i18n_patterns
 
+from adoorback.views import QueryBudgetReport
+
 
 urlpatterns = i18n_patterns(
     path('api/content_reports/', include('content_report.urls')),
@@ -42,6 +44,7 @@ urlpatterns = i18n_patterns(
     path('api/ping/', include('ping.urls')),
 
     path('api/translate/', include('translate.urls')),
+    path('api/query-budget/', QueryBudgetReport.as_view(), name='query-budget-report'),
     prefix_default_language=False
 )
 
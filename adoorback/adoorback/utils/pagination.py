@@ -0,0 +1,150 @@
+import datetime
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from functools import reduce
+import operator
+
+from django.core.exceptions import ValidationError
+from django.db.models import DateTimeField, Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_filter(ordering, position):
+    """
+    Q selecting the rows that come after `position` in `ordering`,
+    e.g. ordering ('-created_at', '-id') and position (t, 3) gives
+    created_at <= t AND (created_at < t OR (created_at = t AND id < 3))
+    The redundant bound on the first field lets the database start an index range scan at the cursor.
+    """
+    conditions = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {f.lstrip('-'): value for f, value in zip(ordering[:index], position[:index])}
+        conditions.append(Q(**equal, **{f'{name}__{lookup}': position[index]}))
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+    return bound & reduce(operator.or_, conditions)
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Cursor (keyset) pagination on a unique ordering, e.g. ('-created_at', '-id').
+    Unlike PageNumberPagination it never counts or offsets: every page is fetched
+    with `WHERE (ordering) after (cursor) ORDER BY ordering LIMIT page_size + 1`.
+
+    The paginated queryset may also be a list of querysets with the same fields
+    (e.g. `.values()` of different models); the keyset filter is applied to each of them
+    and their UNION ALL is ordered and sliced by the database.
+    Pages are plain rows of the queryset (objects or dicts).
+    """
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering_fields(self, queryset):
+        """Model field, or output field of the annotation, of each name of the ordering"""
+        fields = []
+        for name in (field.lstrip('-') for field in self.ordering):
+            annotation = queryset.query.annotations.get(name)
+            field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+            fields.append(field.target_field if field.is_relation else field)
+        return fields
+
+    def decode_cursor(self, request, fields):
+        """Position of the cursor, each value cleaned by the field it is compared with"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        position = []
+        for field, value in zip(fields, values):
+            if value is None or isinstance(value, (bool, list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                value = field.clean(value, None)
+            except (ValidationError, TypeError, ValueError, OverflowError):
+                raise NotFound(self.invalid_cursor_message)
+            # cursors are written with their utc offset
+            if isinstance(field, DateTimeField) and timezone.is_naive(value):
+                raise NotFound(self.invalid_cursor_message)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, position):
+        # full isoformat: DjangoJSONEncoder would cut datetimes to milliseconds
+        position = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in position]
+        encoded = b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_position(self, row):
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.get_ordering(view)
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        querysets = list(queryset) if isinstance(queryset, (list, tuple)) else [queryset]
+        position = None
+        if request.query_params.get(self.cursor_query_param):
+            position = self.decode_cursor(request, self.get_ordering_fields(querysets[0]))
+        if position is not None:
+            after = keyset_filter(self.ordering, position)
+            querysets = [qs.filter(after) for qs in querysets]
+
+        queryset = querysets[0]
+        if len(querysets) > 1:
+            queryset = queryset.union(*querysets[1:], all=True)
+
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -1,4 +1,3 @@
-from django.contrib.contenttypes.models import ContentType
 from rest_framework import permissions
 
 from adoorback.utils.content_types import get_generic_relation_type
@@ -61,11 +60,7 @@ class IsNotBlocked(permissions.BasePermission):
             is_model = False
 
         if is_model:
-            current_content_type = ContentType.objects.get_for_model(obj).model
-
-            blocked_contents = request.user.content_report_blocked_model_ids
-
-            content_blocked = (current_content_type, obj.id) in blocked_contents
+            content_blocked = request.user.has_reported_content(obj)
 
             author_blocked = obj.author.id in request.user.user_report_blocked_ids
 
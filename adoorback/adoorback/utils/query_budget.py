@@ -0,0 +1,158 @@
+"""
+Per-request SQL instrumentation.
+
+`record_queries()` counts the queries run on every database connection inside the block,
+their total time and how often each SQL fingerprint (the statement with its parameters
+and literals stripped) was repeated - a fingerprint repeated once per object of a page
+is the signature of an N+1 query.
+
+`adoorback.middleware.QueryBudgetMiddleware` records every request with it and
+- adds X-Query-Count / X-Query-Time-Ms / X-Query-Duplicates headers when DEBUG is on
+- aggregates the numbers per view (see `report()`, served to staff by QueryBudgetReport)
+- checks them against the `query_budget` attribute of the view; exceeding it is logged,
+  or raises QueryBudgetExceeded when QUERY_BUDGET_STRICT is set (tests)
+
+In tests, `assert_query_budget(n)` checks any block of code the same way.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('adoorback.query_budget')
+
+DUPLICATE_THRESHOLD = 3
+# repeated statements kept per view in the report, so the stats of a process stay bounded
+MAX_DUPLICATES = 20
+
+_in_list = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r'\b\d+(?:\.\d+)?\b')
+_whitespace = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL statement with literals and parameters replaced, e.g. `... WHERE "id" IN (?)`"""
+    sql = _in_list.sub('(?)', sql)
+    sql = _string_literal.sub('?', sql)
+    sql = _number_literal.sub('?', sql)
+    return _whitespace.sub(' ', sql.replace('%s', '?')).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.monotonic() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """[(fingerprint, times)] of the statements run at least `threshold` times, most repeated first"""
+        return [(sql, times) for sql, times in self.fingerprints.most_common() if times >= threshold]
+
+
+@contextmanager
+def record_queries():
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def is_enabled():
+    return getattr(settings, 'QUERY_BUDGET_ENABLED', False)
+
+
+def get_budget(view):
+    """`query_budget` of a view function (DRF or Django class-based view), None if it has none"""
+    view_class = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+    return getattr(view_class, 'query_budget', None)
+
+
+def check_budget(recorder, budget, label):
+    if budget is None or recorder.count <= budget:
+        return
+    message = f'{label} ran {recorder.count} queries, over its budget of {budget}'
+    duplicates = recorder.duplicates()
+    if duplicates:
+        message += '; repeated: ' + '; '.join(f'{times}x {sql}' for sql, times in duplicates)
+    raise QueryBudgetExceeded(message)
+
+
+@contextmanager
+def assert_query_budget(budget, label='block'):
+    """Test helper: fail if the block runs more than `budget` queries."""
+    with record_queries() as recorder:
+        yield recorder
+    check_budget(recorder, budget, label)
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.duration = 0.0
+        self.over_budget = 0
+        self.duplicates = Counter()
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def collect(view_name, recorder, over_budget=False):
+    with _stats_lock:
+        stats = _stats.setdefault(view_name, ViewStats())
+        stats.requests += 1
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.duration += recorder.duration
+        stats.over_budget += over_budget
+        for sql, times in recorder.duplicates():
+            stats.duplicates[sql] = max(stats.duplicates[sql], times)
+        if len(stats.duplicates) > MAX_DUPLICATES:
+            stats.duplicates = Counter(dict(stats.duplicates.most_common(MAX_DUPLICATES)))
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def report():
+    """Aggregated numbers of the requests recorded by this process, views with most queries per request first."""
+    with _stats_lock:
+        rows = [{
+            'view': view_name,
+            'requests': stats.requests,
+            'avg_queries': round(stats.queries / stats.requests, 1),
+            'max_queries': stats.max_queries,
+            'avg_time_ms': round(stats.duration * 1000 / stats.requests, 2),
+            'over_budget': stats.over_budget,
+            'duplicates': stats.duplicates.most_common(),
+        } for view_name, stats in _stats.items()]
+    return sorted(rows, key=lambda row: row['avg_queries'], reverse=True)
@@ -0,0 +1,134 @@
+"""
+Two-level cache for small per-user values (connection graph, block lists, ...).
+
+1) a per-request memo, only active inside `request_memo()`
+   (see `adoorback.middleware.UserCacheMiddleware`)
+2) a shared Django cache backend, selected per cache with a settings entry
+
+Values are stored in the shared layer in their compact (picklable) form and decoded
+once per request into the object the callers use.
+
+Invalidation only reaches the shared layer, so it must be shared by every web and websocket
+process: with no alias, or a process-local backend (LocMemCache), only the memo is used.
+"""
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+_local = Local()
+
+
+def _get_memo():
+    return getattr(_local, 'memo', None)
+
+
+@contextmanager
+def request_memo():
+    """Enable the per-request memo layer for the duration of the block."""
+    previous = _get_memo()
+    _local.memo = {}
+    try:
+        yield
+    finally:
+        _local.memo = previous
+
+
+class PerUserCache:
+    """
+    :param name: key prefix, also used to separate memo entries of different caches
+    :param load: callable taking a set of user ids, returning {user_id: compact value}
+        for every one of them (in as few queries as possible)
+    :param decode: callable (user_id, compact value) -> object handed to callers
+    :param alias_setting / timeout_setting: settings names for the backend alias and timeout
+    """
+
+    def __init__(self, name, load, decode, alias_setting, timeout_setting, version=1):
+        self.name = name
+        self.load = load
+        self.decode = decode
+        self.alias_setting = alias_setting
+        self.timeout_setting = timeout_setting
+        self.version = version
+
+    @property
+    def cache(self):
+        """The shared layer, None when it is not configured or not shared between processes"""
+        alias = getattr(settings, self.alias_setting, None)
+        if alias is None:
+            return None
+        cache = caches[alias]
+        return None if isinstance(cache, LocMemCache) else cache
+
+    @property
+    def timeout(self):
+        return getattr(settings, self.timeout_setting, 60 * 60 * 24)
+
+    def key(self, user_id):
+        return f'{self.name}:{self.version}:{user_id}'
+
+    def _memo(self):
+        memo = _get_memo()
+        if memo is None:
+            return None
+        return memo.setdefault(self.name, {})
+
+    def get_many(self, user_ids):
+        """Return {user_id: value} for the given users, loading all misses at once."""
+        user_ids = set(user_ids)
+        values = {}
+        memo = self._memo()
+
+        if memo is not None:
+            for user_id in user_ids:
+                if user_id in memo:
+                    values[user_id] = memo[user_id]
+
+        missing = user_ids - values.keys()
+        if missing:
+            cache = self.cache
+            if cache is not None:
+                cached = cache.get_many([self.key(user_id) for user_id in missing])
+                for user_id in missing:
+                    value = cached.get(self.key(user_id))
+                    if value is not None:
+                        values[user_id] = self.decode(user_id, value)
+
+            missing -= values.keys()
+            if missing:
+                loaded = self.load(missing)
+                if cache is not None:
+                    # only once committed: values read inside a transaction that rolls back are never stored
+                    entries = {self.key(user_id): value for user_id, value in loaded.items()}
+                    transaction.on_commit(lambda: cache.set_many(entries, timeout=self.timeout))
+                values.update({user_id: self.decode(user_id, value) for user_id, value in loaded.items()})
+
+            if memo is not None:
+                memo.update({user_id: values[user_id] for user_id in user_ids})
+
+        return values
+
+    def get(self, user_id):
+        return self.get_many([user_id])[user_id]
+
+    def invalidate(self, *user_ids):
+        """
+        Drop the cached values of the given users.
+        Done right away (so the rest of the current transaction sees fresh data) and
+        once more on commit (so concurrent readers can't leave a stale entry behind).
+        """
+        memo = self._memo()
+        if memo is not None:
+            for user_id in user_ids:
+                memo.pop(user_id, None)
+
+        cache = self.cache
+        if cache is None:
+            return
+        keys = [self.key(user_id) for user_id in user_ids]
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
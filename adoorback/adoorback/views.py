@@ -0,0 +1,28 @@
+import os
+
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from adoorback.utils import query_budget
+
+
+class QueryBudgetReport(APIView):
+    """
+    Per-view SQL query numbers recorded by QueryBudgetMiddleware (QUERY_BUDGET_ENABLED)
+    since the start of the process serving the request, or since the last DELETE.
+    Each process has its own numbers: `pid` tells which one answered.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'enabled': query_budget.is_enabled(),
+            'views': query_budget.report(),
+        })
+
+    def delete(self, request):
+        query_budget.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
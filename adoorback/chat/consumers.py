@@ -1,103 +1,88 @@
-from datetime import datetime
 import json
 
-from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
 from channels.exceptions import DenyConnection
-from channels.generic.websocket import WebsocketConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Q
+from django.utils import timezone
 from safedelete.models import HARD_DELETE
 
-from chat.models import Message, ChatRoom, MessageLike
-from utils.helpers import update_last_read_message
+from chat.models import Message, ChatRoom, MessageLike, UserChatActivity
 
 
 TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000+00:00"
 
-from chat.models import Message, ChatRoom, UserChatActivity
-from utils.helpers import update_last_read_message
+User = get_user_model()
 
 
-User = get_user_model()
+def unread_counts(user_ids):
+    """{user_id: {chat_room_id: number of unread messages}} over every chat room of the users, in one query"""
+    counts = {user_id: {} for user_id in user_ids}
+    activities = UserChatActivity.objects.filter(user_id__in=user_ids, chat_room__deleted__isnull=True) \
+        .values_list('user_id', 'chat_room_id', 'unread_count')
+    for user_id, chat_room_id, unread_cnt in activities:
+        counts[user_id][chat_room_id] = unread_cnt
+    return counts
 
 
-class ChatConsumer(WebsocketConsumer):
-    def connect(self):
-        user = self.scope["user"]
+class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Members of the chat room are loaded once per connection; every database access of an event
+    is done in a single database_sync_to_async call.
+    """
+    async def connect(self):
+        self.user = self.scope["user"]
         self.room_id = self.scope["url_route"]["kwargs"]["room_id"]
         self.room_group_id = f"chat_{self.room_id}"
 
-        chat_room = ChatRoom.objects.get(id=self.room_id)
-        if user not in chat_room.users.all():
+        self.member_ids = await self.get_member_ids()
+        if self.user.id not in self.member_ids:
             raise DenyConnection("You must be a member to join this chat.")
+        self.recipient_ids = [member_id for member_id in self.member_ids if member_id != self.user.id]
+        # the other member of a one-to-one chat room
+        self.friend_id = self.recipient_ids[0] if len(self.member_ids) == 2 else None
 
         # Join room group
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.room_group_id, self.channel_name
         )
 
-        self.accept()
+        await self.accept()
 
         # Update last read message for user
-        user = self.scope["user"]
-        chat_room = ChatRoom.objects.get(id=self.room_id)
-        update_last_read_message(user, chat_room)
-
-        # Send message to own chat_list group 
-        # (in case of accessing chatroom, chat list in different devices)
-        if chat_room.messages.all():
-            async_to_sync(self.channel_layer.group_send)(
-                f"user_{user.id}_chat_list", {
-                    "type": "chat.message",
-                    "roomId": self.room_id,
-                    "content": chat_room.last_message_content,
-                    "timestamp": chat_room.last_message_time.strftime(TIME_FORMAT),
-                    "unreadCnt": 0
-                }
-            )
-
-        # Send message to own friend_list group 
-        # (in case of accessing chatroom, friend list in different devices)
-        if chat_room.messages.all() and chat_room.users.count() == 2:
-            friend_id = chat_room.users.exclude(id=user.id).first().id
-            async_to_sync(self.channel_layer.group_send)(
-                f"user_{user.id}_friend_list", {
-                    "type": "chat.message",
-                    "friendId": friend_id,
-                    "unreadCnt": 0
-                }
-            )
+        last_message, unread_cnt = await self.read_all_messages()
 
-        # Send message to own chat_icon group 
+        # Send read state to own chat_list, friend_list and chat_icon groups
         # (in case of accessing chatroom, app in different devices)
-        if chat_room.messages.all():
-            updated_cnt = user.unread_message_cnt
-            async_to_sync(self.channel_layer.group_send)(
-                f"user_{user.id}_chat_icon", {
+        if last_message is not None:
+            await self.send_own_read_state(last_message.content, last_message.timestamp.strftime(TIME_FORMAT))
+            await self.channel_layer.group_send(
+                f"user_{self.user.id}_chat_icon", {
                     "type": "chat.message",
-                    "unreadCnt": updated_cnt
+                    "unreadCnt": unread_cnt
                 }
             )
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         # Leave room group
-        async_to_sync(self.channel_layer.group_discard)(
+        await self.channel_layer.group_discard(
             self.room_group_id, self.channel_name
         )
 
     # Receive message from WebSocket
-    def receive(self, text_data):
+    async def receive(self, text_data):
         text_data_json = json.loads(text_data)
 
         if text_data_json.get('action') == 'like':
-            user_id = self.scope["user"].id
             message_id = text_data_json["messageId"]
 
             # Save like to database
-            MessageLike.objects.create(user_id=user_id, message_id=message_id)
+            await self.create_like(message_id)
 
             # Send like to room group
-            async_to_sync(self.channel_layer.group_send)(
+            await self.channel_layer.group_send(
                 self.room_group_id, {
                     "type": "chat.like",
                     "messageId": message_id,
@@ -105,18 +90,11 @@ class ChatConsumer(WebsocketConsumer):
             )
 
         elif text_data_json.get('action') == 'remove_like':
-            user_id = self.scope["user"].id
-            message_like_id = text_data_json["messageLikeId"]
-
             # Destroy like in database
-            message_like = MessageLike.objects.get(id=message_like_id)
-            if message_like.user_id != user_id:
-                raise PermissionDenied("You can only remove likes that you created.")
-            message_id = message_like.message_id
-            message_like.delete(force_policy=HARD_DELETE)
+            message_id = await self.remove_like(text_data_json["messageLikeId"])
 
             # Send like remove to room group
-            async_to_sync(self.channel_layer.group_send)(
+            await self.channel_layer.group_send(
                 self.room_group_id, {
                     "type": "chat.like",
                     "messageId": message_id,
@@ -125,233 +103,249 @@ class ChatConsumer(WebsocketConsumer):
 
         elif text_data_json.get('action') == 'message':
             content = text_data_json["content"]
-            user_id = text_data_json["userId"]
-            user_name = text_data_json["userName"]
             parent_id = text_data_json["parentId"]
-            timestamp = datetime.utcnow()
+            timestamp = timezone.now()
             timestamp_str = timestamp.strftime(TIME_FORMAT)
 
-            # validation
-            parent, parent_content = None, None
-            if parent_id is not None:
-                try:
-                    parent = Message.objects.get(id=parent_id)
-                    parent_content = parent.content
-                except Message.DoesNotExist:
-                    raise ValidationError("Parent message does not exist.")
-
             # Save message to database
-            new_message = Message.objects.create(
-                sender_id=user_id, 
-                content=content, 
-                chat_room_id=self.room_id, 
-                timestamp=timestamp,
-                parent=parent
-            )
-            message_id = new_message.id
+            message_id, parent_content, recipient_unread_counts = \
+                await self.save_message(content, parent_id, timestamp)
 
             # Send message to room group
-            async_to_sync(self.channel_layer.group_send)(
+            await self.channel_layer.group_send(
                 self.room_group_id, {
-                    "type": "chat.message", 
-                    "content": content, 
+                    "type": "chat.message",
+                    "content": content,
                     "messageId": message_id,
-                    "userName": user_name, 
+                    "userName": self.user.username,
                     "timestamp": timestamp_str,
                     "parentId": parent_id,
                     "parentContent": parent_content
                 }
             )
 
-            # Send message to chat_list, chat_icon group
-            chat_room = ChatRoom.objects.get(id=self.room_id)
-            recipients = chat_room.users.exclude(id=user_id)
-            for r in recipients:
-                async_to_sync(self.channel_layer.group_send)(
-                    f"user_{r.id}_chat_list", {
+            # Send message to chat_list, chat_icon group of recipients
+            for recipient_id in self.recipient_ids:
+                room_unread_counts = recipient_unread_counts[recipient_id]
+                await self.channel_layer.group_send(
+                    f"user_{recipient_id}_chat_list", {
                         "type": "chat.message",
                         "roomId": self.room_id,
                         "content": content,
                         "timestamp": timestamp_str,
-                        "unreadCnt": chat_room.unread_cnt(r)
+                        "unreadCnt": room_unread_counts.get(int(self.room_id), 0)
                     }
                 )
-                updated_cnt = r.unread_message_cnt
-                async_to_sync(self.channel_layer.group_send)(
-                    f"user_{r.id}_chat_icon", {
+                await self.channel_layer.group_send(
+                    f"user_{recipient_id}_chat_icon", {
                         "type": "chat.message",
-                        "unreadCnt": updated_cnt
+                        "unreadCnt": sum(room_unread_counts.values())
                     }
                 )
 
             # Send message to friend_list group
-            if chat_room.users.count() == 2:
-                friend_id = recipients.first().id
-                async_to_sync(self.channel_layer.group_send)(
-                    f"user_{friend_id}_friend_list", {
+            if self.friend_id is not None:
+                await self.channel_layer.group_send(
+                    f"user_{self.friend_id}_friend_list", {
                         "type": "chat.message",
-                        "friendId": user_id,
-                        "unreadCnt": chat_room.unread_cnt(r)
+                        "friendId": self.user.id,
+                        "unreadCnt": recipient_unread_counts[self.friend_id].get(int(self.room_id), 0)
                     }
                 )
 
     # Receive message from room group
-    def chat_message(self, event):
-        content = event["content"]
-        user_name = event["userName"]
-        timestamp = event["timestamp"]
-        parent_id = event["parentId"]
-        parent_content = event["parentContent"]
-
+    async def chat_message(self, event):
         # Send message to WebSocket
-        self.send(text_data=json.dumps({
-            "content": content, 
-            "userName": user_name, 
-            "timestamp": timestamp,
-            "parentId": parent_id,
-            "parentContent": parent_content
+        await self.send(text_data=json.dumps({
+            "content": event["content"],
+            "userName": event["userName"],
+            "timestamp": event["timestamp"],
+            "parentId": event["parentId"],
+            "parentContent": event["parentContent"]
         }))
 
         # Save read status to database
-        user = self.scope["user"]
-        chat_room = ChatRoom.objects.get(id=self.room_id)
-        if user.username != user_name:
-            update_last_read_message(user, chat_room)
-
-        # Send message to own chat_list group 
-        # (in case of accessing chatroom, chat list in different devices)
-        if chat_room.messages.all():
-            async_to_sync(self.channel_layer.group_send)(
-                f"user_{user.id}_chat_list", {
-                    "type": "chat.message",
-                    "roomId": self.room_id,
-                    "content": chat_room.last_message_content,
-                    "timestamp": chat_room.last_message_time.strftime(TIME_FORMAT),
-                    "unreadCnt": 0
-                }
-            )
+        if self.user.username != event["userName"]:
+            await self.read_message(event["messageId"])
 
-        # Send message to own friend_list group 
-        # (in case of accessing chatroom, friend list in different devices)
-        if chat_room.messages.all() and chat_room.users.count() == 2:
-            friend_id = chat_room.users.exclude(id=user.id).first().id
-            async_to_sync(self.channel_layer.group_send)(
-                f"user_{user.id}_friend_list", {
-                    "type": "chat.message",
-                    "friendId": friend_id,
-                    "unreadCnt": 0
-                }
-            )
+        # Send read state to own chat_list, friend_list groups
+        # (in case of accessing chatroom in different devices)
+        await self.send_own_read_state(event["content"], event["timestamp"])
 
     # Receive like change from room group
-    def chat_like(self, event):
+    async def chat_like(self, event):
         message_id = event["messageId"]
-
-        message_like_cnt = Message.objects.get(id=message_id).message_likes.count()
-        user = self.scope["user"]
-        current_user_message_like = MessageLike.objects.filter(user_id=user.id, message_id=message_id)
-        current_user_message_like_id = current_user_message_like[0].id if current_user_message_like else None
+        message_like_cnt, current_user_message_like_id = await self.get_like_state(message_id)
 
         # Send like change to WebSocket
-        self.send(text_data=json.dumps({
+        await self.send(text_data=json.dumps({
             "action": "like",
             "messageId": message_id,
             "messageLikeCnt": message_like_cnt,
             "currentUserMessageLikeId": current_user_message_like_id
         }))
 
-        # Send message to own chat_icon group 
-        # (in case of accessing chatroom, app in different devices)
-        if chat_room.messages.all():
-            updated_cnt = user.unread_message_cnt
-            async_to_sync(self.channel_layer.group_send)(
-                f"user_{user.id}_chat_icon", {
+    async def send_own_read_state(self, content, timestamp):
+        await self.channel_layer.group_send(
+            f"user_{self.user.id}_chat_list", {
+                "type": "chat.message",
+                "roomId": self.room_id,
+                "content": content,
+                "timestamp": timestamp,
+                "unreadCnt": 0
+            }
+        )
+        if self.friend_id is not None:
+            await self.channel_layer.group_send(
+                f"user_{self.user.id}_friend_list", {
                     "type": "chat.message",
-                    "unreadCnt": updated_cnt
+                    "friendId": self.friend_id,
+                    "unreadCnt": 0
                 }
             )
 
-
-class ChatRoomListConsumer(WebsocketConsumer):
-    def connect(self):
+    @database_sync_to_async
+    def get_member_ids(self):
+        return list(ChatRoom.users.through.objects.filter(chatroom_id=self.room_id, chatroom__deleted__isnull=True)
+                    .values_list('user_id', flat=True))
+
+    @database_sync_to_async
+    def read_all_messages(self):
+        """Mark the last message of the room as read; returns it and the number of messages user has not read."""
+        last_message = Message.objects.filter(chat_room_id=self.room_id).order_by('-id').first()
+        updated = UserChatActivity.objects.filter(user=self.user, chat_room_id=self.room_id) \
+            .update(last_read_message=last_message, unread_count=0)
+        if not updated:
+            UserChatActivity.objects.create(user=self.user, chat_room_id=self.room_id, last_read_message=last_message)
+        return last_message, UserChatActivity.objects.total_unread_count(self.user)
+
+    @database_sync_to_async
+    def read_message(self, message_id):
+        UserChatActivity.objects.filter(user=self.user, chat_room_id=self.room_id) \
+            .filter(Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=message_id)) \
+            .update(last_read_message_id=message_id, unread_count=0)
+
+    @database_sync_to_async
+    def save_message(self, content, parent_id, timestamp):
+        """Returns the id of the new message, the content of its parent and unread_counts() of the recipients."""
+        parent, parent_content = None, None
+        if parent_id is not None:
+            try:
+                parent = Message.objects.get(id=parent_id)
+                parent_content = parent.content
+            except Message.DoesNotExist:
+                raise ValidationError("Parent message does not exist.")
+
+        new_message = Message.objects.create(
+            sender=self.user,
+            content=content,
+            chat_room_id=self.room_id,
+            timestamp=timestamp,
+            parent=parent
+        )
+        return new_message.id, parent_content, unread_counts(self.recipient_ids)
+
+    @database_sync_to_async
+    def create_like(self, message_id):
+        MessageLike.objects.create(user=self.user, message_id=message_id)
+
+    @database_sync_to_async
+    def remove_like(self, message_like_id):
+        message_like = MessageLike.objects.get(id=message_like_id)
+        if message_like.user_id != self.user.id:
+            raise PermissionDenied("You can only remove likes that you created.")
+        message_id = message_like.message_id
+        message_like.delete(force_policy=HARD_DELETE)
+        return message_id
+
+    @database_sync_to_async
+    def get_like_state(self, message_id):
+        """Number of likes of the message, and id of the like of user (None if user did not like it)"""
+        likes = list(MessageLike.objects.filter(message_id=message_id).values_list('id', 'user_id'))
+        current_user_message_like_id = next((like_id for like_id, user_id in likes if user_id == self.user.id), None)
+        return len(likes), current_user_message_like_id
+
+
+class ChatRoomListConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
         # Make group for each user
         self.user_id = self.scope["user"].id
         self.user_group_id = f"user_{self.user_id}_chat_list"
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.user_group_id, self.channel_name
         )
 
-        self.accept()
+        await self.accept()
 
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
             self.user_group_id, self.channel_name
         )
 
     # Receive message from room group
-    def chat_message(self, event):
+    async def chat_message(self, event):
         content = event["content"]
         room_id = event["roomId"]
         timestamp = event["timestamp"]
         unread_cnt = event["unreadCnt"]
 
         # Send message to WebSocket
-        self.send(text_data=json.dumps({
+        await self.send(text_data=json.dumps({
             "content": content, "roomId": room_id, "timestamp": timestamp, "unreadCnt": unread_cnt
         }))
 
 
-class FriendListConsumer(WebsocketConsumer):
-    def connect(self):
+class FriendListConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
         # Make group for each user
         self.user_id = self.scope["user"].id
         self.user_group_id = f"user_{self.user_id}_friend_list"
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.user_group_id, self.channel_name
         )
 
-        self.accept()
+        await self.accept()
 
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
             self.user_group_id, self.channel_name
         )
 
     # Receive message from room group
-    def chat_message(self, event):
+    async def chat_message(self, event):
         friend_id = event["friendId"]
         unread_cnt = event["unreadCnt"]
 
         # Send message to WebSocket
-        self.send(text_data=json.dumps({
+        await self.send(text_data=json.dumps({
             "friendId": friend_id, "unreadCnt": unread_cnt
         }))
 
 
-class ChatIconConsumer(WebsocketConsumer):
-    def connect(self):
+class ChatIconConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
         # Make group for each user
         self.user_id = self.scope["user"].id
         self.user_group_id = f"user_{self.user_id}_chat_icon"
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.user_group_id, self.channel_name
         )
 
-        self.accept()
+        await self.accept()
 
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
             self.user_group_id, self.channel_name
         )
 
     # Receive message from room group
-    def chat_message(self, event):
+    async def chat_message(self, event):
         unread_cnt = event["unreadCnt"]
 
         # Send message to WebSocket
-        self.send(text_data=json.dumps({
+        await self.send(text_data=json.dumps({
             "unreadCnt": unread_cnt
         }))
@@ -0,0 +1,101 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from safedelete.models import HARD_DELETE
+
+from chat.models import ChatRoom, Message, UserChatActivity
+from chat.routing import websocket_urlpatterns
+
+
+IN_MEMORY_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the chat consumers: the first member of a chat room sends messages through ChatConsumer '
+            'while every member is connected to the chat room, chat list, chat icon and friend list sockets '
+            '(in-memory channel layer). Messages sent are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, help='chat room to use (default: the first one with 2+ members)')
+        parser.add_argument('--messages', type=int, default=200)
+
+    def handle(self, *args, **options):
+        room = self.get_room(options['room'])
+        members = list(get_user_model().objects.filter(chat_rooms=room).order_by('id'))
+        read_state = {activity_id: (last_read_message_id, unread_count)
+                      for activity_id, last_read_message_id, unread_count in UserChatActivity.objects
+                      .filter(chat_room=room).values_list('id', 'last_read_message_id', 'unread_count')}
+        last_message_id = room.messages.order_by('-id').values_list('id', flat=True).first() or 0
+
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+                latencies, elapsed = async_to_sync(self.run)(room, members, options['messages'])
+        finally:
+            # leave the chat room as it was
+            Message.all_objects.filter(chat_room=room, id__gt=last_message_id).delete(force_policy=HARD_DELETE)
+            for activity_id, (last_read_message_id, unread_count) in read_state.items():
+                UserChatActivity.objects.filter(id=activity_id).update(last_read_message_id=last_read_message_id,
+                                                                       unread_count=unread_count)
+
+        latencies = sorted(latencies)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(latencies)} messages to {len(members)} members in {elapsed:.2f}s '
+            f'({len(latencies) / elapsed:.0f} messages/s); delivery latency '
+            f'p50 {statistics.median(latencies) * 1000:.1f}ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms'))
+
+    def get_room(self, room_id):
+        rooms = ChatRoom.objects.annotate(member_cnt=Count('users')).filter(member_cnt__gte=2)
+        room = rooms.filter(id=room_id).first() if room_id else rooms.order_by('id').first()
+        if room is None:
+            raise CommandError('No chat room with at least 2 members.')
+        return room
+
+    async def connect(self, app, path, user):
+        communicator = WebsocketCommunicator(app, path)
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise CommandError(f'{user} could not connect to {path}')
+        return communicator
+
+    async def run(self, room, members, message_cnt):
+        app = URLRouter(websocket_urlpatterns)
+        room_sockets, other_sockets = [], []
+        for member in members:
+            room_sockets.append(await self.connect(app, f'/ws/chat/{room.id}/', member))
+            for path in ['/ws/chat/chat_list/', '/ws/chat/icon_badge/', '/ws/chat/friend_list/']:
+                other_sockets.append(await self.connect(app, path, member))
+        sockets = room_sockets + other_sockets
+
+        async def drain(communicator):
+            while not await communicator.receive_nothing(timeout=0.05):
+                await communicator.receive_from()
+
+        await asyncio.gather(*[drain(communicator) for communicator in sockets])
+
+        sender = room_sockets[0]
+        latencies = []
+        started = time.monotonic()
+        for i in range(message_cnt):
+            sent_at = time.monotonic()
+            await sender.send_json_to({'action': 'message', 'content': f'benchmark {i}', 'parentId': None,
+                                       'userId': members[0].id, 'userName': members[0].username})
+            # every member's chat room socket gets the message
+            await asyncio.gather(*[communicator.receive_json_from(timeout=10) for communicator in room_sockets])
+            latencies.append(time.monotonic() - sent_at)
+        # wait for the chat list, icon and friend list updates too
+        await asyncio.gather(*[drain(communicator) for communicator in sockets])
+        elapsed = time.monotonic() - started
+
+        for communicator in sockets:
+            await communicator.disconnect()
+        return latencies, elapsed
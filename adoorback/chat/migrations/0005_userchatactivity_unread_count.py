@@ -0,0 +1,27 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+COUNT_UNREAD = """
+UPDATE chat_userchatactivity activity SET unread_count = (
+    SELECT COUNT(*) FROM chat_message message
+    WHERE message.chat_room_id = activity.chat_room_id AND message.deleted IS NULL
+      AND message.id > COALESCE(activity.last_read_message_id, 0)
+)
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_merge_0003_auto_20240323_0026_0003_message_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userchatactivity',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(COUNT_UNREAD, migrations.RunSQL.noop),
+    ]
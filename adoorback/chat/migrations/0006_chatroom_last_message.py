@@ -0,0 +1,36 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SET_LAST_MESSAGE = """
+UPDATE chat_chatroom room SET last_message_id = latest.id, last_message_at = latest.timestamp
+FROM (
+    SELECT DISTINCT ON (chat_room_id) chat_room_id, id, timestamp FROM chat_message
+    WHERE deleted IS NULL
+    ORDER BY chat_room_id, id DESC
+) latest
+WHERE latest.chat_room_id = room.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_userchatactivity_unread_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(SET_LAST_MESSAGE, migrations.RunSQL.noop),
+    ]
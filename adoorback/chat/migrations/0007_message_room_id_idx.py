@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_chatroom_last_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['chat_room', 'id'], name='chat_message_room_id_idx'),
+        ),
+    ]
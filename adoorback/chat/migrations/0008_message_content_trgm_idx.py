@@ -0,0 +1,23 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:08
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # build the index without locking chat_message against writes
+    atomic = False
+
+    dependencies = [
+        ('account', '0017_user_username_trgm_idx'),  # pg_trgm
+        ('chat', '0007_message_room_id_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower(django.db.models.functions.text.Replace('content', models.Value(' '), models.Value(''))), name='gin_trgm_ops'), condition=models.Q(('deleted__isnull', True)), name='chat_message_content_trgm_idx'),
+        ),
+    ]
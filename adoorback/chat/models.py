@@ -1,15 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Greatest, Lower, Replace
 from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
+from safedelete.signals import post_softdelete, post_undelete
 
 from firebase_admin.messaging import Message
 
 from adoorback.models import AdoorModel, AdoorTimestampedModel
 from safedelete.models import SafeDeleteModel
 from safedelete.models import SOFT_DELETE_CASCADE
+from safedelete.managers import SafeDeleteManager
 
 
 DEFAULT_TIMESTAMP = '2008-10-03'
@@ -19,6 +23,9 @@ User = get_user_model()
 class ChatRoom(AdoorTimestampedModel, SafeDeleteModel):
     users = models.ManyToManyField(User, related_name='chat_rooms')
     active = models.BooleanField(default=True)
+    # latest message of the room, maintained by the Message signals below
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
 
     _safedelete_policy = SOFT_DELETE_CASCADE
 
@@ -36,22 +43,21 @@ class ChatRoom(AdoorTimestampedModel, SafeDeleteModel):
 
     @property
     def last_message_content(self):
-        return self.messages.last().content
+        return self.last_message.content if self.last_message else None
 
     @property
     def last_message_time(self):
-        return self.messages.last().timestamp
+        return self.last_message_at
 
     def unread_cnt(self, user):
-        if user not in self.users.all():
-            return -1
+        # user has an activity in every chat room they are a member of
+        unread_count = self.chat_activities.filter(user=user).values_list('unread_count', flat=True).first()
+        return -1 if unread_count is None else unread_count
 
-        user_last_msg = self.chat_activities.filter(user=user).first().last_read_message
-        if user_last_msg:
-            threshold_id = user_last_msg.id
-        else:
-            threshold_id = 0
-        return self.messages.filter(id__gt=threshold_id).count()
+
+def normalized_content():
+    """content in lower case without spaces, as matched by ChatMessageSearch"""
+    return Lower(Replace('content', Value(' '), Value('')))
 
 
 class Message(AdoorModel, SafeDeleteModel):
@@ -62,6 +68,15 @@ class Message(AdoorModel, SafeDeleteModel):
 
     _safedelete_policy = SOFT_DELETE_CASCADE
 
+    class Meta:
+        indexes = [
+            # messages of a chat room by id (ChatMessagesListView pagination, last message)
+            models.Index(fields=['chat_room', 'id'], condition=Q(deleted__isnull=True), name='chat_message_room_id_idx'),
+            # substring search (LIKE '%query%') on the normalized content
+            GinIndex(OpClass(normalized_content(), name='gin_trgm_ops'), condition=Q(deleted__isnull=True),
+                     name='chat_message_content_trgm_idx'),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} in {self.chat_room}: {self.content}"
     
@@ -97,10 +112,21 @@ class MessageLike(AdoorTimestampedModel, SafeDeleteModel):
         return f'{self.user} likes {self.message}'
 
 
+class UserChatActivityManager(SafeDeleteManager):
+    def total_unread_count(self, user):
+        """Unread messages of user over all their chat rooms"""
+        return self.filter(user=user, chat_room__users=user, chat_room__deleted__isnull=True) \
+            .aggregate(total=Sum('unread_count'))['total'] or 0
+
+
 class UserChatActivity(AdoorTimestampedModel, SafeDeleteModel):
     user = models.ForeignKey(User, related_name='chat_activities', on_delete=models.CASCADE)
     chat_room = models.ForeignKey(ChatRoom, related_name='chat_activities', on_delete=models.CASCADE)
     last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True)
+    # messages of the chat room after last_read_message, maintained by the Message signals below
+    unread_count = models.PositiveIntegerField(default=0)
+
+    objects = UserChatActivityManager()
 
     _safedelete_policy = SOFT_DELETE_CASCADE
 
@@ -126,11 +152,53 @@ def create_user_chat_activities(sender, instance, action, pk_set, **kwargs):
 def sender_read_message(created, instance, **kwargs):
     if created:
         # Update last read message for the sender
-        user_activity, _ = UserChatActivity.objects.get_or_create(
-            user_id=instance.sender.id, chat_room_id=instance.chat_room.id
-        )
-        user_activity.last_read_message_id = instance.id
-        user_activity.save()
+        updated = UserChatActivity.objects.filter(user_id=instance.sender_id, chat_room_id=instance.chat_room_id) \
+            .update(last_read_message_id=instance.id, unread_count=0)
+        if not updated:
+            UserChatActivity.objects.create(user_id=instance.sender_id, chat_room_id=instance.chat_room_id,
+                                            last_read_message_id=instance.id)
+
+        ChatRoom.all_objects.filter(id=instance.chat_room_id) \
+            .filter(Q(last_message__isnull=True) | Q(last_message_id__lt=instance.id)) \
+            .update(last_message_id=instance.id, last_message_at=instance.timestamp)
+
+        # one more unread message for the other members
+        UserChatActivity.objects.filter(chat_room_id=instance.chat_room_id).exclude(user_id=instance.sender_id) \
+            .update(unread_count=F('unread_count') + 1)
+
+
+def refresh_last_message(chat_room_id):
+    """Set last_message of the chat room to its latest message that is not deleted."""
+    latest = Message.objects.filter(chat_room=OuterRef('pk')).order_by('-id')
+    ChatRoom.all_objects.filter(pk=chat_room_id).update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_message_at=Subquery(latest.values('timestamp')[:1]),
+    )
+
+
+def unread_by(message):
+    """activities of the members who have not read `message`"""
+    return UserChatActivity.objects.filter(chat_room_id=message.chat_room_id) \
+        .exclude(user_id=message.sender_id) \
+        .filter(Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=message.id))
+
+
+@receiver(post_softdelete, sender=Message)
+def discount_deleted_message(instance, **kwargs):
+    unread_by(instance).update(unread_count=Greatest(F('unread_count') - 1, 0))
+    refresh_last_message(instance.chat_room_id)
+
+
+@receiver(post_delete, sender=Message)
+def discount_hard_deleted_message(instance, **kwargs):
+    if instance.deleted is None:  # soft-deleted messages were already discounted
+        discount_deleted_message(instance)
+
+
+@receiver(post_undelete, sender=Message)
+def count_undeleted_message(instance, **kwargs):
+    unread_by(instance).update(unread_count=F('unread_count') + 1)
+    refresh_last_message(instance.chat_room_id)
 
 
 @receiver(post_save, sender=ChatRoom)
@@ -15,11 +15,14 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and request.user:
             current_user = request.user
-            participants = obj.users.exclude(id=current_user.id)
+            # users prefetched by ChatRoomList
+            participants = [user for user in obj.users.all() if user.id != current_user.id]
             return UserMinimalSerializer(participants, many=True).data
         return []
     
     def get_unread_cnt(self, obj):
+        if getattr(obj, 'current_user_unread_cnt', None) is not None:  # annotated by ChatRoomList
+            return obj.current_user_unread_cnt
         request = self.context.get('request')
         if request and request.user:
             current_user = request.user
@@ -46,21 +49,24 @@ class ChatRoomMessageSerializer(MessageMinimalSerializer):
     message_like_cnt = serializers.SerializerMethodField(read_only=True)
 
     def get_parent_id(self, obj):
-        if obj.parent:
-            return obj.parent.id
-        return None
+        return obj.parent_id
 
     def get_parent_content(self, obj):
         if obj.parent:
             return obj.parent.content
         return None
 
+    # message_like_cnt and current_user_message_like_id are annotated by ChatMessagesListView
     def get_current_user_message_like_id(self, obj):
+        if hasattr(obj, 'current_user_message_like_id'):
+            return obj.current_user_message_like_id
         current_user_id = self.context['request'].user.id
         message_like = MessageLike.objects.filter(user_id=current_user_id, message_id=obj.id)
         return message_like[0].id if message_like else None
 
     def get_message_like_cnt(self, obj):
+        if hasattr(obj, 'message_like_cnt'):
+            return obj.message_like_cnt
         return MessageLike.objects.filter(message_id=obj.id).count()
 
     class Meta(MessageMinimalSerializer.Meta):
@@ -72,7 +78,7 @@ class SearchMessageSerializer(MessageMinimalSerializer):
     chat_room_id = serializers.SerializerMethodField()
 
     def get_chat_room_id(self, obj):
-        return obj.chat_room.id
+        return obj.chat_room_id
 
     class Meta(MessageMinimalSerializer.Meta):
         model = Message
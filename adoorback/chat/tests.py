@@ -1,3 +1,193 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from safedelete.models import HARD_DELETE
 
-# Create your tests here.
+from account.models import Connection
+from account.tests import create_admin, create_users
+from chat.models import ChatRoom, Message, UserChatActivity
+
+User = get_user_model()
+
+
+def create_chat_room(*users):
+    chat_room = ChatRoom.objects.create()
+    chat_room.users.add(*users)
+    return chat_room
+
+
+def send(sender, chat_room, content='hello', **kwargs):
+    return Message.objects.create(sender=sender, chat_room=chat_room, content=content,
+                                  timestamp=timezone.now(), **kwargs)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """Chat views over several rooms and messages (see account.tests.QueryBudgetTestCase)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_admin()
+        cls.user = User.objects.create_user(username='reader', email='reader@test.com', password='Test1234!')
+        cls.friends = create_users('friend', 6)
+        cls.chat_rooms = []
+        for friend in cls.friends:
+            Connection.objects.create(user1=cls.user, user2=friend, user1_choice='friend', user2_choice='friend')
+            chat_room = create_chat_room(cls.user, friend)
+            for i in range(3):
+                message = send(friend, chat_room, f'message {i} from {friend.username}')
+                send(cls.user, chat_room, f'reply {i} to {friend.username}', parent=message)
+            cls.chat_rooms.append(chat_room)
+        # a room with no message is not listed
+        create_chat_room(cls.user, cls.friends[0], cls.friends[1])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_chat_room_list(self):
+        response = self.client.get('/api/chat/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual([room['id'] for room in response.data['results']],
+                         [chat_room.id for chat_room in reversed(self.chat_rooms)])
+
+    def test_chat_messages(self):
+        chat_room, friend = self.chat_rooms[0], self.friends[0]
+        parent = chat_room.messages.first()
+        Message.objects.bulk_create([Message(sender=friend, chat_room=chat_room, content=f'more {i}',
+                                             timestamp=timezone.now(), parent=parent) for i in range(32)])
+
+        response = self.client.get(f'/api/chat/{chat_room.id}/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 30)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_chat_message_search(self):
+        response = self.client.get('/api/chat/rooms/search/', {'query': 'Reply 1', 'size': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 4)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class UnreadCountTestCase(APITestCase):
+    """UserChatActivity.unread_count equals the messages of others after the last read message"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_admin()
+        cls.users = create_users('member', 3)
+        cls.chat_room = create_chat_room(*cls.users)
+
+    def assertCounted(self):
+        for activity in UserChatActivity.objects.filter(chat_room=self.chat_room):
+            unread = Message.objects.filter(chat_room=self.chat_room).exclude(sender_id=activity.user_id)
+            if activity.last_read_message_id:
+                unread = unread.filter(id__gt=activity.last_read_message_id)
+            self.assertEqual(activity.unread_count, unread.count(), activity.user.username)
+
+    def unread_count(self, user):
+        return self.chat_room.chat_activities.get(user=user).unread_count
+
+    def test_send(self):
+        first, second, third = self.users
+        send(first, self.chat_room)
+        send(first, self.chat_room)
+        self.assertEqual([self.unread_count(user) for user in self.users], [0, 2, 2])
+        self.assertCounted()
+
+        # sending reads the room
+        send(second, self.chat_room)
+        self.assertEqual([self.unread_count(user) for user in self.users], [1, 0, 3])
+        self.assertCounted()
+
+        other_room = create_chat_room(first, third)
+        send(first, other_room)
+        self.assertEqual(UserChatActivity.objects.total_unread_count(third), 4)
+        self.assertEqual(UserChatActivity.objects.total_unread_count(first), 1)
+
+    def test_delete(self):
+        first, second, third = self.users
+        messages = [send(first, self.chat_room) for _ in range(3)]
+        send(second, self.chat_room)  # second has read messages
+        messages[0].delete()
+        self.assertEqual([self.unread_count(user) for user in self.users], [1, 0, 3])
+        self.assertCounted()
+
+        messages[0].undelete()
+        self.assertEqual([self.unread_count(user) for user in self.users], [1, 0, 4])
+        self.assertCounted()
+
+        Message.objects.get(id=messages[1].id).delete(force_policy=HARD_DELETE)
+        self.assertEqual([self.unread_count(user) for user in self.users], [1, 0, 3])
+        self.assertCounted()
+
+        # a soft-deleted message is not discounted twice when it is purged
+        messages[2].delete()
+        Message.all_objects.get(id=messages[2].id).delete(force_policy=HARD_DELETE)
+        self.assertEqual([self.unread_count(user) for user in self.users], [1, 0, 2])
+        self.assertCounted()
+
+    def test_chat_room_list(self):
+        first, second, _ = self.users
+        send(first, self.chat_room)
+        send(first, self.chat_room)
+        self.client.force_authenticate(second)
+        response = self.client.get('/api/chat/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['unread_cnt'], 2)
+
+
+class LastMessageTestCase(APITestCase):
+    """ChatRoom.last_message is the latest message of the room that is not deleted"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_admin()
+        cls.users = create_users('member', 2)
+        cls.chat_room = create_chat_room(*cls.users)
+
+    def assertLastMessage(self, message):
+        self.chat_room.refresh_from_db()
+        self.assertEqual(self.chat_room.last_message, message)
+        self.assertEqual(self.chat_room.last_message_at, message.timestamp if message else None)
+
+    def test_send(self):
+        self.assertLastMessage(None)
+        for user in self.users:
+            self.assertLastMessage(send(user, self.chat_room))
+
+        other_room = create_chat_room(*self.users)
+        send(self.users[0], other_room)
+        self.assertLastMessage(self.chat_room.messages.order_by('-id').first())
+
+    def test_delete(self):
+        first, second = self.users
+        older, latest = send(first, self.chat_room), send(second, self.chat_room)
+        latest.delete()
+        self.assertLastMessage(older)
+        latest.undelete()
+        self.assertLastMessage(latest)
+
+        # deleting an older message keeps the last message
+        older.delete()
+        self.assertLastMessage(latest)
+        older.undelete()
+        self.assertLastMessage(latest)
+
+        Message.objects.get(id=latest.id).delete(force_policy=HARD_DELETE)
+        self.assertLastMessage(older)
+        Message.objects.get(id=older.id).delete(force_policy=HARD_DELETE)
+        self.assertLastMessage(None)
+
+    def test_chat_room_list(self):
+        send(self.users[0], self.chat_room, 'first')
+        send(self.users[1], self.chat_room, 'last')
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get('/api/chat/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['last_message_content'], 'last')
@@ -1,41 +1,87 @@
 from collections import OrderedDict
 
-from django.db.models import F, Value, TextField
-from django.db.models.functions import Lower, Replace
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Count, ExpressionWrapper, FloatField, IntegerField, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Cast, Coalesce
 from rest_framework import generics, exceptions
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from account.models import User
+from adoorback.utils.pagination import KeysetCursorPagination
 from adoorback.utils.validators import adoor_exception_handler
-from chat.models import Message, ChatRoom, MessageLike
+from chat.models import Message, ChatRoom, MessageLike, UserChatActivity, normalized_content
 import chat.serializers as cs
 from collections import OrderedDict
 
 
 class ChatRoomList(generics.ListAPIView):
     """
-    Get all chat rooms of request user.
+    Get all chat rooms of request user, most recently active first.
     """
     serializer_class = cs.ChatRoomSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = 4
 
     def get_queryset(self):
         current_user = self.request.user
-        current_user.chat_rooms.all()
-        return current_user.chat_rooms.filter(messages__isnull=False).distinct()
+        unread_cnt = UserChatActivity.objects.filter(chat_room=OuterRef('pk'), user=current_user) \
+            .values('unread_count')[:1]
+        return current_user.chat_rooms.filter(last_message__isnull=False) \
+            .select_related('last_message') \
+            .prefetch_related('users') \
+            .annotate(current_user_unread_cnt=Subquery(unread_cnt)) \
+            .order_by('-last_message_at', '-id')
 
 
-class ReversePagination(PageNumberPagination):
+class MessageIdPagination(BasePagination):
+    """
+    Messages of a chat room around a message id, oldest first:
+    - no parameter: the latest messages
+    - `before_id`: the messages just before that one (scrolling back)
+    - `after_id`: the messages just after that one
+    `next` links to older messages, `previous` to newer ones.
+    Every page is one `WHERE id < before_id ORDER BY id DESC LIMIT page_size + 1` on the (chat_room, id) index.
+    """
     page_size = 30
 
+    def get_id_param(self, request, name):
+        value = request.query_params.get(name)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise exceptions.ValidationError({name: 'must be a message id'})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        before_id = self.get_id_param(request, 'before_id')
+        after_id = self.get_id_param(request, 'after_id')
+
+        if after_id is not None:
+            rows = list(queryset.filter(id__gt=after_id).order_by('id')[:self.page_size + 1])
+            self.has_newer, self.has_older = len(rows) > self.page_size, True
+            self.page = rows[:self.page_size]
+        else:
+            if before_id is not None:
+                queryset = queryset.filter(id__lt=before_id)
+            rows = list(queryset.order_by('-id')[:self.page_size + 1])
+            self.has_older, self.has_newer = len(rows) > self.page_size, before_id is not None
+            self.page = list(reversed(rows[:self.page_size]))
+        return self.page
+
+    def get_link(self, name, message_id):
+        url = remove_query_param(remove_query_param(self.base_url, 'before_id'), 'after_id')
+        return replace_query_param(url, name, message_id)
+
     def get_paginated_response(self, data):
         return Response(OrderedDict([
-            ('count', self.page.paginator.count),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('results', list(reversed(data)))
+            ('next', self.get_link('before_id', self.page[0].id) if self.page and self.has_older else None),
+            ('previous', self.get_link('after_id', self.page[-1].id) if self.page and self.has_newer else None),
+            ('results', data)
         ]))
 
 
@@ -80,17 +126,21 @@ class ChatRoomFriendList(generics.ListAPIView):
             raise exceptions.PermissionDenied("You cannot chat with yourself")
 
         chat_rooms = ChatRoom.objects.filter(users=current_user).filter(users=friend) \
-            .filter(messages__isnull=False).distinct()
+            .filter(last_message__isnull=False).select_related('last_message')
 
         return chat_rooms
 
 
 class ChatMessageSearch(generics.ListAPIView):
     '''
-    Get chatroom messages that contain query.
+    Get chatroom messages that contain query (ignoring case and spaces),
+    closest matches first, then most recent.
     '''
     serializer_class = cs.SearchMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ('-rank', '-id')
+    query_budget = 4
 
     def get_exception_handler(self):
         return adoor_exception_handler
@@ -101,32 +151,46 @@ class ChatMessageSearch(generics.ListAPIView):
         chat_rooms = user.chat_rooms.filter(active=True)
 
         if query:
+            # LIKE on normalized_content() uses chat_message_content_trgm_idx
             messages = Message.objects.filter(
                 chat_room__in=chat_rooms
             ).annotate(
-                lower_content=Lower(Replace(F('content'), Value(" "), Value(""), output_field=TextField()))
+                # same expression as the index; content is a TextField and the Values CharFields
+                normalized_content=ExpressionWrapper(normalized_content(), output_field=TextField())
             ).filter(
-                lower_content__icontains=query
-            ).order_by('-timestamp')
+                normalized_content__contains=query
+            ).annotate(
+                # similarity() is a real: as double precision the rank round-trips through the cursor
+                rank=Cast(TrigramSimilarity('normalized_content', query), FloatField())
+            ).select_related('sender')
             return messages
 
-        return Message.objects.none()
+        # still ordered by the paginator
+        return Message.objects.none().annotate(rank=Value(0.0, output_field=FloatField()))
 
 
 class ChatMessagesListView(generics.ListAPIView):
     serializer_class = cs.ChatRoomMessageSerializer
-    pagination_class = ReversePagination
+    pagination_class = MessageIdPagination
     permission_classes = [IsAuthenticated]
+    query_budget = 5
 
     def get_queryset(self):
         try:
             chat_room = ChatRoom.objects.get(id=self.kwargs.get('pk'))
-            if self.request.user not in chat_room.users.all():
+            if not chat_room.users.filter(id=self.request.user.id).exists():
                 raise exceptions.PermissionDenied("You are not in this chat room")
         except ChatRoom.DoesNotExist:
             raise exceptions.NotFound("Chat room not found")
 
-        chat_messages = Message.objects.filter(chat_room__id=self.kwargs.get('pk')).order_by('-id')
+        likes = MessageLike.objects.filter(message=OuterRef('pk')).order_by()
+        message_like_cnt = likes.values('message').annotate(cnt=Count('id')).values('cnt')
+        current_user_like = likes.filter(user=self.request.user).values('id')[:1]
+        chat_messages = Message.objects.filter(chat_room__id=self.kwargs.get('pk')) \
+            .select_related('sender', 'parent') \
+            .annotate(message_like_cnt=Coalesce(Subquery(message_like_cnt, output_field=IntegerField()), 0),
+                      current_user_message_like_id=Subquery(current_user_like)) \
+            .order_by('-id')
         return chat_messages
 
 
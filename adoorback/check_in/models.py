@@ -1,15 +1,13 @@
-from django.contrib.contenttypes.models import ContentType
 from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
-from adoorback.models import AdoorTimestampedModel
+from adoorback.models import AdoorTimestampedModel, AudienceManager
 
 from safedelete.models import SafeDeleteModel
 from safedelete.models import SOFT_DELETE_CASCADE
 
-from content_report.models import ContentReport
 
 User = get_user_model()
 
@@ -36,6 +34,10 @@ class CheckIn(AdoorTimestampedModel, SafeDeleteModel):
 
     readers = models.ManyToManyField(User, related_name='read_check_ins')
 
+    objects = AudienceManager()
+
+    audience_author_field = 'user'
+
     _safedelete_policy = SOFT_DELETE_CASCADE
 
     def __str__(self):
@@ -46,20 +48,7 @@ class CheckIn(AdoorTimestampedModel, SafeDeleteModel):
         return self.readers.values_list('id', flat=True)
     
     def is_audience(self, user):
-        content_type = ContentType.objects.get_for_model(self)
-        if ContentReport.objects.filter(user=user, content_type=content_type, object_id=self.pk).exists():
-            return False
-
-        if self.user.id in user.user_report_blocked_ids:
-            return False
-
-        if self.user == user:
-            return True
-
-        if self.user.is_connected(user):
-            return True
-
-        return False
+        return CheckIn.objects.visible_to(user).filter(pk=self.pk).exists()
 
     class Meta:
         indexes = [
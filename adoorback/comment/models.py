@@ -16,7 +16,7 @@ from adoorback.utils.helpers import wrap_content
 from adoorback.utils.content_types import get_comment_type, get_generic_relation_type
 from content_report.models import ContentReport
 from like.models import Like
-from notification.models import Notification, NotificationActor
+from notification.models import Notification
 from user_tag.models import UserTag
 from utils.helpers import parse_user_tag_from_content
 
@@ -88,64 +88,27 @@ def create_noti(instance, created, **kwargs):
     if origin.type == 'Comment':
         redirect_url = f'/{origin.target.type.lower()}s/{origin.target.id}'
         # send a notification to the author of the origin comment
-        if origin_author == actor:
-            pass
-        elif actor.id in origin_author.user_report_blocked_ids:
-            pass
-        else:
-            noti = Notification.objects.create(user=origin_author,
-                                               origin_id=origin.id,
-                                               origin_type=get_generic_relation_type(origin.type),
-                                               target_id=target.id,
-                                               target_type=get_comment_type(),
-                                               message_ko=f'{actor.username}이 회원님의 댓글에 답글을 남겼습니다: "{content_preview}"',
-                                               message_en=f'{actor.username} has replied to your comment: "{content_preview}"',
-                                               redirect_url=redirect_url)
-            NotificationActor.objects.create(user=actor, notification=noti)
+        Notification.objects.bulk_fan_out(
+            [origin_author], actor=actor, origin=origin, target=target, redirect_url=redirect_url,
+            message_ko=f'{actor.username}이 회원님의 댓글에 답글을 남겼습니다: "{content_preview}"',
+            message_en=f'{actor.username} has replied to your comment: "{content_preview}"')
 
         # send a notification to the author of the qna where the origin comment commented
         post_author = origin.target.author
-        if post_author == origin_author:
-            pass
-        elif post_author == actor:
-            pass
-        elif actor.id in post_author.user_report_blocked_ids:
-            pass
-        else:
-            noti = Notification.objects.create(user=post_author,
-                                               origin_id=origin.id,
-                                               origin_type=get_generic_relation_type(origin.type),
-                                               target_id=target.id,
-                                               target_type=get_comment_type(),
-                                               message_ko=f'회원님의 답변에 달린 댓글에 새로운 답글이 달렸습니다: "{content_preview}"',
-                                               message_en=f'There\'s a new reply to the comment on your response: "{content_preview}"',
-                                               redirect_url=redirect_url)
-            NotificationActor.objects.create(user=actor, notification=noti)
+        if post_author != origin_author:
+            Notification.objects.bulk_fan_out(
+                [post_author], actor=actor, origin=origin, target=target, redirect_url=redirect_url,
+                message_ko=f'회원님의 답변에 달린 댓글에 새로운 답글이 달렸습니다: "{content_preview}"',
+                message_en=f'There\'s a new reply to the comment on your response: "{content_preview}"')
 
         # send notifications to participants of the origin comment
         if not instance.is_private:
-            for participant_id in origin.participants:
-                if participant_id == origin_author.id:
-                    continue
-                if participant_id == post_author.id:
-                    continue
-                if participant_id == actor.id:
-                    continue
-                participant = User.objects.get(id=participant_id)
-                if actor.id in participant.user_report_blocked_ids:
-                    continue
-                content_type = ContentType.objects.get_for_model(origin).model
-                if (content_type, origin.id) in participant.content_report_blocked_model_ids:
-                    return
-                noti = Notification.objects.create(user=participant,
-                                                origin_id=origin.id,
-                                                origin_type=get_generic_relation_type(origin.type),
-                                                target_id=target.id,
-                                                target_type=get_comment_type(),
-                                                message_ko=f'회원님이 답글을 남긴 댓글에 새로운 답글이 달렸습니다: "{content_preview}"',
-                                                message_en=f'There\'s a new reply in the comment thread where you left a reply: "{content_preview}"',
-                                                redirect_url=redirect_url)
-                NotificationActor.objects.create(user=actor, notification=noti)
+            participant_ids = set(origin.participants) - {origin_author.id, post_author.id}
+            Notification.objects.bulk_fan_out(
+                participant_ids, actor=actor, origin=origin, target=target, redirect_url=redirect_url,
+                message_ko=f'회원님이 답글을 남긴 댓글에 새로운 답글이 달렸습니다: "{content_preview}"',
+                message_en=f'There\'s a new reply in the comment thread where you left a reply: "{content_preview}"',
+                skip_reporters_of=origin)
 
     # if not reply
     else:
@@ -153,43 +116,19 @@ def create_noti(instance, created, **kwargs):
         # send a notification to the author of the origin qna
         origin_target_name_ko = '노트' if origin.type == 'Note' else '답변'
         origin_target_name_en = 'note' if origin.type == 'Note' else 'answer'
-        if origin_author == actor:
-            pass
-        elif actor.id in origin_author.user_report_blocked_ids:
-            pass
-        else:
-            noti = Notification.objects.create(user=origin_author,
-                                               origin_id=origin.id,
-                                               origin_type=get_generic_relation_type(origin.type),
-                                               target_id=target.id,
-                                               target_type=get_comment_type(),
-                                               message_ko=f'{actor.username}님이 회원님의 {origin_target_name_ko}에 댓글을 남겼습니다: "{content_preview}"',
-                                               message_en=f'{actor.username} has commented on your {origin_target_name_en}: "{content_preview}"',
-                                               redirect_url=redirect_url)
-            NotificationActor.objects.create(user=actor, notification=noti)
+        Notification.objects.bulk_fan_out(
+            [origin_author], actor=actor, origin=origin, target=target, redirect_url=redirect_url,
+            message_ko=f'{actor.username}님이 회원님의 {origin_target_name_ko}에 댓글을 남겼습니다: "{content_preview}"',
+            message_en=f'{actor.username} has commented on your {origin_target_name_en}: "{content_preview}"')
 
         # send notifications to participants of the origin qna
         if not instance.is_private:
-            for participant_id in origin.participants:
-                if participant_id == origin_author.id:
-                    continue
-                if participant_id == actor.id:
-                    continue
-                participant = User.objects.get(id=participant_id)
-                if actor.id in participant.user_report_blocked_ids:
-                    continue
-                content_type = ContentType.objects.get_for_model(origin).model
-                if (content_type, origin.id) in participant.content_report_blocked_model_ids:
-                    return
-                noti = Notification.objects.create(user=participant,
-                                                origin_id=origin.id,
-                                                origin_type=get_generic_relation_type(origin.type),
-                                                target_id=target.id,
-                                                target_type=get_comment_type(),
-                                                message_ko=f'회원님이 댓글을 남긴 {origin_target_name_ko}에 새로운 댓글이 달렸습니다: "{content_preview}"',
-                                                message_en=f'There\'s a new comment on the {origin_target_name_en} you commented on: "{content_preview}"',
-                                                redirect_url=redirect_url)
-                NotificationActor.objects.create(user=actor, notification=noti)
+            participant_ids = set(origin.participants) - {origin_author.id}
+            Notification.objects.bulk_fan_out(
+                participant_ids, actor=actor, origin=origin, target=target, redirect_url=redirect_url,
+                message_ko=f'회원님이 댓글을 남긴 {origin_target_name_ko}에 새로운 댓글이 달렸습니다: "{content_preview}"',
+                message_en=f'There\'s a new comment on the {origin_target_name_en} you commented on: "{content_preview}"',
+                skip_reporters_of=origin)
 
 
 @transaction.atomic
@@ -2,7 +2,10 @@ from django.db import models, transaction
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
+from account import block_list
 from adoorback.models import AdoorTimestampedModel
 
 from safedelete.models import SafeDeleteModel
@@ -31,3 +34,9 @@ class ContentReport(AdoorTimestampedModel, SafeDeleteModel):
     @property
     def type(self):
         return self.__class__.__name__
+
+
+@receiver(post_save, sender=ContentReport)
+@receiver(post_delete, sender=ContentReport)
+def invalidate_block_list(instance, **kwargs):
+    block_list.invalidate(instance.user_id)
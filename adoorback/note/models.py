@@ -10,15 +10,16 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from safedelete import SOFT_DELETE_CASCADE, HARD_DELETE
 from safedelete.models import SafeDeleteModel
+from safedelete.signals import post_undelete
 
 from django.conf import settings
 
+from account import feed
 from account.models import Subscription
-from adoorback.models import AdoorModel
+from adoorback.models import AdoorModel, AudienceManager
 from comment.models import Comment
-from content_report.models import ContentReport
 from like.models import Like
-from notification.models import Notification, NotificationActor
+from notification.models import Notification
 from reaction.models import Reaction
 
 User = get_user_model()
@@ -53,6 +54,8 @@ class Note(AdoorModel, SafeDeleteModel):
                                             content_type_field='origin_type',
                                             object_id_field='origin_id')
 
+    objects = AudienceManager()
+
     _safedelete_policy = SOFT_DELETE_CASCADE
 
     def __str__(self):
@@ -88,23 +91,7 @@ class Note(AdoorModel, SafeDeleteModel):
         return Reaction.objects.filter(content_type=note_content_type, object_id=self.id)
 
     def is_audience(self, user):
-        content_type = ContentType.objects.get_for_model(self)
-        if ContentReport.objects.filter(user=user, content_type=content_type, object_id=self.pk).exists():
-            print("is_audience: report exists")
-            return False
-
-        if self.author.id in user.user_report_blocked_ids:
-            print("is_audience: author is blocked")
-            return False
-
-        if self.author == user:
-            print("is_audience: author is user")
-            return True
-
-        if self.author.is_connected(user):
-            return True
-
-        return False
+        return Note.objects.visible_to(user).filter(pk=self.pk).exists()
 
     class Meta:
         indexes = [
@@ -152,17 +139,26 @@ def send_notifications_to_subscribers(sender, instance, created, **kwargs):
     subscribers = Subscription.objects.filter(
         subscribed_to=author,
         content_type=note_content_type,
-    ).values_list('subscriber', flat=True)
-
-    for subscriber_id in subscribers:
-        subscriber = get_user_model().objects.get(id=subscriber_id)
-        
-        noti = Notification.objects.create(
-            user=subscriber,
-            origin=instance,
-            target=instance,
-            message_ko=f'{author.username}님이 새 노트를 작성했습니다.',
-            message_en=f'{author.username} has posted a new note.',
-            redirect_url=f'/notes/{instance.id}'
-        )
-        NotificationActor.objects.create(user=author, notification=noti)
+    ).values_list('subscriber_id', flat=True)
+
+    Notification.objects.bulk_fan_out(
+        subscribers,
+        actor=author,
+        origin=instance,
+        target=instance,
+        message_ko=f'{author.username}님이 새 노트를 작성했습니다.',
+        message_en=f'{author.username} has posted a new note.',
+        redirect_url=f'/notes/{instance.id}',
+    )
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+@receiver(post_undelete, sender=Note)
+def update_feed_timelines(instance, signal, created=False, **kwargs):
+    if not feed.is_push_mode():
+        return
+    if signal is post_delete or instance.deleted:
+        feed.remove(instance)
+    elif created or signal is post_undelete:
+        feed.fan_out(instance)
@@ -1,6 +1,5 @@
 from itertools import chain
 
-from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
 from django.db.models import F, Value, CharField
 from django.http import Http404
@@ -44,7 +43,6 @@ class NoteComments(generics.ListAPIView):
 
     def get_queryset(self):
         from comment.models import Comment
-        from content_report.models import ContentReport
 
         current_user = self.request.user
 
@@ -52,10 +50,7 @@ class NoteComments(generics.ListAPIView):
         if not note.is_audience(current_user):
             return PermissionDenied("You do not have permission to view these comments.")
         
-        blocked_content_ids = ContentReport.objects.filter(
-            user=current_user,
-            content_type=ContentType.objects.get_for_model(Comment)
-        ).values_list('object_id', flat=True)
+        blocked_content_ids = current_user.block_list.reported_object_ids(Comment)
 
         return note.note_comments.exclude(
             id__in=blocked_content_ids,
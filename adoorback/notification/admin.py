@@ -3,7 +3,7 @@ from django.contrib import admin
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
-from .models import Notification
+from .models import Notification, PushOutbox
 
 
 class NotificationResource(resources.ModelResource):
@@ -17,3 +17,9 @@ class NotificationAdmin(ImportExportModelAdmin):
 
 
 admin.site.register(Notification, NotificationAdmin)
+
+
+@admin.register(PushOutbox)
+class PushOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'kind', 'status', 'attempts', 'next_attempt_at', 'last_error']
+    list_filter = ['status', 'kind']
@@ -0,0 +1,92 @@
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import WebsocketConsumer
+from django.utils import translation
+from django.utils.dateparse import parse_datetime
+
+from notification.models import Notification, NotificationCounter
+from notification.realtime import group_name
+from notification.serializers import NotificationSerializer
+
+
+RESUME_LIMIT = 100
+
+
+class NotificationConsumer(WebsocketConsumer):
+    """
+    Streams the changes of the current user's notifications (see notification.realtime).
+
+    On connect the client gets its unread count, and the notifications updated after `since`
+    (query string, a notification_updated_at it has already seen) when it is reconnecting.
+    A {"action": "resume", "since": ...} message does the same on an open connection.
+    """
+    def connect(self):
+        self.user = self.scope["user"]
+        self.user_group_id = group_name(self.user.id)
+
+        query = parse_qs(self.scope["query_string"].decode("utf8"))
+        headers = dict(self.scope.get("headers", []))
+        self.language = query.get("lang", [None])[0] or \
+            headers.get(b"accept-language", b"en").decode("utf8")
+
+        async_to_sync(self.channel_layer.group_add)(
+            self.user_group_id, self.channel_name
+        )
+
+        self.accept()
+
+        self.send_state(query.get("since", [None])[0])
+
+    def disconnect(self, close_code):
+        async_to_sync(self.channel_layer.group_discard)(
+            self.user_group_id, self.channel_name
+        )
+
+    # Receive message from WebSocket
+    def receive(self, text_data):
+        text_data_json = json.loads(text_data)
+
+        if text_data_json.get('action') == 'resume':
+            self.send_state(text_data_json.get('since'))
+
+    def send_state(self, since):
+        payload = {
+            "type": "state",
+            "unreadCount": NotificationCounter.objects.unread_count(self.user),
+        }
+        if since:
+            # '+' of the utc offset is decoded as a space in query strings
+            since = parse_datetime(since.replace(' ', '+'))
+            if since is None:
+                payload["error"] = "Invalid since."
+            else:
+                notifications = list(Notification.objects.visible_only()
+                                     .filter(user=self.user, notification_updated_at__gt=since)
+                                     .order_by('notification_updated_at', 'id')[:RESUME_LIMIT + 1])
+                payload["notifications"] = self.serialize(notifications[:RESUME_LIMIT])
+                # more changes than sent: the client reloads the list from NotificationList
+                payload["hasMore"] = len(notifications) > RESUME_LIMIT
+
+        self.send(text_data=json.dumps(payload))
+
+    # Receive changes from the user's notification group
+    def notification_changed(self, event):
+        ids = event["ids"]
+        notifications = list(Notification.objects.visible_only().filter(user=self.user, id__in=ids)) \
+            if ids else []
+        # soft deleted or hidden since
+        removed_ids = sorted(set(ids) - {notification.id for notification in notifications})
+
+        self.send(text_data=json.dumps({
+            "type": "changed",
+            "notifications": self.serialize(notifications),
+            "removedIds": removed_ids,
+            "readIds": event["readIds"],
+            "unreadDelta": event["unreadDelta"],
+        }))
+
+    def serialize(self, notifications):
+        with translation.override(self.language):
+            return NotificationSerializer(notifications, many=True, context={'language': self.language}).data
@@ -0,0 +1,53 @@
+import time
+
+from django_cron import CronJobBase, Schedule
+
+from notification import push
+from notification.retention import compact
+
+
+class CompactNotificationsCronJob(CronJobBase):
+    """
+    Archives old read notifications, purges expired ones and manages the monthly
+    partitions of notification_archive (see notification.retention).
+    """
+    # run every day at 5 am
+    RUN_AT_TIMES = ['05:00']
+
+    schedule = Schedule(run_at_times=RUN_AT_TIMES)
+    code = 'notification.compact_notifications_cron_job'
+
+    def do(self):
+        print('=========================')
+        print("Compacting notifications...............")
+        stats = compact()
+        print(f"purged {stats['purged']}, archived {stats['archived']}, "
+              f"dropped partitions {stats['dropped_partitions']}")
+        print("Cron job complete...............")
+        print('=========================')
+
+
+class DrainPushOutboxCronJob(CronJobBase):
+    """
+    Delivers the pending push notifications of the PushOutbox (see notification.push),
+    until the outbox is empty or for at most MAX_SECONDS, so runs do not pile up.
+    """
+    RUN_EVERY_MINS = 1
+    MAX_SECONDS = 50
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'notification.drain_push_outbox_cron_job'
+
+    def do(self):
+        started = time.monotonic()
+        transport = push.get_transport()
+        totals = {}
+        while time.monotonic() - started < self.MAX_SECONDS:
+            stats = push.drain(transport=transport)
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+            if not stats['rows']:
+                break
+        if totals.get('rows'):
+            print(f"push outbox: {totals['sent']} sent, {totals['retried']} to retry, "
+                  f"{totals['failed']} failed, {totals['deactivated']} devices deactivated")
@@ -1,36 +1,5 @@
 import re
 
-from django.core.exceptions import ValidationError
-
-from adoorback.utils.content_types import get_comment_type, get_like_type, get_response_type, get_reaction_type, \
-    get_note_type
-
-
-
-def find_like_noti(user, origin, noti_type):
-    from notification.models import Notification
-    from comment.models import Comment
-
-    existing_notifications = Notification.objects.filter(user=user, origin_id=origin.id, target_type=get_like_type())
-
-    reply_ids = Comment.objects.filter(content_type=get_comment_type()). \
-        values_list('id', flat=True)
-
-    if noti_type == "like_reply_noti":
-        existing_notifications = existing_notifications.filter(origin_type=get_comment_type(), origin_id__in=reply_ids)
-    elif noti_type == "like_comment_noti":
-        existing_notifications = existing_notifications.filter(origin_type=get_comment_type()).exclude(
-            origin_id__in=reply_ids)
-    elif noti_type == "like_response_noti":
-        existing_notifications = existing_notifications.filter(origin_type=get_response_type())
-    elif noti_type == "like_note_noti":
-        existing_notifications = existing_notifications.filter(origin_type=get_note_type())
-
-    if existing_notifications.count() > 1:
-        raise ValidationError("There are more than one notifications that satisfy this condition.")
-
-    return existing_notifications.first()
-
 
 def construct_message(noti_type, user_a_ko, user_b_ko, user_a_en, user_b_en, N, content_en, content_ko, emoji=None):
     if noti_type == "like_reply_noti" or noti_type == "like_comment_noti":
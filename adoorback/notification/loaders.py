@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+RECENT_ACTORS = 3
+
+
+def question_id_from_redirect_url(redirect_url):
+    # e.g. /questions/12/new
+    try:
+        return int(redirect_url.split('/')[-2])
+    except (IndexError, ValueError):
+        return None
+
+
+class NotificationLoader:
+    """
+    Everything NotificationSerializer needs about a page of notifications, with one query
+    per target content type, one for the recent actors and one for the questions.
+    """
+
+    def __init__(self, notifications):
+        self.notification_ids = [notification.id for notification in notifications]
+        self._load(notifications)
+
+    def _load(self, notifications):
+        from qna.models import Question
+
+        # targets, like GenericForeignKey does (including soft-deleted objects)
+        target_ids = defaultdict(set)
+        for notification in notifications:
+            if notification.target_type_id is not None and notification.target_id is not None:
+                target_ids[notification.target_type_id].add(notification.target_id)
+        self.targets = {}
+        for content_type_id, ids in target_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            for target in model._base_manager.filter(pk__in=ids):
+                self.targets[content_type_id, target.pk] = target
+
+        # first actors of each notification, in the order of obj.actors.all()
+        self.actors = defaultdict(list)
+        actors = get_user_model().objects.filter(notificationactor__notification_id__in=self.notification_ids) \
+            .annotate(
+                notification_id=F('notificationactor__notification_id'),
+                actor_rank=Window(RowNumber(), partition_by=F('notificationactor__notification_id'),
+                                  order_by=F('id').asc()),
+            ).filter(actor_rank__lte=RECENT_ACTORS).order_by('notification_id', 'actor_rank')
+        for actor in actors:
+            self.actors[actor.notification_id].append(actor)
+
+        # questions shown with response requests, responses and question notifications
+        self.question_ids = {}
+        for notification in notifications:
+            target = self.target(notification)
+            if target is None:
+                continue
+            if target.type in ('ResponseRequest', 'Response'):
+                self.question_ids[notification.id] = target.question_id
+            elif notification.redirect_url[:11] == '/questions/' and target.type != 'Like':
+                self.question_ids[notification.id] = question_id_from_redirect_url(notification.redirect_url)
+        self.questions = Question._base_manager.in_bulk(
+            {question_id for question_id in self.question_ids.values() if question_id is not None})
+
+    def target(self, notification):
+        return self.targets.get((notification.target_type_id, notification.target_id))
+
+    def recent_actors(self, notification):
+        return self.actors.get(notification.id, [])
+
+    def question(self, notification):
+        return self.questions.get(self.question_ids.get(notification.id))
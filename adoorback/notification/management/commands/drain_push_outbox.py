@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notification import push
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending push notifications (PushOutbox) in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=push.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='keep polling for new rows instead of exiting once the outbox is drained')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='seconds to wait when the outbox is empty (with --loop)')
+        parser.add_argument('--fake', action='store_true',
+                            help='send through FakeTransport instead of PUSH_TRANSPORT (offline benchmark)')
+        parser.add_argument('--fake-latency', type=float, default=0.0,
+                            help='seconds FakeTransport waits per send_each call')
+
+    def handle(self, *args, **options):
+        transport = push.FakeTransport(latency=options['fake_latency']) if options['fake'] else push.get_transport()
+        totals = {}
+        started = time.monotonic()
+
+        while True:
+            stats = push.drain(batch_size=options['batch_size'], transport=transport)
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+            if stats['rows']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            '{rows} rows, {messages} messages: {sent} sent, {retried} to retry, {failed} failed, '
+            '{deactivated} devices deactivated'.format(**totals)
+            + f' in {elapsed:.2f}s ({totals["messages"] / elapsed if elapsed else 0:.0f} messages/s)'))
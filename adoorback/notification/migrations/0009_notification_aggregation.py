@@ -0,0 +1,77 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+# key the latest notification of every (user, kind, origin[, emoji]) group (see notification.models.aggregation_key);
+# older duplicates keep a NULL key
+SET_AGGREGATION_KEYS = """
+UPDATE notification_notification n SET aggregation_key = keyed.key
+FROM (
+    SELECT id, key, ROW_NUMBER() OVER (
+        PARTITION BY user_id, key ORDER BY notification_updated_at DESC NULLS LAST, id DESC) AS rank
+    FROM (
+        SELECT n.id, n.user_id, n.notification_updated_at,
+               ct.model || ':' || n.origin_type_id || ':' || n.origin_id || COALESCE(':' || r.emoji, '') AS key
+        FROM notification_notification n
+        JOIN django_content_type ct ON ct.id = n.target_type_id
+        LEFT JOIN reaction_reaction r ON ct.app_label = 'reaction' AND r.id = n.target_id
+        WHERE n.deleted IS NULL AND n.user_id IS NOT NULL AND n.origin_id IS NOT NULL
+          AND (ct.app_label, ct.model) IN (('like', 'like'), ('reaction', 'reaction'), ('qna', 'responserequest'))
+    ) AS candidates
+) AS keyed
+WHERE n.id = keyed.id AND keyed.rank = 1
+"""
+
+SET_ACTOR_COUNTS = """
+UPDATE notification_notification n SET
+    actor_count = GREATEST((SELECT COUNT(*) FROM notification_notificationactor a
+                            WHERE a.notification_id = n.id AND a.deleted IS NULL), 1),
+    recent_actors = COALESCE((
+        SELECT jsonb_agg(jsonb_build_object('id', recent.id, 'username', recent.username) ORDER BY recent.created_at DESC)
+        FROM (
+            SELECT u.id, u.username, a.created_at
+            FROM notification_notificationactor a JOIN account_user u ON u.id = a.user_id
+            WHERE a.notification_id = n.id AND a.deleted IS NULL
+            ORDER BY a.created_at DESC LIMIT 2
+        ) AS recent
+    ), '[]'::jsonb)
+WHERE n.aggregation_key IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    # the backfills read the tables of these apps
+    dependencies = [
+        ('account', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('like', '0001_initial'),
+        ('notification', '0008_pushoutbox'),
+        ('qna', '0001_initial'),
+        ('reaction', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='aggregation_key',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunSQL(SET_AGGREGATION_KEYS, migrations.RunSQL.noop),
+        migrations.RunSQL(SET_ACTOR_COUNTS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('aggregation_key__isnull', False), ('deleted__isnull', True)), fields=('user', 'aggregation_key'), name='unique_notification_aggregation_key'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+COUNT_UNREAD = """
+INSERT INTO notification_notificationcounter (user_id, unread_count)
+SELECT user_id, COUNT(*) FROM notification_notification
+WHERE user_id IS NOT NULL AND is_read = false AND deleted IS NULL
+GROUP BY user_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0018_user_next_noti_at_utc'),
+        ('notification', '0009_notification_aggregation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(COUNT_UNREAD, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+# partitioned by month of notification_updated_at, partitions are managed by notification.retention
+CREATE_ARCHIVE = '''
+CREATE TABLE notification_archive (
+    id integer NOT NULL,
+    user_id integer NOT NULL REFERENCES account_user (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    actor_ids integer[] NOT NULL DEFAULT '{}',
+    actor_count integer NOT NULL,
+    target_type_id integer NULL,
+    target_id integer NULL,
+    origin_type_id integer NULL,
+    origin_id integer NULL,
+    redirect_url varchar(150) NOT NULL,
+    message varchar(100) NOT NULL,
+    message_ko varchar(100) NULL,
+    message_en varchar(100) NULL,
+    is_visible boolean NOT NULL,
+    is_read boolean NOT NULL,
+    aggregation_key varchar(100) NULL,
+    created_at timestamp with time zone NOT NULL,
+    notification_updated_at timestamp with time zone NOT NULL,
+    archived_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, notification_updated_at)
+) PARTITION BY RANGE (notification_updated_at);
+CREATE INDEX notification_archive_user_idx ON notification_archive (user_id, notification_updated_at DESC);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0018_user_next_noti_at_utc'),
+        ('notification', '0010_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_ARCHIVE, reverse_sql='DROP TABLE notification_archive;'),
+    ]
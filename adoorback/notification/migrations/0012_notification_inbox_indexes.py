@@ -0,0 +1,36 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0011_notification_archive'),
+    ]
+
+    operations = [
+        # keyset pagination needs a value on every row
+        migrations.RunSQL(
+            'UPDATE notification_notification SET notification_updated_at = created_at '
+            'WHERE notification_updated_at IS NULL',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['user', 'is_visible', '-notification_updated_at', '-id'], name='noti_user_visible_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('deleted__isnull', True), ('is_visible', True)), fields=['user', 'target_type', '-notification_updated_at', '-id'], name='noti_user_target_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('deleted__isnull', True), ('is_read', False)), fields=['user', '-notification_updated_at', '-id'], name='noti_user_unread_idx'),
+        ),
+    ]
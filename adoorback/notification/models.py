@@ -1,25 +1,52 @@
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Greatest
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
 from adoorback.models import AdoorTimestampedModel
-from adoorback.utils.content_types import get_response_request_type, get_question_type
-from notification.helpers import find_like_noti, construct_message
+from notification.helpers import construct_message
+from notification.realtime import publish
 
-from firebase_admin.messaging import Message
-from firebase_admin.messaging import Notification as FirebaseNotification
-from custom_fcm.models import CustomFCMDevice
 from safedelete.models import SafeDeleteModel
 from safedelete.models import SOFT_DELETE_CASCADE
 from safedelete.managers import SafeDeleteManager
+from safedelete.queryset import SafeDeleteQueryset
+
+
+class NotificationQuerySet(SafeDeleteQueryset):
+    def mark_read(self):
+        """
+        Mark the unread notifications of the queryset as read, keeping the unread counters in sync.
+        Use instead of `.update(is_read=True)`. Returns the number of notifications marked.
+        """
+        with transaction.atomic():
+            unread = list(self.filter(is_read=False).select_for_update(of=('self',)).values_list('id', 'user_id'))
+            if not unread:
+                return 0
+            Notification.objects.filter(id__in=[noti_id for noti_id, _ in unread]).update(is_read=True)
+            deltas, changes = {}, {}
+            for noti_id, user_id in unread:
+                if user_id is not None:
+                    deltas[user_id] = deltas.get(user_id, 0) - 1
+                    changes.setdefault(user_id, {'readIds': []})['readIds'].append(noti_id)
+            NotificationCounter.objects.add_unread(deltas)
+            for user_id, delta in deltas.items():
+                changes[user_id]['unreadDelta'] = delta
+            publish(changes)
+        return len(unread)
 
 
 class NotificationManager(SafeDeleteManager):
+    _queryset_class = NotificationQuerySet
+
+    def mark_read(self):
+        return self.get_queryset().mark_read()
 
     def visible_only(self, **kwargs):
         return self.filter(is_visible=True, **kwargs)
@@ -31,57 +58,116 @@ class NotificationManager(SafeDeleteManager):
         admin_users = get_user_model().objects.filter(is_superuser=True)
         return self.filter(actors__in=admin_users, **kwargs)
 
+    def bulk_fan_out(self, recipients, actor, origin, target, redirect_url, message_ko, message_en,
+                     skip_reporters_of=None):
+        """
+        Send the same notification from `actor` to every user of `recipients` (users or ids)
+        with a fixed number of queries, whatever the number of recipients.
+        Skipped: actor, deleted users, users who blocked or were blocked by actor (UserReport)
+        and, if given, users who reported the content `skip_reporters_of` (ContentReport).
+        Returns the created notifications.
+        """
+        from content_report.models import ContentReport
+        from user_report.models import UserReport
+
+        recipient_ids = {getattr(recipient, 'id', recipient) for recipient in recipients} - {actor.id}
+        if not recipient_ids:
+            return []
+
+        blocked = UserReport.objects.filter(Q(user=OuterRef('pk'), reported_user=actor) |
+                                            Q(user=actor, reported_user=OuterRef('pk')))
+        users = get_user_model().objects.filter(id__in=recipient_ids).exclude(Exists(blocked))
+        if skip_reporters_of is not None:
+            users = users.exclude(Exists(ContentReport.objects.filter(
+                user=OuterRef('pk'),
+                content_type=ContentType.objects.get_for_model(skip_reporters_of),
+                object_id=skip_reporters_of.pk,
+            )))
+
+        return self.bulk_send([
+            Notification(user_id=user_id, origin=origin, target=target, redirect_url=redirect_url,
+                         message_ko=message_ko, message_en=message_en)
+            for user_id in users.values_list('id', flat=True)
+        ], actor)
+
+    def bulk_send(self, notifications, actor):
+        """
+        Save new `notifications` (from `actor`) in bulk, with their actor and push.
+        Does not send post_save: anything done by the Notification signals must be done here too.
+        """
+        notifications = self.bulk_create(notifications)
+        NotificationActor.objects.bulk_create([
+            NotificationActor(user=actor, notification=notification) for notification in notifications
+        ])
+        PushOutbox.objects.bulk_create([PushOutbox.new(notification) for notification in notifications])
+        deltas, changes = {}, {}
+        for notification in notifications:
+            if notification.is_unread:
+                deltas[notification.user_id] = deltas.get(notification.user_id, 0) + 1
+            changes.setdefault(notification.user_id, {'ids': []})['ids'].append(notification.id)
+        NotificationCounter.objects.add_unread(deltas)
+        for user_id, delta in deltas.items():
+            changes[user_id]['unreadDelta'] = delta
+        publish(changes)
+        return notifications
+
     def create_or_update_notification(self, actor, user, origin, target, noti_type, redirect_url, content_en, content_ko,
                                       emoji=None):
-        noti_to_update = None
-
-        if target.type == "Like":
-            noti_to_update = find_like_noti(user, origin, noti_type)
-        elif target.type == "ResponseRequest":
-            noti_to_update = Notification.objects.filter(user=user,
-                                                         origin_id=target.question.id, origin_type=get_question_type(),
-                                                         target_type=get_response_request_type()).first()
-        elif target.type == "Reaction":
-            notis = Notification.objects.filter(user=user, origin_id=origin.id,
-                                                origin_type=ContentType.objects.get_for_model(origin),
-                                                target_type=ContentType.objects.get_for_model(target))
-            if notis.count() > 0:
-                for noti in notis:
-                    if noti.target.emoji == emoji:
-                        noti_to_update = noti
-                        break
-
-        if noti_to_update:
-            actors = noti_to_update.actors.all()
-            N = actors.count()
-            new_actor = actors.first()
-            updated_message_ko, updated_message_en = construct_message(noti_type,
-                                                                       actor.username + "님",
-                                                                       new_actor.username + "님",
-                                                                       actor.username,
-                                                                       new_actor.username,
-                                                                       N + 1,
-                                                                       content_en,
-                                                                       content_ko,
-                                                                       emoji)
-
-            noti_to_update.message_ko = updated_message_ko
-            noti_to_update.message_en = updated_message_en
-            noti_to_update.is_visible = True
-            noti_to_update.is_read = False
-            NotificationActor.objects.create(user=actor, notification=noti_to_update)
-            noti_to_update.notification_updated_at = timezone.now()
-            noti_to_update.save()
-            print(noti_to_update.message_ko)
-            print(noti_to_update.message_en)
-        else:
-            message_ko, message_en = construct_message(noti_type, actor.username + "님", None,
-                                                       actor.username, None, 1, content_en, content_ko, emoji)
-            noti = Notification.objects.create(user=user, origin=origin, target=target, redirect_url=redirect_url,
-                                               message_ko=message_ko, message_en=message_en)
+        """
+        Notifications of likes, reactions and response requests are aggregated: one row per
+        (user, aggregation_key), whose actor_count and recent_actors are updated by every new actor.
+        The row is locked while it is updated, so concurrent actors are all counted.
+        """
+        key = aggregation_key(target, origin, emoji)
+        with transaction.atomic():
+            noti = self.select_for_update().filter(user=user, aggregation_key=key).first()
+            if noti is None:
+                message_ko, message_en = construct_message(noti_type, actor.username + "님", None,
+                                                           actor.username, None, 1, content_en, content_ko, emoji)
+                try:
+                    with transaction.atomic():
+                        noti = Notification.objects.create(user=user, origin=origin, target=target,
+                                                           redirect_url=redirect_url, aggregation_key=key,
+                                                           recent_actors=[actor_summary(actor)],
+                                                           message_ko=message_ko, message_en=message_en)
+                except IntegrityError:  # created by a concurrent actor in the meantime
+                    noti = self.select_for_update().get(user=user, aggregation_key=key)
+                else:
+                    NotificationActor.objects.create(user=actor, notification=noti)
+                    return noti
+
+            previous_actor = noti.recent_actors[0]['username'] if noti.recent_actors else actor.username
+            noti.actor_count += 1
+            noti.recent_actors = [actor_summary(actor)] + noti.recent_actors[:1]
+            noti.message_ko, noti.message_en = construct_message(noti_type,
+                                                                 actor.username + "님",
+                                                                 previous_actor + "님",
+                                                                 actor.username,
+                                                                 previous_actor,
+                                                                 noti.actor_count,
+                                                                 content_en,
+                                                                 content_ko,
+                                                                 emoji)
+            noti.is_visible = True
+            noti.is_read = False
+            noti.notification_updated_at = timezone.now()
+            noti.save(update_fields=['actor_count', 'recent_actors', 'message_ko', 'message_en', 'is_visible',
+                                     'is_read', 'notification_updated_at', 'updated_at'])
             NotificationActor.objects.create(user=actor, notification=noti)
-            print(noti.message_ko)
-            print(noti.message_en)
+            return noti
+
+
+def aggregation_key(target, origin, emoji=None):
+    """
+    Notifications of the same kind of `target` (like, reaction, response request) on the same `origin`
+    (and with the same emoji) are aggregated in a single row per user.
+    """
+    key = f'{target.type.lower()}:{ContentType.objects.get_for_model(origin).id}:{origin.id}'
+    return f'{key}:{emoji}' if emoji else key
+
+
+def actor_summary(actor):
+    return {'id': actor.id, 'username': actor.username}
 
 
 def default_user():
@@ -116,7 +202,12 @@ class Notification(AdoorTimestampedModel, SafeDeleteModel):
     is_visible = models.BooleanField(default=True)
     is_read = models.BooleanField(default=False)
 
-    notification_updated_at = models.DateTimeField(auto_now=True, null=True)
+    notification_updated_at = models.DateTimeField(auto_now=True)
+
+    # aggregated notifications (see NotificationManager.create_or_update_notification)
+    aggregation_key = models.CharField(max_length=100, null=True, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)  # [{id, username}] of the last two actors
 
     objects = NotificationManager()
 
@@ -126,17 +217,86 @@ class Notification(AdoorTimestampedModel, SafeDeleteModel):
         ordering = ['-notification_updated_at']
         indexes = [
             models.Index(fields=['-notification_updated_at']),
+            # inboxes, paginated on (-notification_updated_at, -id)
+            models.Index(fields=['user', 'is_visible', '-notification_updated_at', '-id'],
+                         condition=models.Q(deleted__isnull=True), name='noti_user_visible_updated_idx'),
+            # friend request and response request inboxes
+            models.Index(fields=['user', 'target_type', '-notification_updated_at', '-id'],
+                         condition=models.Q(is_visible=True, deleted__isnull=True), name='noti_user_target_updated_idx'),
+            models.Index(fields=['user', '-notification_updated_at', '-id'],
+                         condition=models.Q(is_read=False, deleted__isnull=True), name='noti_user_unread_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'aggregation_key'],
+                                    condition=models.Q(aggregation_key__isnull=False, deleted__isnull=True),
+                                    name='unique_notification_aggregation_key'),
         ]
 
     def save(self, *args, **kwargs):
         if not self.pk:
             self.notification_updated_at = self.created_at
+
+        # keep NotificationCounter in sync when the notification becomes (un)read or is (un)deleted
+        was_unread = False if self._state.adding else getattr(self, '_loaded_unread', None)
         super().save(*args, **kwargs)
+        unread_delta = 0
+        if was_unread is not None and self.is_unread != was_unread:
+            unread_delta = 1 if self.is_unread else -1
+            NotificationCounter.objects.add_unread({self.user_id: unread_delta})
+        self._loaded_unread = self.is_unread
+        publish({self.user_id: {'ids': [self.id], 'unreadDelta': unread_delta}})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'user_id', 'is_read', 'deleted'}.issubset(field_names):
+            instance._loaded_unread = instance.is_unread
+        return instance
+
+    @property
+    def is_unread(self):
+        """counted in the NotificationCounter of user"""
+        return self.user_id is not None and not self.is_read and self.deleted is None
 
     def __str__(self):
         return f"@{self.user} {self.message}"
 
 
+class NotificationCounterManager(models.Manager):
+    def add_unread(self, deltas):
+        """Add deltas ({user_id: delta}) to the unread counts, never below zero."""
+        increments = [(user_id, delta) for user_id, delta in deltas.items() if delta > 0]
+        if increments:
+            table = self.model._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, unread_count) '
+                    f'VALUES {", ".join(["(%s, %s)"] * len(increments))} '
+                    f'ON CONFLICT (user_id) DO UPDATE SET unread_count = {table}.unread_count + EXCLUDED.unread_count',
+                    [value for increment in increments for value in increment])
+        for user_id, delta in deltas.items():
+            if delta < 0:
+                self.filter(user_id=user_id).update(unread_count=Greatest(F('unread_count') + delta, 0))
+
+    def unread_count(self, user):
+        return self.filter(user=user).values_list('unread_count', flat=True).first() or 0
+
+
+class NotificationCounter(models.Model):
+    """
+    Number of unread notifications of a user, maintained by Notification.save(),
+    NotificationManager.bulk_send() and NotificationQuerySet.mark_read().
+    """
+    user = models.OneToOneField('account.User', on_delete=models.CASCADE, primary_key=True,
+                                related_name='notification_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    objects = NotificationCounterManager()
+
+    def __str__(self):
+        return f"@{self.user_id} {self.unread_count} unread"
+
+
 class NotificationActor(AdoorTimestampedModel, SafeDeleteModel):
     user = models.ForeignKey('account.User', on_delete=models.CASCADE)
     notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
@@ -147,56 +307,80 @@ class NotificationActor(AdoorTimestampedModel, SafeDeleteModel):
         ordering = ['-created_at']
 
 
+class PushOutbox(models.Model):
+    """
+    Push messages waiting to be delivered to the devices of `user`,
+    written in the transaction of the notification and drained by DrainPushOutboxCronJob
+    (see notification.push). Delivered rows are deleted.
+    """
+    NEW = 'new'
+    CANCEL = 'cancel'
+    KIND_CHOICES = [(NEW, 'new'), (CANCEL, 'cancel')]
+
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'pending'), (FAILED, 'failed')]
+
+    user = models.ForeignKey('account.User', on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    data = models.JSONField()
+    # devices left to retry, None: all active devices of user
+    registration_ids = models.JSONField(null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(status='pending'),
+                         name='push_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} push to @{self.user_id} ({self.status})"
+
+    @classmethod
+    def new(cls, notification):
+        return cls(user_id=notification.user_id, kind=cls.NEW, data={
+            'message_en': notification.message_en,
+            'message_ko': notification.message_ko,
+            'url': notification.redirect_url,
+            'tag': str(notification.id),
+            'type': 'new',
+            'content-available': '1',  # for ios silent notification
+            'priority': 'high',  # for android
+        })
+
+    @classmethod
+    def cancel(cls, notification):
+        return cls(user_id=notification.user_id, kind=cls.CANCEL, data={
+            'body': '삭제된 알림입니다.',
+            'url': '/home',
+            'tag': str(notification.id),
+            'type': 'cancel',
+        })
+
+
+@receiver(post_delete, sender=Notification)
+def discount_deleted_notification(instance, **kwargs):
+    unread_delta = -1 if instance.is_unread else 0
+    if unread_delta:
+        NotificationCounter.objects.add_unread({instance.user_id: unread_delta})
+    publish({instance.user_id: {'ids': [instance.id], 'unreadDelta': unread_delta}})
+
+
 @receiver(post_save, sender=Notification)
 def send_firebase_notification(created, instance, **kwargs):
-    if not created:
+    if not created or instance.user_id is None:
         return
-    
-    devices = CustomFCMDevice.objects.filter(user_id=instance.user.id, active=True)
-
-    for device in devices:
-        if device.language == 'ko':
-            body = instance.message_ko
-        else:
-            body = instance.message_en
-        
-        message = Message(
-            notification=FirebaseNotification(
-                title='WhoAmI Today',
-                body=body
-            ),
-            data={
-                'message_en': instance.message_en,
-                'message_ko': instance.message_ko,
-                'url': instance.redirect_url,
-                'tag': str(instance.id),
-                'type': 'new',
-                'content-available': '1',  # for ios silent notification
-                'priority': 'high',  # for android
-            }
-        )
-
-        try:
-            device.send_message(message)
-            print(f"Notification sent to user {instance.user.id} in {device.language}")
-        except Exception as e:
-            print(f"Error while sending firebase notification to device {device.id}:", e)
+    PushOutbox.new(instance).save()
+
 
 @receiver(post_save, sender=Notification)
 def cancel_firebase_notification(sender, instance, **kwargs):
-    if not instance.deleted:
+    if not instance.deleted or instance.user_id is None:
         return
-
-    message = Message(
-        data={
-            'body': '삭제된 알림입니다.',
-            'url': '/home',
-            'tag': str(instance.id),
-            'type': 'cancel',
-        }
-    )
-
-    try:
-        CustomFCMDevice.objects.filter(user_id=instance.user.id).send_message(message, False)
-    except Exception as e:
-        print("error while canceling firebase notification: ", e)
+    PushOutbox.cancel(instance).save()
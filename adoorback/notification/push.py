@@ -0,0 +1,182 @@
+"""
+Delivery of the PushOutbox.
+
+Notifications only write PushOutbox rows (in their own transaction); `drain()` sends them
+with one `send_each` call per 500 messages through the transport in settings.PUSH_TRANSPORT,
+never holding a transaction or row locks during the network calls:
+- FCMTransport: firebase_admin.messaging.send_each
+- FakeTransport: no network, for local runs and throughput benchmarks
+
+Tokens rejected by FCM as dead (unregistered, sender mismatch, invalid) are deactivated;
+other failures are retried with exponential backoff, for the failed devices only.
+
+The outbox is drained every minute by DrainPushOutboxCronJob (notification.cron), and can be
+drained continuously by a `manage.py drain_push_outbox --loop` worker for lower latency.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from fcm_django.settings import FCM_DJANGO_SETTINGS
+from firebase_admin import messaging
+
+from custom_fcm.models import CustomFCMDevice
+from notification.models import PushOutbox
+
+
+BATCH_SIZE = 100
+SEND_EACH_LIMIT = 500  # set by FCM
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30  # seconds, doubled on every attempt
+BACKOFF_MAX = 60 * 60
+# how long claimed rows are kept from other workers while they are being sent
+LEASE = timedelta(minutes=5)
+
+
+class FCMTransport:
+    def send_each(self, messages):
+        app = FCM_DJANGO_SETTINGS['DEFAULT_FIREBASE_APP']
+        return messaging.send_each(messages, app=app).responses
+
+
+class FakeTransport:
+    """
+    Accepts every message after `latency` seconds per send_each call, except those
+    sent to a token in `unregistered`. Sent messages are kept in `sent`.
+    """
+    def __init__(self, latency=0.0, unregistered=()):
+        self.latency = latency
+        self.unregistered = set(unregistered)
+        self.sent = []
+
+    def send_each(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        responses = []
+        for message in messages:
+            if message.token in self.unregistered:
+                error = messaging.UnregisteredError('Requested entity was not found.')
+                responses.append(messaging.SendResponse(None, error))
+            else:
+                self.sent.append(message)
+                responses.append(messaging.SendResponse({'name': f'fake/{len(self.sent)}'}, None))
+        return responses
+
+
+def get_transport():
+    return import_string(getattr(settings, 'PUSH_TRANSPORT', 'notification.push.FCMTransport'))()
+
+
+def build_message(row, token, language):
+    if row.kind == PushOutbox.CANCEL:
+        return messaging.Message(data=row.data, token=token)
+    body = row.data['message_ko'] if language == 'ko' else row.data['message_en']
+    return messaging.Message(
+        notification=messaging.Notification(title='WhoAmI Today', body=body),
+        data={key: value or '' for key, value in row.data.items()},
+        token=token,
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def claim(batch_size=BATCH_SIZE, now=None):
+    """
+    Lease up to `batch_size` due rows to the caller, in a short transaction: their next_attempt_at
+    is moved LEASE ahead so other workers skip them while they are being sent. A worker that dies
+    before recording the results leaves its rows to be claimed again once the lease is over.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(PushOutbox.objects.select_for_update(skip_locked=True)
+                    .filter(status=PushOutbox.PENDING, next_attempt_at__lte=now)
+                    .order_by('next_attempt_at', 'id')[:batch_size])
+        if rows:
+            lease_until = now + LEASE
+            PushOutbox.objects.filter(id__in=[row.id for row in rows]).update(next_attempt_at=lease_until)
+            for row in rows:
+                row.next_attempt_at = lease_until
+    return rows
+
+
+def drain(batch_size=BATCH_SIZE, transport=None):
+    """
+    Send one batch of due PushOutbox rows: the rows are claimed in a first transaction,
+    sent with no transaction open, and the results recorded in a second one.
+    Several workers can drain concurrently. Returns counters of what happened.
+    """
+    transport = transport or get_transport()
+    stats = {'rows': 0, 'messages': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'deactivated': 0}
+    now = timezone.now()
+
+    rows = claim(batch_size, now)
+    if not rows:
+        return stats
+    stats['rows'] = len(rows)
+
+    devices = {}
+    for user_id, token, language in CustomFCMDevice.objects.filter(
+            user_id__in={row.user_id for row in rows}, active=True) \
+            .values_list('user_id', 'registration_id', 'language'):
+        devices.setdefault(user_id, []).append((token, language))
+
+    deliveries = []  # (row, token, message)
+    for row in rows:
+        for token, language in devices.get(row.user_id, []):
+            if row.registration_ids is None or token in row.registration_ids:
+                deliveries.append((row, token, build_message(row, token, language)))
+    stats['messages'] = len(deliveries)
+
+    results = []  # (chunk, responses), responses None when the whole request failed
+    for start in range(0, len(deliveries), SEND_EACH_LIMIT):
+        chunk = deliveries[start:start + SEND_EACH_LIMIT]
+        try:
+            results.append((chunk, transport.send_each([message for _, _, message in chunk])))
+        except Exception as e:  # the whole request failed, e.g. network error
+            results.append((chunk, e))
+
+    with transaction.atomic():
+        errors = {row.id: {} for row in rows}  # row id -> {token: error} of retryable failures
+        for chunk, responses in results:
+            if isinstance(responses, Exception):
+                for row, token, _ in chunk:
+                    errors[row.id][token] = responses
+                continue
+
+            tokens = [token for _, token, _ in chunk]
+            dead_tokens = set(CustomFCMDevice.objects.deactivate_devices_with_error_results(tokens, responses))
+            stats['deactivated'] += len(dead_tokens)
+            for (row, token, _), response in zip(chunk, responses):
+                if response.success:
+                    stats['sent'] += 1
+                elif token not in dead_tokens:
+                    errors[row.id][token] = response.exception
+
+        # rows whose lease ran out meanwhile belong to the worker that claimed them again
+        leased = PushOutbox.objects.filter(next_attempt_at=now + LEASE)
+        done_ids = []
+        for row in rows:
+            failed = errors[row.id]
+            if not failed:
+                done_ids.append(row.id)
+                continue
+            row.attempts += 1
+            row.registration_ids = list(failed)
+            row.last_error = str(next(iter(failed.values())))
+            if row.attempts >= MAX_ATTEMPTS:
+                row.status = PushOutbox.FAILED
+                stats['failed'] += 1
+            else:
+                row.next_attempt_at = now + backoff(row.attempts)
+                stats['retried'] += 1
+            leased.filter(id=row.id).update(attempts=row.attempts, registration_ids=row.registration_ids,
+                                            last_error=row.last_error, status=row.status,
+                                            next_attempt_at=row.next_attempt_at)
+        leased.filter(id__in=done_ids).delete()
+
+    return stats
@@ -0,0 +1,56 @@
+"""
+Live notification updates over the channel layer.
+
+Changes of the notifications of a user are published to the group `user_<id>_notification`
+once the transaction commits, as a `notification.changed` event:
+- ids: notifications created or updated (including aggregated ones and soft deletions)
+- readIds: notifications marked as read
+- unreadDelta: change of the user's NotificationCounter
+NotificationConsumer (ws/notifications/) loads and serializes the notifications of the event
+for its client, so publishing costs no query.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+def group_name(user_id):
+    return f"user_{user_id}_notification"
+
+
+def publish(changes):
+    """
+    changes: {user_id: {'ids': [...], 'readIds': [...], 'unreadDelta': n}}, every key optional.
+    Sent in one go after the current transaction commits (right away outside of a transaction).
+    """
+    events = {}
+    for user_id, change in changes.items():
+        event = {
+            'ids': list(change.get('ids', [])),
+            'readIds': list(change.get('readIds', [])),
+            'unreadDelta': change.get('unreadDelta', 0),
+        }
+        if user_id is not None and (event['ids'] or event['readIds'] or event['unreadDelta']):
+            events[user_id] = event
+    if events:
+        transaction.on_commit(lambda: _send(events))
+
+
+def _send(events):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(_group_send_all)(channel_layer, events)
+    except Exception:  # live updates are best effort, clients resume from notification_updated_at
+        logger.exception("could not publish notification changes")
+
+
+async def _group_send_all(channel_layer, events):
+    for user_id, event in events.items():
+        await channel_layer.group_send(group_name(user_id), {"type": "notification.changed", **event})
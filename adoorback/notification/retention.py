@@ -0,0 +1,202 @@
+"""
+Retention of notifications.
+
+The inbox only reads notification_notification, which should keep the notifications that still
+matter. CompactNotificationsCronJob (notification.cron) keeps it small:
+- read or invisible notifications not updated for HOT_DAYS are moved to notification_archive,
+  with the ids of their actors folded into `actor_ids` (their NotificationActor rows are deleted)
+- soft-deleted notifications not updated for HOT_DAYS, and read or invisible ones past
+  RETENTION_DAYS, are hard-deleted instead
+- unread visible notifications (e.g. a pending friend or response request) are never moved
+  nor deleted, however old: they stay in the inbox until the user reads them
+- notification_archive is partitioned by month of notification_updated_at: the partitions of
+  the coming months are created ahead, the ones entirely past RETENTION_DAYS are dropped
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notification.models import Notification, NotificationActor, NotificationCounter
+from notification.realtime import publish
+
+
+HOT_DAYS = 30
+RETENTION_DAYS = 365
+PARTITIONS_AHEAD = 2  # months
+BATCH_SIZE = 5000
+
+ARCHIVE_TABLE = 'notification_archive'
+_partition_name = re.compile(rf'^{ARCHIVE_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+ARCHIVED_COLUMNS = ['id', 'user_id', 'actor_count', 'target_type_id', 'target_id', 'origin_type_id', 'origin_id',
+                    'redirect_url', 'message', 'message_ko', 'message_en', 'is_visible', 'is_read',
+                    'aggregation_key', 'created_at']
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start):
+    return f'{ARCHIVE_TABLE}_p{start.year:04d}{start.month:02d}'
+
+
+def archive_partitions():
+    """{month start: partition name} of the existing partitions of notification_archive"""
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+        ''', [ARCHIVE_TABLE])
+        names = [name for name, in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = _partition_name.match(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)] = name
+    return partitions
+
+
+def ensure_partitions(since, until):
+    """Create the monthly partitions covering [since, until)."""
+    existing = archive_partitions()
+    start = month_start(since)
+    with connection.cursor() as cursor:
+        while start < until:
+            end = next_month(start)
+            if start not in existing:
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {ARCHIVE_TABLE} '
+                               f'FOR VALUES FROM (%s) TO (%s)', [start, end])
+            start = end
+
+
+def drop_expired_partitions(now=None):
+    """
+    Drop the partitions whose whole month is older than RETENTION_DAYS and delete the expired
+    rows of the oldest remaining one. Returns the names of the dropped partitions.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=RETENTION_DAYS)
+    dropped = []
+    with connection.cursor() as cursor:
+        for start, name in sorted(archive_partitions().items()):
+            if next_month(start) <= cutoff:
+                cursor.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+        # only scans the partition of the cutoff
+        cursor.execute(f'DELETE FROM {ARCHIVE_TABLE} WHERE notification_updated_at < %s', [cutoff])
+    return dropped
+
+
+def _candidates_sql(condition):
+    # hot notifications matching `condition`, locked; skipped when a request is updating them
+    return f'''
+        SELECT id FROM {Notification._meta.db_table}
+        WHERE ({condition}) AND COALESCE(notification_updated_at, created_at) < %(before)s
+        ORDER BY id LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    '''
+
+
+def archive_batch(before, limit=BATCH_SIZE):
+    """
+    Move up to `limit` read or invisible notifications updated before `before` to the archive,
+    in one statement. Returns the number of notifications moved.
+    """
+    notification_table = Notification._meta.db_table
+    actor_table = NotificationActor._meta.db_table
+    columns = ', '.join(ARCHIVED_COLUMNS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH moved AS ({_candidates_sql(
+                'user_id IS NOT NULL AND deleted IS NULL AND (is_read OR NOT is_visible)')}),
+            actors AS (
+                DELETE FROM {actor_table} actor USING moved WHERE actor.notification_id = moved.id
+                RETURNING actor.notification_id, actor.user_id, actor.deleted
+            ),
+            notifications AS (
+                DELETE FROM {notification_table} notification USING moved WHERE notification.id = moved.id
+                RETURNING notification.*
+            )
+            INSERT INTO {ARCHIVE_TABLE} ({columns}, notification_updated_at, actor_ids, archived_at)
+            SELECT {', '.join(f'notifications.{column}' for column in ARCHIVED_COLUMNS)},
+                   COALESCE(notifications.notification_updated_at, notifications.created_at),
+                   COALESCE(actor_ids.ids, '{{}}'), NOW()
+            FROM notifications
+            LEFT JOIN (
+                SELECT notification_id, array_agg(DISTINCT user_id ORDER BY user_id) AS ids
+                FROM actors WHERE deleted IS NULL GROUP BY notification_id
+            ) actor_ids ON actor_ids.notification_id = notifications.id
+            RETURNING user_id, is_read
+        ''', {'before': before, 'limit': limit})
+        rows = cursor.fetchall()
+
+        # invisible but unread notifications were counted as unread
+        deltas = {}
+        for user_id, is_read in rows:
+            if not is_read:
+                deltas[user_id] = deltas.get(user_id, 0) - 1
+        NotificationCounter.objects.add_unread(deltas)
+        publish({user_id: {'unreadDelta': delta} for user_id, delta in deltas.items()})
+    return len(rows)
+
+
+def purge_batch(condition, before, limit=BATCH_SIZE):
+    """Hard-delete up to `limit` notifications matching `condition` updated before `before`, with their actors."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH purged AS ({_candidates_sql(condition)}),
+            actors AS (
+                DELETE FROM {NotificationActor._meta.db_table} actor USING purged
+                WHERE actor.notification_id = purged.id
+            )
+            DELETE FROM {Notification._meta.db_table} notification USING purged
+            WHERE notification.id = purged.id
+            RETURNING notification.user_id, notification.is_read, notification.deleted
+        ''', {'before': before, 'limit': limit})
+        rows = cursor.fetchall()
+
+        deltas = {}
+        for user_id, is_read, deleted in rows:
+            if user_id is not None and not is_read and deleted is None:
+                deltas[user_id] = deltas.get(user_id, 0) - 1
+        NotificationCounter.objects.add_unread(deltas)
+        publish({user_id: {'unreadDelta': delta} for user_id, delta in deltas.items()})
+    return len(rows)
+
+
+def compact(now=None, batch_size=BATCH_SIZE):
+    """Run every step of the retention policy. Returns counters of what was done."""
+    now = now or timezone.now()
+    hot_before = now - timedelta(days=HOT_DAYS)
+    retention_before = now - timedelta(days=RETENTION_DAYS)
+    stats = {'purged': 0, 'archived': 0, 'dropped_partitions': []}
+
+    # read, invisible or orphaned and past retention: never archived
+    while True:
+        purged = purge_batch('user_id IS NULL OR is_read OR NOT is_visible', retention_before, batch_size)
+        stats['purged'] += purged
+        if purged < batch_size:
+            break
+    while True:
+        purged = purge_batch('deleted IS NOT NULL', hot_before, batch_size)
+        stats['purged'] += purged
+        if purged < batch_size:
+            break
+
+    ensure_partitions(retention_before, next_month(month_start(now + timedelta(days=31 * PARTITIONS_AHEAD))))
+    while True:
+        archived = archive_batch(hot_before, batch_size)
+        stats['archived'] += archived
+        if archived < batch_size:
+            break
+
+    stats['dropped_partitions'] = drop_expired_partitions(now)
+    return stats
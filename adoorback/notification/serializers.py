@@ -3,13 +3,24 @@ from django.utils import timezone
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
+from notification.loaders import NotificationLoader
 from notification.models import Notification
-from qna.models import Question
 
 User = get_user_model()
 
 
+class NotificationListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        notifications = list(data.all() if hasattr(data, 'all') else data)
+        self._context['notification_loader'] = NotificationLoader(notifications)
+        return super().to_representation(notifications)
+
+
 class NotificationSerializer(serializers.ModelSerializer):
+    """
+    Targets, actors and questions come from a NotificationLoader in the context,
+    built once per page by NotificationListSerializer (or per notification when serialized alone).
+    """
     is_response_request = serializers.SerializerMethodField(read_only=True)
     is_friend_request = serializers.SerializerMethodField(read_only=True)
     question_content = serializers.SerializerMethodField(read_only=True)
@@ -18,23 +29,33 @@ class NotificationSerializer(serializers.ModelSerializer):
     notification_type = serializers.SerializerMethodField(read_only=True)
     is_recent = serializers.SerializerMethodField(read_only=True)
 
+    def loader(self, obj):
+        loader = self.context.get('notification_loader')
+        if loader is None or obj.id not in loader.notification_ids:
+            loader = NotificationLoader([obj])
+            self._context['notification_loader'] = loader
+        return loader
+
     def get_is_response_request(self, obj):
-        if obj.target is None:
+        target = self.loader(obj).target(obj)
+        if target is None:
             return False
-        return obj.target.type == 'ResponseRequest'
+        return target.type == 'ResponseRequest'
 
     def get_is_friend_request(self, obj):
-        if obj.target is None:
+        target = self.loader(obj).target(obj)
+        if target is None:
             return False
-        return obj.target.type == 'FriendRequest'
+        return target.type == 'FriendRequest'
 
     def get_recent_actors(self, obj):
         from account.serializers import UserMinimalSerializer
-        recent_actors = obj.actors.all()[:3]
+        recent_actors = self.loader(obj).recent_actors(obj)
         return UserMinimalSerializer(recent_actors, many=True).data
 
     def get_notification_type(self, obj):
-        return obj.target.type if obj.target else 'other'
+        target = self.loader(obj).target(obj)
+        return target.type if target else 'other'
 
 
     def get_is_recent(self, obj):
@@ -44,25 +65,19 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 
     def get_question_content(self, obj):
-        content = None
-        if obj.target and (obj.target.type == 'ResponseRequest' or obj.target.type == 'Response'):
-            lang = self.context.get('request', None).META.get('HTTP_ACCEPT_LANGUAGE', 'en')
-            if lang == 'en':
-                content = obj.target.question.content_en
-            elif lang == 'kr':
-                content = obj.target.question.content_ko
-            else:
-                content = obj.target.question.content_en  # Default to English
-        elif obj.target and obj.redirect_url[:11] == '/questions/' and obj.target.type != 'Like':
-            question = Question.objects.get(id=int(obj.redirect_url.split('/')[-2]))
-            lang = self.context.get('request', None).META.get('HTTP_ACCEPT_LANGUAGE', 'en')
-            if lang == 'en':
-                content = question.content_en
-            elif lang == 'kr':
-                content = question.content_ko
-            else:
-                content = question.content_en  # Default to English
+        question = self.loader(obj).question(obj)
+        if question is None:
+            return None
+        request = self.context.get('request', None)
+        if request is not None:
+            lang = request.META.get('HTTP_ACCEPT_LANGUAGE', 'en')
+        else:  # e.g. NotificationConsumer
+            lang = self.context.get('language', 'en')
+        if lang == 'kr':
+            content = question.content_ko
         else:
+            content = question.content_en  # Default to English
+        if not content:
             return content
         return content if len(content) <= 30 else content[:30] + '...'
 
@@ -77,6 +92,7 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
+        list_serializer_class = NotificationListSerializer
         fields = ['id', 'is_response_request', 'is_friend_request', 'recent_actors', 'notification_type', 
                   'is_recent', 'message', 'question_content', 'is_read', 'created_at', 'redirect_url',
                   'notification_updated_at']
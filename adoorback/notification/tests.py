@@ -0,0 +1,195 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from safedelete.models import HARD_DELETE
+
+from account.models import Connection, FriendRequest
+from account.tests import create_admin, create_users
+from adoorback.utils.content_types import get_note_type, get_response_type
+from comment.models import Comment
+from like.models import Like
+from note.models import Note
+from notification import retention
+from notification.models import Notification, NotificationActor, NotificationCounter
+from qna.models import Question, Response, ResponseRequest
+
+User = get_user_model()
+
+
+def create_notifications(user, actors):
+    """Like, comment, friend request and response request notifications of `user` from each of `actors`"""
+    for actor in actors:
+        question = Question.objects.create(author=user, content_en=f'question for {actor.username}',
+                                           content_ko='질문', is_admin_question=True)
+        note = Note.objects.create(author=user, content=f'note for {actor.username}')
+        response = Response.objects.create(author=user, question=question, content=f'response for {actor.username}')
+        Like.objects.create(user=actor, content_type=get_note_type(), object_id=note.id)
+        Comment.objects.create(author=actor, content_type=get_response_type(), object_id=response.id,
+                               content='comment')
+        FriendRequest.objects.create(requester=actor, requestee=user, requester_choice='friend')
+        ResponseRequest.objects.create(requester=actor, requestee=user, question=question)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """Notification inboxes over pages of notifications of every kind (see account.tests.QueryBudgetTestCase)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_admin()
+        cls.user = User.objects.create_user(username='reader', email='reader@test.com', password='Test1234!')
+        actors = create_users('actor', 6)
+        for actor in actors[:3]:
+            Connection.objects.create(user1=cls.user, user2=actor, user1_choice='friend', user2_choice='friend')
+        create_notifications(cls.user, actors)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_notification_list(self):
+        ids = []
+        url, data = '/api/notifications/', {'size': 10}
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            ids += [notification['id'] for notification in response.data['results']]
+            url, data = response.data['next'], None
+
+        expected = Notification.objects.visible_only().filter(user=self.user) \
+            .order_by('-notification_updated_at', '-id').values_list('id', flat=True)
+        self.assertGreater(len(ids), 20)
+        self.assertEqual(ids, list(expected))
+
+    def test_request_notification_lists(self):
+        for url in ('/api/notifications/friend-requests/', '/api/notifications/response-requests/'):
+            response = self.client.get(url, {'size': 20})
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(len(response.data['results']), 6, url)
+
+    def test_badge(self):
+        response = self.client.get('/api/notifications/badge/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unread_noti'],
+                         Notification.objects.filter(user=self.user, is_read=False).count())
+
+
+class NotificationCounterTestCase(APITestCase):
+    """NotificationCounter of every user equals their number of unread notifications after each write path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.user = User.objects.create_user(username='reader', email='reader@test.com', password='Test1234!')
+        cls.actors = create_users('actor', 3)
+
+    def assertCounted(self, *users):
+        for user in users or (self.user, *self.actors):
+            self.assertEqual(NotificationCounter.objects.unread_count(user),
+                             Notification.objects.filter(user=user, is_read=False).count(), user.username)
+
+    def notify(self, user=None, **kwargs):
+        return Notification.objects.create(user=user or self.user, target=self.admin, origin=self.admin,
+                                           redirect_url='/home', message='test', **kwargs)
+
+    def test_create(self):
+        self.notify()
+        self.notify(is_read=True)
+        self.notify(is_visible=False)
+        self.assertCounted()
+
+    def test_save(self):
+        notification = self.notify()
+        notification.is_read = True
+        notification.save()
+        self.assertCounted()
+
+        notification.is_read = False
+        notification.save()
+        notification.save()
+        self.assertCounted()
+
+        # loaded again, without the state of the previous instance
+        notification = Notification.objects.get(id=notification.id)
+        notification.is_read = True
+        notification.save()
+        self.assertCounted()
+
+    def test_aggregated(self):
+        create_notifications(self.user, self.actors[:1])
+        note = Note.objects.create(author=self.user, content='note')
+        for actor in self.actors:
+            Like.objects.create(user=actor, content_type=get_note_type(), object_id=note.id)
+            self.assertCounted()
+        # a new actor makes the read aggregated notification unread again
+        Notification.objects.filter(user=self.user).mark_read()
+        Like.objects.create(user=self.admin, content_type=get_note_type(), object_id=note.id)
+        self.assertEqual(NotificationCounter.objects.unread_count(self.user), 1)
+        self.assertCounted()
+
+    def test_bulk_send(self):
+        Notification.objects.bulk_send([
+            Notification(user=user, target=self.admin, origin=self.admin, redirect_url='/home', is_read=is_read)
+            for user in (self.user, *self.actors) for is_read in (False, True)
+        ], self.admin)
+        Notification.objects.bulk_fan_out([self.user, *self.actors], self.actors[0], origin=self.admin,
+                                          target=self.admin, redirect_url='/home', message_ko='', message_en='')
+        self.assertCounted()
+
+    def test_mark_read(self):
+        for user in (self.user, *self.actors):
+            self.notify(user)
+            self.notify(user, is_read=True)
+        Notification.objects.filter(user__in=self.actors[:2]).mark_read()
+        self.assertCounted()
+
+        self.client.force_authenticate(self.user)
+        ids = list(Notification.objects.filter(user=self.user).values_list('id', flat=True)[:1])
+        self.assertEqual(self.client.patch('/api/notifications/read/', {'ids': ids}, format='json').status_code, 200)
+        self.assertCounted()
+        self.assertEqual(self.client.patch('/api/notifications/mark-all-read/').status_code, 200)
+        self.assertEqual(NotificationCounter.objects.unread_count(self.user), 0)
+        self.assertCounted()
+
+    def test_delete(self):
+        unread, read = self.notify(), self.notify(is_read=True)
+        unread.delete()
+        read.delete()
+        self.assertCounted()
+
+        unread.undelete()
+        read.undelete()
+        self.assertCounted()
+
+        Notification.objects.get(id=unread.id).delete(force_policy=HARD_DELETE)
+        Notification.objects.get(id=read.id).delete(force_policy=HARD_DELETE)
+        self.assertCounted()
+
+    def test_retention(self):
+        old = timezone.now() - timedelta(days=retention.RETENTION_DAYS + 1)
+        stale = timezone.now() - timedelta(days=retention.HOT_DAYS + 1)
+        kept, archived, purged = [], [], []
+        for updated_at, expected in ((None, kept), (stale, archived), (old, purged)):
+            for kwargs in ({}, {'is_read': True}, {'is_visible': False}):
+                notification = self.notify(**kwargs)
+                NotificationActor.objects.create(user=self.actors[0], notification=notification)
+                if updated_at:
+                    Notification.objects.filter(id=notification.id).update(notification_updated_at=updated_at)
+                # unread visible notifications are kept, however old
+                (kept if not kwargs else expected).append(notification.id)
+        deleted = self.notify()
+        deleted.delete()
+        # the safedelete querysets do not update soft-deleted rows
+        QuerySet(Notification).filter(id=deleted.id).update(notification_updated_at=stale)
+        purged.append(deleted.id)
+
+        stats = retention.compact()
+        self.assertEqual((stats['archived'], stats['purged']), (len(archived), len(purged)))
+        self.assertCounted()
+        self.assertEqual(set(Notification.all_objects.filter(user=self.user, message='test')
+                             .values_list('id', flat=True)), set(kept))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id, actor_ids FROM {retention.ARCHIVE_TABLE}')
+            self.assertEqual(dict(cursor.fetchall()), {id: [self.actors[0].id] for id in archived})
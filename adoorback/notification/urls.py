@@ -7,5 +7,6 @@ urlpatterns = [
     path('friend-requests/', views.FriendRequestNotiList.as_view(), name='friend-request-noti-list'),
     path('response-requests/', views.ResponseRequestNotiList.as_view(), name='response-request-noti-list'),
     path('read/', views.NotificationDetail.as_view(), name='notification-read'),
+    path('badge/', views.NotificationBadge.as_view(), name='notification-badge'),
     path('mark-all-read/', views.MarkAllNotificationsRead.as_view(), name='mark-all-notifications-read'),
 ]
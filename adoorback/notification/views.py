@@ -1,4 +1,7 @@
 from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
 from django.utils import translation
 from django.utils import timezone
@@ -6,17 +9,24 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from notification.models import Notification
+from chat.models import UserChatActivity
+from notification.models import Notification, NotificationCounter
+from ping.models import Ping
 from notification.serializers import NotificationSerializer
+from qna.models import Response as _Response
 
+from adoorback.utils.pagination import KeysetCursorPagination
 from adoorback.utils.permissions import IsOwnerOrReadOnly
 from adoorback.utils.validators import adoor_exception_handler
-from adoorback.utils.content_types import get_friend_request_type, get_response_request_type
+from adoorback.utils.content_types import get_friend_request_type, get_question_type, get_response_request_type
 
 
 class NotificationList(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ('-notification_updated_at', '-id')
+    query_budget = 15
 
     def get_exception_handler(self):
         return adoor_exception_handler
@@ -33,6 +43,8 @@ class NotificationList(generics.ListAPIView):
 class FriendRequestNotiList(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ('-notification_updated_at', '-id')
 
     def get_exception_handler(self):
         return adoor_exception_handler
@@ -48,6 +60,8 @@ class FriendRequestNotiList(generics.ListAPIView):
 class ResponseRequestNotiList(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    keyset_ordering = ('-notification_updated_at', '-id')
 
     def get_exception_handler(self):
         return adoor_exception_handler
@@ -58,15 +72,12 @@ class ResponseRequestNotiList(generics.ListAPIView):
             lang = self.request.META['HTTP_ACCEPT_LANGUAGE']
             translation.activate(lang)
         current_user = self.request.user
-        queryset = Notification.objects.visible_only().filter(target_type=get_response_request_type(), user=current_user)
-
-        # filter out answered response-requests
-        filtered_queryset = []
-        for noti in queryset:
-            response = noti.target.question.response_set.filter(author=current_user).filter(created_at__gt=noti.notification_updated_at)
-            if not response.exists():
-                filtered_queryset.append(noti)
-        return filtered_queryset
+        # the origin of a response request notification is the requested question
+        answered = _Response.objects.filter(author=current_user, question_id=OuterRef('origin_id'),
+                                           created_at__gt=OuterRef('notification_updated_at'))
+        return Notification.objects.visible_only() \
+            .filter(target_type=get_response_request_type(), origin_type=get_question_type(), user=current_user) \
+            .exclude(Exists(answered))
 
 
 class NotificationDetail(generics.UpdateAPIView):
@@ -81,7 +92,7 @@ class NotificationDetail(generics.UpdateAPIView):
         partial = kwargs.pop('partial', False)
         ids = request.data.get('ids', [])
         queryset = Notification.objects.filter(id__in=ids)
-        queryset.update(is_read=True)
+        queryset.mark_read()
         serializer = self.get_serializer(queryset, many=True)
 
         return Response(serializer.data)
@@ -97,6 +108,33 @@ class MarkAllNotificationsRead(generics.GenericAPIView):
     def patch(self, request, *args, **kwargs):
         user = request.user
         notifications = Notification.objects.unread_only(user=user)
-        notifications.update(is_read=True)
+        notifications.mark_read()
         
         return Response(status=200)
+
+
+class NotificationBadge(generics.GenericAPIView):
+    """
+    Unread notifications, chat messages and pings of the current user, read in one query.
+    """
+    permission_classes = [IsAuthenticated]
+    query_budget = 3
+
+    def get_exception_handler(self):
+        return adoor_exception_handler
+
+    def get(self, request, *args, **kwargs):
+        unread_noti = NotificationCounter.objects.filter(user=OuterRef('pk')).values('unread_count')
+        unread_chat = UserChatActivity.objects.filter(
+            user=OuterRef('pk'), chat_room__users=OuterRef('pk'), chat_room__deleted__isnull=True,
+        ).order_by().values('user').annotate(total=Sum('unread_count')).values('total')
+        unread_ping = Ping.objects.filter(receiver=OuterRef('pk'), is_read=False) \
+            .order_by().values('receiver').annotate(cnt=Count('id')).values('cnt')
+
+        badge = get_user_model().objects.filter(pk=request.user.pk).annotate(
+            unread_noti=Coalesce(Subquery(unread_noti), 0),
+            unread_chat=Coalesce(Subquery(unread_chat), 0),
+            unread_ping=Coalesce(Subquery(unread_ping), 0),
+        ).values('unread_noti', 'unread_chat', 'unread_ping').get()
+
+        return Response(badge)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qna', '0007_response_is_edited'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['author', 'question', 'created_at'], name='response_author_question_idx'),
+        ),
+    ]
@@ -10,18 +10,19 @@ from django.contrib.postgres.fields import ArrayField
 from django.db.models import Q
 from django.utils import timezone
 
+from account import feed
 from account.models import Subscription
 from comment.models import Comment
-from content_report.models import ContentReport
 from like.models import Like
 from reaction.models import Reaction
-from adoorback.models import AdoorModel, AdoorTimestampedModel
+from adoorback.models import AdoorModel, AdoorTimestampedModel, AudienceManager
 from adoorback.utils.helpers import wrap_content
 from notification.models import Notification, NotificationActor
 
 from safedelete.models import SafeDeleteModel
 from safedelete.models import SOFT_DELETE_CASCADE, HARD_DELETE
 from safedelete.managers import SafeDeleteManager
+from safedelete.signals import post_undelete
 
 User = get_user_model()
 
@@ -91,12 +92,17 @@ class Response(AdoorModel, SafeDeleteModel):
                                                 content_type_field='origin_type',
                                                 object_id_field='origin_id')
 
+    objects = AudienceManager()
+
     _safedelete_policy = SOFT_DELETE_CASCADE
 
     class Meta:
         ordering = ['-id']
         indexes = [
             models.Index(fields=['-id']),
+            # answered response requests (notification.views.ResponseRequestNotiList)
+            models.Index(fields=['author', 'question', 'created_at'], condition=Q(deleted__isnull=True),
+                         name='response_author_question_idx'),
         ]
 
     def save(self, *args, **kwargs):
@@ -130,20 +136,7 @@ class Response(AdoorModel, SafeDeleteModel):
         return Reaction.objects.filter(content_type=response_content_type, object_id=self.id)
 
     def is_audience(self, user):
-        content_type = ContentType.objects.get_for_model(self)
-        if ContentReport.objects.filter(user=user, content_type=content_type, object_id=self.pk).exists():
-            return False
-
-        if self.author.id in user.user_report_blocked_ids:
-            return False
-
-        if self.author == user:
-            return True
-
-        if self.author.is_connected(user):
-            return True
-
-        return False
+        return Response.objects.visible_to(user).filter(pk=self.pk).exists()
 
 
 class ResponseRequest(AdoorTimestampedModel, SafeDeleteModel):
@@ -256,17 +249,26 @@ def send_notifications_to_subscribers(sender, instance, created, **kwargs):
     subscribers = Subscription.objects.filter(
         subscribed_to=author,
         content_type=response_content_type,
-    ).values_list('subscriber', flat=True)
-
-    for subscriber_id in subscribers:
-        subscriber = get_user_model().objects.get(id=subscriber_id)
-        
-        noti = Notification.objects.create(
-            user=subscriber,
-            origin=instance,
-            target=instance,
-            message_ko=f'{author.username}님이 새 답변을 작성했습니다.',
-            message_en=f'{author.username} has posted a new response.',
-            redirect_url=f'/responses/{instance.id}'
-        )
-        NotificationActor.objects.create(user=author, notification=noti)
+    ).values_list('subscriber_id', flat=True)
+
+    Notification.objects.bulk_fan_out(
+        subscribers,
+        actor=author,
+        origin=instance,
+        target=instance,
+        message_ko=f'{author.username}님이 새 답변을 작성했습니다.',
+        message_en=f'{author.username} has posted a new response.',
+        redirect_url=f'/responses/{instance.id}',
+    )
+
+
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+@receiver(post_undelete, sender=Response)
+def update_feed_timelines(instance, signal, created=False, **kwargs):
+    if not feed.is_push_mode():
+        return
+    if signal is post_delete or instance.deleted:
+        feed.remove(instance)
+    elif created or signal is post_undelete:
+        feed.fan_out(instance)
@@ -46,12 +46,23 @@ class ResponseSerializer(AdoorBaseSerializer):
 
     
     def get_current_user_read(self, obj):
+        if self.loader(obj):
+            return self.loader(obj).current_user_read(obj)
         current_user_id = self.context['request'].user.id
         return current_user_id in obj.reader_ids
 
     def get_like_reaction_user_sample(self, obj):
         from account.serializers import UserMinimalSerializer
-        
+
+        if self.loader(obj):
+            serialized_data = []
+            for user, like, reaction in self.loader(obj).like_reaction_user_sample(obj):
+                user_data = UserMinimalSerializer(user, context=self.context).data
+                user_data['like'] = like
+                user_data['reaction'] = reaction
+                serialized_data.append(user_data)
+            return serialized_data
+
         likes = obj.response_likes.annotate(
             created=F('created_at'),
             like=Value(True, output_field=BooleanField()),
@@ -81,6 +92,8 @@ class ResponseSerializer(AdoorBaseSerializer):
         return serialized_data
 
     def get_current_user_reaction_id_list(self, obj):
+        if self.loader(obj):
+            return self.loader(obj).current_user_reaction_id_list(obj)
         current_user_id = self.context['request'].user.id
         content_type_id = get_generic_relation_type(obj.type).id
         reactions = Reaction.objects.filter(user_id=current_user_id, content_type_id=content_type_id, object_id=obj.id)
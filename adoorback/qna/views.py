@@ -1,7 +1,6 @@
 from itertools import chain
 
 from django.contrib.auth import get_user_model
-from django.contrib.contenttypes.models import ContentType
 from django.db import transaction, IntegrityError
 from django.db.models import F, Value, CharField
 from django.shortcuts import get_object_or_404
@@ -69,7 +68,6 @@ class ResponseComments(generics.ListAPIView):
 
     def get_queryset(self):
         from comment.models import Comment
-        from content_report.models import ContentReport
 
         current_user = self.request.user
         
@@ -77,10 +75,7 @@ class ResponseComments(generics.ListAPIView):
         if not response_.is_audience(current_user):
             raise PermissionDenied("You do not have permission to view these comments.")
         
-        blocked_content_ids = ContentReport.objects.filter(
-            user=current_user,
-            content_type=ContentType.objects.get_for_model(Comment)
-        ).values_list('object_id', flat=True)
+        blocked_content_ids = current_user.block_list.reported_object_ids(Comment)
 
         return response_.response_comments.exclude(
             id__in=blocked_content_ids,
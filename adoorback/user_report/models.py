@@ -1,10 +1,11 @@
 from django.db import models, transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 
 from adoorback.models import AdoorTimestampedModel
+from account import block_list, feed
 from account.models import Connection
 
 from safedelete.models import SafeDeleteModel
@@ -39,6 +40,18 @@ class UserReport(AdoorTimestampedModel, SafeDeleteModel):
         return self.__class__.__name__
 
 
+@receiver(post_save, sender=UserReport)
+@receiver(post_delete, sender=UserReport)
+def invalidate_block_list(instance, **kwargs):
+    block_list.invalidate(instance.user_id, instance.reported_user_id)
+
+
+@receiver(post_save, sender=UserReport)
+def trim_feed_timelines(instance, created, **kwargs):
+    if created and feed.is_push_mode():
+        feed.disconnect(instance.user_id, instance.reported_user_id)
+
+
 @transaction.atomic
 @receiver(post_save, sender=UserReport)
 def delete_blocked_user_friendship(instance, created, **kwargs):
@@ -35,6 +35,7 @@ def update_last_read_message(user, chat_room):
     last_message = chat_room.messages.last()
     user_activity, _ = UserChatActivity.objects.get_or_create(user=user, chat_room=chat_room)
     user_activity.last_read_message = last_message
+    user_activity.unread_count = 0
     user_activity.save()
 
     return